@@ -0,0 +1,142 @@
+"""
+Cached token authentication.
+
+DRF's TokenAuthentication runs a Token JOIN User query on every request.
+``CachedTokenAuthentication`` keeps the token -> user mapping in two tiers:
+
+* a small per-process LRU with a short TTL, which needs no network round trip
+* the default cache with a longer TTL, shared by every process (Redis or the
+  database cache table, see CACHES)
+
+``HashedTokenAuthentication`` does the same for expiring AuthTokens, keyed on
+their digest. Entries are dropped when the token is deleted (logout,
+rotation, pruning) and when the user is saved (e.g. deactivated), see
+accounts.signals. Other processes may keep serving their local copy for up
+to AUTH_TOKEN_LOCAL_CACHE_TTL seconds.
+
+The cached user is a snapshot: code that needs fresh values of fields that
+change without ``save()`` (such as the follow counters) must re-read them.
+"""
+
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from .tokens import find_token, is_hashed_token, token_digest
+
+
+def _cache_key(key):
+    # Never put raw credentials into cache keys
+    return "auth:token:" + hashlib.sha256(key.encode()).hexdigest()
+
+
+class LocalTokenCache:
+    """
+    Thread-safe LRU of token key -> (expires_at, user, token).
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[1:]
+
+    def set(self, key, user, token, ttl):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl, user, token)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+local_cache = LocalTokenCache(settings.AUTH_TOKEN_LOCAL_CACHE_SIZE)
+
+
+def invalidate_token(key):
+    local_cache.delete(key)
+    cache.delete(_cache_key(key))
+
+
+class CachedAuthenticationMixin:
+    """
+    Runs ``load()`` (returning ``(user, token)``) through both cache tiers,
+    keyed on ``cache_id``.
+    """
+
+    def cached_credentials(self, cache_id, load):
+        hit = local_cache.get(cache_id)
+        if hit is None:
+            hit = cache.get(_cache_key(cache_id))
+            if hit is None:
+                hit = load()
+                cache.set(_cache_key(cache_id), hit, settings.AUTH_TOKEN_CACHE_TTL)
+            local_cache.set(cache_id, *hit, settings.AUTH_TOKEN_LOCAL_CACHE_TTL)
+
+        user, token = hit
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed("User inactive or deleted.")
+        # Requests may modify request.user; never hand out the cached instance
+        return copy.copy(user), token
+
+
+class CachedTokenAuthentication(CachedAuthenticationMixin, TokenAuthentication):
+    """
+    DRF's plaintext tokens, cached. Legacy: nothing issues them any more, and
+    they are refused once AUTH_LEGACY_TOKENS is off.
+    """
+
+    def authenticate_credentials(self, key):
+        if not settings.AUTH_LEGACY_TOKENS:
+            raise exceptions.AuthenticationFailed("This token has been retired, log in again.")
+        # Raises AuthenticationFailed for unknown keys and inactive users
+        load = super().authenticate_credentials
+        return self.cached_credentials(key, lambda: load(key))
+
+
+class HashedTokenAuthentication(CachedAuthenticationMixin, TokenAuthentication):
+    """
+    Expiring AuthTokens (``Authorization: Token sma_...``), cached by digest.
+
+    Other keys are left to the next authentication class.
+    """
+
+    def authenticate_credentials(self, key):
+        if not is_hashed_token(key):
+            return None
+
+        def load():
+            auth_token = find_token(key)
+            if auth_token is None:
+                raise exceptions.AuthenticationFailed("Invalid or expired token.")
+            return auth_token.user, auth_token
+
+        user, auth_token = self.cached_credentials(token_digest(key), load)
+        if auth_token.expires_at <= timezone.now():
+            raise exceptions.AuthenticationFailed("Invalid or expired token.")
+        return user, auth_token
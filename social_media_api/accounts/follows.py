@@ -0,0 +1,134 @@
+"""
+Follow graph writes.
+
+Rows are written through the ``following`` through model directly so the
+denormalized followers_count / following_count can be adjusted with F()
+updates in the same transaction. Edits made through the related manager
+(e.g. the admin) are covered by the m2m_changed handler in accounts.signals.
+"""
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from notifications.dispatch import make_event, notify_many
+from posts.timeline import (
+    backfill_author,
+    backfill_authors,
+    queue_materialization,
+    remove_author,
+    remove_authors,
+)
+
+from .suggestions import record_follow, record_unfollow
+
+User = get_user_model()
+Follow = User.following.through
+
+
+def _adjust(user_ids, field, delta):
+    User.objects.filter(pk__in=user_ids).update(**{field: Greatest(F(field) + delta, Value(0))})
+
+
+def follow(user, target):
+    """
+    Make ``user`` follow ``target``; returns False if they already did.
+    """
+    with transaction.atomic():
+        _, created = Follow.objects.get_or_create(from_user_id=user.pk, to_user_id=target.pk)
+        if created:
+            _adjust([user.pk], "following_count", 1)
+            _adjust([target.pk], "followers_count", 1)
+    if created:
+        backfill_author(user, target)
+        transaction.on_commit(lambda: record_follow(user.pk, [target.pk]))
+    return created
+
+
+def unfollow(user, target):
+    """
+    Remove the follow; returns False if ``user`` was not following ``target``.
+    """
+    with transaction.atomic():
+        deleted, _ = Follow.objects.filter(from_user_id=user.pk, to_user_id=target.pk).delete()
+        if deleted:
+            _adjust([user.pk], "following_count", -1)
+            _adjust([target.pk], "followers_count", -1)
+    if deleted:
+        remove_author(user, target)
+        queue_materialization([target.pk])
+        transaction.on_commit(lambda: record_unfollow(user.pk, [target.pk]))
+    return bool(deleted)
+
+
+def follow_many(user, user_ids):
+    """
+    Follow every existing user in ``user_ids``; returns the ids newly followed.
+
+    Targets are resolved in one query and the join rows are inserted with a
+    single ``bulk_create(ignore_conflicts=True)``, so concurrent duplicates are
+    harmless. Counters are recounted for the affected users in one UPDATE.
+    """
+    target_ids = list(
+        User.objects.filter(pk__in=set(user_ids)).exclude(pk=user.pk).values_list("pk", flat=True)
+    )
+    with transaction.atomic():
+        existing = set(
+            Follow.objects.filter(from_user_id=user.pk, to_user_id__in=target_ids).values_list(
+                "to_user_id", flat=True
+            )
+        )
+        new_ids = [target_id for target_id in target_ids if target_id not in existing]
+        Follow.objects.bulk_create(
+            [Follow(from_user_id=user.pk, to_user_id=target_id) for target_id in new_ids],
+            ignore_conflicts=True,
+        )
+        if new_ids:
+            recount_follow_counters([user.pk, *new_ids])
+
+    backfill_authors(user, new_ids)
+    if new_ids:
+        transaction.on_commit(lambda: record_follow(user.pk, new_ids))
+    notify_many(
+        make_event(target_id, user, "started following you", target=User(pk=target_id))
+        for target_id in new_ids
+    )
+    return new_ids
+
+
+def unfollow_many(user, user_ids):
+    """
+    Unfollow every user in ``user_ids``; returns the ids that were followed.
+    """
+    with transaction.atomic():
+        follows = Follow.objects.filter(from_user_id=user.pk, to_user_id__in=set(user_ids))
+        removed_ids = list(follows.values_list("to_user_id", flat=True))
+        follows.delete()
+        if removed_ids:
+            recount_follow_counters([user.pk, *removed_ids])
+
+    remove_authors(user, removed_ids)
+    if removed_ids:
+        queue_materialization(removed_ids)
+        transaction.on_commit(lambda: record_unfollow(user.pk, removed_ids))
+    return removed_ids
+
+
+def _count_by(column):
+    counts = (
+        Follow.objects.filter(**{column: OuterRef("pk")})
+        .order_by()
+        .values(column)
+        .annotate(n=Count("id"))
+        .values("n")
+    )
+    return Coalesce(Subquery(counts), 0)
+
+
+def recount_follow_counters(user_ids):
+    # One UPDATE recomputing both counters from the join table
+    return User.objects.filter(pk__in=user_ids).update(
+        followers_count=_count_by("to_user"),
+        following_count=_count_by("from_user"),
+    )
@@ -0,0 +1,67 @@
+"""
+Password hashing off the request thread.
+
+PBKDF2 at Django's default iteration count keeps a core busy for tens of
+milliseconds. The async register/login views hand it to a bounded thread
+pool (hashlib releases the GIL while deriving keys, so threads really run in
+parallel) and await the result, leaving the event loop free for other
+requests. When AUTH_HASHING_MAX_PENDING jobs are already queued or running,
+``run_hashing`` raises ``HashingBusy`` and the view answers 503 instead of
+letting the backlog grow without bound.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+
+class HashingBusy(Exception):
+    pass
+
+
+class HashingPool:
+    def __init__(self, workers, max_pending):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hashing")
+        self.max_pending = max_pending
+        self.pending = 0
+        # The pool is shared by every event loop (one per request under WSGI)
+        self.lock = threading.Lock()
+
+    def _acquire(self):
+        with self.lock:
+            if self.pending >= self.max_pending:
+                raise HashingBusy
+            self.pending += 1
+
+    def _release(self, future=None):
+        with self.lock:
+            self.pending -= 1
+
+    async def run(self, func, *args):
+        self._acquire()
+        try:
+            future = self.executor.submit(func, *args)
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_hashing_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = HashingPool(settings.AUTH_HASHING_WORKERS, settings.AUTH_HASHING_MAX_PENDING)
+    return _pool
+
+
+async def run_hashing(func, *args):
+    return await get_hashing_pool().run(func, *args)
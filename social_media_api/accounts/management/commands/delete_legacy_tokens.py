@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.tokens import delete_legacy_tokens
+
+
+class Command(BaseCommand):
+    help = "Delete the plaintext DRF tokens issued before register switched to hashed tokens."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if settings.AUTH_LEGACY_TOKENS:
+            raise CommandError("Legacy tokens are still accepted; set AUTH_LEGACY_TOKENS=False first.")
+        deleted = delete_legacy_tokens(options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} legacy token(s)."))
@@ -0,0 +1,101 @@
+import csv
+import json
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.follows import recount_follow_counters
+
+User = get_user_model()
+Follow = User.following.through
+
+
+def read_csv(handle):
+    for row in csv.reader(handle):
+        if len(row) < 2 or row[0].strip().lower() in ("follower", "from_user", "follower_id"):
+            continue  # blank line or header
+        yield row[0].strip(), row[1].strip()
+
+
+def read_jsonl(handle):
+    for number, line in enumerate(handle, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            yield str(record["follower"]), str(record["followee"])
+        except (ValueError, KeyError, TypeError) as exc:
+            # json.JSONDecodeError is a ValueError; KeyError/TypeError for other shapes
+            raise CommandError(f"Line {number} is not a follow record: {exc!r}")
+
+
+class Command(BaseCommand):
+    help = (
+        "Import follow edges from a CSV (follower,followee) or JSONL "
+        '({"follower": ..., "followee": ...}) file, streaming it in chunks.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=["csv", "jsonl"], default=None)
+        parser.add_argument(
+            "--key",
+            choices=["id", "username"],
+            default="id",
+            help="Whether the file identifies users by id or username.",
+        )
+        parser.add_argument("--chunk-size", type=int, default=5000)
+
+    def resolve(self, values, key):
+        # One query per chunk mapping file values -> user ids
+        if key == "id":
+            ids = {int(value) for value in values if value.isdigit()}
+            return {str(pk): pk for pk in User.objects.filter(pk__in=ids).values_list("pk", flat=True)}
+        return dict(User.objects.filter(username__in=values).values_list("username", "pk"))
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        file_format = options["format"] or ("jsonl" if path.endswith((".jsonl", ".ndjson")) else "csv")
+        reader = read_jsonl if file_format == "jsonl" else read_csv
+
+        touched = set()
+        edges_seen = 0
+        skipped = 0
+        try:
+            handle = open(path, newline="", encoding="utf-8")
+        except OSError as exc:
+            raise CommandError(f"Cannot open {path}: {exc}")
+
+        try:
+            with handle:
+                edges = reader(handle)
+                while True:
+                    chunk = list(islice(edges, options["chunk_size"]))
+                    if not chunk:
+                        break
+                    edges_seen += len(chunk)
+
+                    ids = self.resolve({value for edge in chunk for value in edge}, options["key"])
+                    rows = []
+                    for follower, followee in chunk:
+                        from_id, to_id = ids.get(follower), ids.get(followee)
+                        if from_id is None or to_id is None or from_id == to_id:
+                            skipped += 1
+                            continue
+                        rows.append(Follow(from_user_id=from_id, to_user_id=to_id))
+                        touched.update((from_id, to_id))
+                    Follow.objects.bulk_create(rows, batch_size=1000, ignore_conflicts=True)
+        finally:
+            # Also after a malformed line: the chunks before it are imported
+            touched = sorted(touched)
+            for start in range(0, len(touched), options["chunk_size"]):
+                recount_follow_counters(touched[start : start + options["chunk_size"]])
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Processed {edges_seen} edge(s), skipped {skipped}, "
+                f"updated counters for {len(touched)} user(s). "
+                "Run `rebuild_timelines` to populate feeds for the new follows."
+            )
+        )
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from accounts.tokens import prune_expired_tokens
+
+
+class Command(BaseCommand):
+    help = "Delete expired hashed auth tokens in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        deleted = prune_expired_tokens(options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired token(s)."))
@@ -0,0 +1,30 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from accounts.follows import recount_follow_counters
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Recompute followers_count / following_count from the follow table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        updated = 0
+        last_id = 0
+        while True:
+            batch = list(
+                User.objects.filter(id__gt=last_id)
+                .order_by("id")
+                .values_list("id", flat=True)[:batch_size]
+            )
+            if not batch:
+                break
+            last_id = batch[-1]
+            updated += recount_follow_counters(batch)
+
+        self.stdout.write(self.style.SUCCESS(f"Recounted follow counters for {updated} user(s)."))
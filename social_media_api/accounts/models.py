@@ -5,6 +5,8 @@ from django.db import models
 class User(AbstractUser):
     bio = models.TextField(blank=True)
     profile_picture = models.ImageField(upload_to="profile_pics/", blank=True, null=True)
+    # {"<size>": {"webp": name, "jpeg": name}}, filled in the background by accounts.pictures
+    profile_picture_renditions = models.JSONField(default=dict, blank=True)
 
     # Users that THIS user follows
     following = models.ManyToManyField(
@@ -14,5 +16,44 @@ class User(AbstractUser):
         blank=True,
     )
 
+    # Denormalized sizes of the follow graph, kept in sync by accounts.follows
+    # and the m2m_changed handler; `reconcile_follow_counters` repairs drift.
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+
     def __str__(self):
         return self.username
+
+
+class AuthToken(models.Model):
+    """
+    Expiring API token stored as a keyed hash.
+
+    Clients hold ``sma_<prefix><secret>``; only the prefix (for the indexed
+    lookup) and an HMAC-SHA256 of the whole token are kept. See accounts.tokens.
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="auth_tokens")
+    prefix = models.CharField(max_length=8, db_index=True)
+    digest = models.CharField(max_length=64)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.prefix}... ({self.user})"
+
+
+class FollowSuggestionList(models.Model):
+    """
+    Precomputed who-to-follow list of one user, best first; the row without
+    a user holds the popular accounts served to everyone else. Written by
+    ``precompute_follow_suggestions``, see accounts.suggestions.
+    """
+
+    user = models.OneToOneField(User, on_delete=models.CASCADE, null=True, related_name="+")
+    # [[user id, mutual count], ...]
+    ranked = models.JSONField(default=list)
+    computed_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"Suggestions for {self.user_id or 'everyone'}"
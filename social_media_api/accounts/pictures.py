@@ -0,0 +1,40 @@
+"""
+Profile picture storage.
+
+The upload is stored under its content hash (see social_media_api.media) and
+the response goes out straight away; square WebP/JPEG renditions in
+PROFILE_PICTURE_SIZES are rendered in the background and recorded in
+``User.profile_picture_renditions``. Until then the field is empty and
+clients fall back to the original.
+"""
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+
+from social_media_api.media import generate_renditions, run_in_background, store_hashed
+
+User = get_user_model()
+
+PREFIX = "profile_pics"
+RENDITIONS_PREFIX = "profile_pics/renditions"
+
+
+def set_profile_picture(user, upload):
+    """
+    Store ``upload`` and point ``user`` at it; the caller saves the user and
+    then calls ``schedule_renditions``.
+    """
+    user.profile_picture, _ = store_hashed(user.profile_picture.storage, PREFIX, upload)
+    user.profile_picture_renditions = {}
+
+
+def schedule_renditions(user):
+    if user.profile_picture:
+        run_in_background(update_renditions, user.pk, user.profile_picture.name)
+
+
+def update_renditions(user_id, name):
+    storage = User._meta.get_field("profile_picture").storage
+    renditions = generate_renditions(storage, name, RENDITIONS_PREFIX, settings.PROFILE_PICTURE_SIZES, crop=True)
+    # Skipped if the user uploaded another picture in the meantime
+    User.objects.filter(pk=user_id, profile_picture=name).update(profile_picture_renditions=renditions)
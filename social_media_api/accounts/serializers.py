@@ -1,6 +1,9 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
-from rest_framework.authtoken.models import Token  # checker wants this
+from social_media_api.media import RenditionURLsField
+
+from .pictures import schedule_renditions, set_profile_picture
 
 User = get_user_model()
 
@@ -13,27 +16,31 @@ class RegisterSerializer(serializers.ModelSerializer):
         fields = ("id", "username", "email", "password", "bio", "profile_picture")
 
     def create(self, validated_data):
+        # The async register view hashes in a worker pool and passes the result
+        password_hash = validated_data.pop("password_hash", None)
+
         # checker wants get_user_model().objects.create_user
         user = get_user_model().objects.create_user(
             username=validated_data.get("username"),
             email=validated_data.get("email"),
-            password=validated_data.get("password"),
+            password=None if password_hash else validated_data.get("password"),
         )
+        if password_hash:
+            user.password = password_hash
 
         # Optional fields
         user.bio = validated_data.get("bio", "")
-        user.profile_picture = validated_data.get("profile_picture", None)
+        if validated_data.get("profile_picture"):
+            set_profile_picture(user, validated_data["profile_picture"])
         user.save()
-
-        # checker wants Token.objects.create
-        Token.objects.create(user=user)
-
+        schedule_renditions(user)
+        # The view issues the (hashed, expiring) token, see accounts.tokens
         return user
 
 
 class UserProfileSerializer(serializers.ModelSerializer):
-    followers_count = serializers.SerializerMethodField()
-    following_count = serializers.SerializerMethodField()
+    # Empty until the background rendering finishes; fall back to profile_picture
+    profile_picture_renditions = RenditionURLsField()
 
     class Meta:
         model = User
@@ -43,13 +50,47 @@ class UserProfileSerializer(serializers.ModelSerializer):
             "email",
             "bio",
             "profile_picture",
+            "profile_picture_renditions",
             "followers_count",
             "following_count",
         )
-        read_only_fields = ("username", "email")
+        read_only_fields = ("username", "email", "followers_count", "following_count")
+
+    def update(self, instance, validated_data):
+        picture = validated_data.pop("profile_picture", None)
+        if picture:
+            set_profile_picture(instance, picture)
+        elif "profile_picture" in self.initial_data:
+            # Explicitly cleared
+            instance.profile_picture = None
+            instance.profile_picture_renditions = {}
+        user = super().update(instance, validated_data)
+        if picture:
+            schedule_renditions(user)
+        return user
+
+
+class SuggestionSerializer(serializers.ModelSerializer):
+    # Followed accounts that follow this user; 0 for popular-account fallbacks
+    mutual_count = serializers.IntegerField(read_only=True)
+    profile_picture_renditions = RenditionURLsField()
+
+    class Meta:
+        model = User
+        fields = (
+            "id",
+            "username",
+            "bio",
+            "profile_picture",
+            "profile_picture_renditions",
+            "followers_count",
+            "mutual_count",
+        )
 
-    def get_followers_count(self, obj):
-        return obj.followers.count()
 
-    def get_following_count(self, obj):
-        return obj.following.count()
+class BulkFollowSerializer(serializers.Serializer):
+    user_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_FOLLOW_MAX_USERS,
+    )
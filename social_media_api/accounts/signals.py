@@ -0,0 +1,54 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from posts.timeline import queue_materialization
+
+from .authentication import invalidate_token
+from .follows import recount_follow_counters
+from .models import AuthToken
+
+User = get_user_model()
+
+
+@receiver(m2m_changed, sender=User.following.through)
+def sync_follow_counters(sender, instance, action, reverse, model, pk_set, **kwargs):
+    # Fires for user.following.add()/remove()/clear() and the reverse
+    # user.followers manager, e.g. when follows are edited in the admin.
+    if action == "pre_clear":
+        related = instance.followers if reverse else instance.following
+        instance._cleared_follow_ids = set(related.values_list("pk", flat=True))
+        return
+    if action == "post_clear":
+        pk_set = instance.__dict__.pop("_cleared_follow_ids", set())
+    elif action not in ("post_add", "post_remove"):
+        return
+
+    recount_follow_counters({instance.pk, *(pk_set or ())})
+    if action != "post_add":
+        # Followers were removed from the instance or from each user in pk_set
+        queue_materialization([instance.pk] if reverse else list(pk_set or ()))
+
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    # Logout and token rotation
+    invalidate_token(instance.key)
+
+
+@receiver(post_delete, sender=AuthToken)
+def forget_deleted_auth_token(sender, instance, **kwargs):
+    # Logout and pruning; hashed tokens are cached by digest
+    invalidate_token(instance.digest)
+
+
+@receiver(post_save, sender=User)
+def forget_user_tokens(sender, instance, created, **kwargs):
+    # Profile edits and deactivation must not be masked by cached users
+    if created:
+        return
+    for key in Token.objects.filter(user=instance).values_list("key", flat=True):
+        invalidate_token(key)
+    for digest in AuthToken.objects.filter(user=instance).values_list("digest", flat=True):
+        invalidate_token(digest)
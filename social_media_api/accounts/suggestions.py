@@ -0,0 +1,204 @@
+"""
+Who-to-follow suggestions.
+
+Scores are friends-of-friends counts: a candidate scores one point for each
+account the user follows that follows the candidate. They are precomputed by
+``precompute_follow_suggestions`` over an in-memory copy of the follow graph
+and stored per user in the FollowSuggestionList table as a ranked list of
+(user id, score) pairs, so every process serves what the command wrote and
+the endpoint only reads one row and loads K users. Lists older than
+SUGGESTIONS_MAX_AGE are ignored.
+
+``FollowGraph`` is a compressed sparse row (CSR) adjacency structure: the
+followees of the user at dense index ``i`` are ``targets[offsets[i]:offsets[i + 1]]``.
+Both are ``array`` instances, so a graph with millions of edges costs a few
+bytes per edge instead of a Python object per edge.
+
+Between runs ``record_follow`` / ``record_unfollow`` (called by
+accounts.follows) patch the acting user's list: newly followed accounts are
+dropped from it and their followees gain or lose a point. Changes made by the
+accounts a user follows reach that user's list on the next run.
+"""
+
+import heapq
+from array import array
+from bisect import bisect_left
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import FollowSuggestionList
+
+User = get_user_model()
+Follow = User.following.through
+
+
+class FollowGraph:
+    def __init__(self, user_ids, offsets, targets):
+        self.user_ids = user_ids  # sorted primary keys; position = dense index
+        self.offsets = offsets
+        self.targets = targets
+        self.in_degree = array("l", [0]) * len(user_ids)
+        for target in targets:
+            self.in_degree[target] += 1
+
+    @classmethod
+    def load(cls, chunk_size=10000):
+        user_ids = array("q", User.objects.order_by("pk").values_list("pk", flat=True).iterator(chunk_size))
+        offsets = array("q", [0])
+        targets = array("l")
+        edges = (
+            Follow.objects.order_by("from_user_id", "to_user_id")
+            .values_list("from_user_id", "to_user_id")
+            .iterator(chunk_size)
+        )
+        for from_id, to_id in edges:
+            source = bisect_left(user_ids, from_id)
+            # Start this source's row; users in between follow nobody
+            while len(offsets) <= source:
+                offsets.append(len(targets))
+            targets.append(bisect_left(user_ids, to_id))
+        while len(offsets) <= len(user_ids):
+            offsets.append(len(targets))
+        return cls(user_ids, offsets, targets)
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    def following(self, index):
+        return self.targets[self.offsets[index] : self.offsets[index + 1]]
+
+    def suggest(self, index, limit):
+        """
+        Top ``limit`` (user id, score) pairs for the user at ``index``; ties go
+        to the account with more followers.
+        """
+        followed = set(self.following(index))
+        hop_limit = settings.SUGGESTIONS_HOP_LIMIT
+        scores = {}
+        for followee in self.following(index)[:hop_limit]:
+            for candidate in self.following(followee)[:hop_limit]:
+                if candidate != index and candidate not in followed:
+                    scores[candidate] = scores.get(candidate, 0) + 1
+        top = heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], self.in_degree[item[0]]))
+        return [(self.user_ids[candidate], score) for candidate, score in top]
+
+    def popular(self, limit):
+        top = heapq.nlargest(limit, range(len(self)), key=self.in_degree.__getitem__)
+        return [(self.user_ids[index], 0) for index in top if self.in_degree[index]]
+
+
+def _store(lists, computed_at):
+    FollowSuggestionList.objects.bulk_create(
+        [FollowSuggestionList(user_id=user_id, ranked=ranked, computed_at=computed_at) for user_id, ranked in lists],
+        update_conflicts=True,
+        unique_fields=["user"],
+        update_fields=["ranked", "computed_at"],
+    )
+
+
+def precompute_suggestions(graph=None, batch_size=1000):
+    """
+    Store the ranked list of every user who follows someone, plus the
+    popular-accounts list served to everyone else. Returns the number of
+    users with a stored list.
+    """
+    graph = graph or FollowGraph.load()
+    limit = settings.SUGGESTIONS_STORED
+    computed_at = timezone.now()
+    stored = 0
+    batch = []
+    for index in range(len(graph)):
+        if graph.offsets[index] == graph.offsets[index + 1]:
+            continue
+        batch.append((graph.user_ids[index], graph.suggest(index, limit)))
+        if len(batch) >= batch_size:
+            _store(batch, computed_at)
+            stored += len(batch)
+            batch = []
+    _store(batch, computed_at)
+
+    with transaction.atomic():
+        # NULL never conflicts, so the popular row is replaced explicitly
+        FollowSuggestionList.objects.filter(user=None).delete()
+        FollowSuggestionList.objects.create(user=None, ranked=graph.popular(limit), computed_at=computed_at)
+    # Users who stopped following anyone since the last run
+    FollowSuggestionList.objects.filter(user__isnull=False, computed_at__lt=computed_at).delete()
+    return stored + len(batch)
+
+
+def _fresh_lists():
+    since = timezone.now() - timedelta(seconds=settings.SUGGESTIONS_MAX_AGE)
+    return FollowSuggestionList.objects.filter(computed_at__gte=since)
+
+
+def get_suggestions(user, limit):
+    """
+    Up to ``limit`` users for ``user`` to follow, best first, each annotated
+    with ``mutual_count``.
+    """
+    # The user's own list, or the popular one, in one query
+    lists = {
+        row.user_id: row.ranked
+        for row in _fresh_lists().filter(Q(user=user) | Q(user__isnull=True)).order_by("computed_at")
+    }
+    ranked = lists.get(user.pk, lists.get(None, []))
+    ranked = [(user_id, score) for user_id, score in ranked if user_id != user.pk]
+    if not ranked:
+        return []
+
+    # One indexed query for at most SUGGESTIONS_STORED ids; also drops accounts
+    # followed since the list was written
+    candidates = User.objects.filter(pk__in=[user_id for user_id, _ in ranked], is_active=True).exclude(
+        followers=user
+    )
+    users = {candidate.pk: candidate for candidate in candidates}
+    suggestions = []
+    for user_id, score in ranked:
+        if user_id in users:
+            users[user_id].mutual_count = score
+            suggestions.append(users[user_id])
+            if len(suggestions) == limit:
+                break
+    return suggestions
+
+
+@transaction.atomic
+def _update(user_id, target_ids, delta):
+    # Locked, so two follows by the same user do not lose each other's change
+    row = _fresh_lists().select_for_update().filter(user_id=user_id).first()
+    if row is None:
+        return  # nothing stored yet; the popular list is served instead
+    hop_limit = settings.SUGGESTIONS_HOP_LIMIT
+    following = set(Follow.objects.filter(from_user_id=user_id).values_list("to_user_id", flat=True))
+    scores = dict(row.ranked)
+    second_hop = (
+        Follow.objects.filter(from_user_id__in=target_ids)
+        .order_by("from_user_id", "to_user_id")
+        .values_list("from_user_id", "to_user_id")
+    )
+    seen = {}
+    for target_id, candidate in second_hop:
+        # Only the first SUGGESTIONS_HOP_LIMIT followees, like the precompute
+        seen[target_id] = seen.get(target_id, 0) + 1
+        if seen[target_id] <= hop_limit and candidate != user_id and candidate not in following:
+            scores[candidate] = scores.get(candidate, 0) + delta
+    row.ranked = heapq.nlargest(
+        settings.SUGGESTIONS_STORED,
+        ((candidate, score) for candidate, score in scores.items() if score > 0 and candidate not in following),
+        key=lambda item: item[1],
+    )
+    # Still based on the last precompute, so computed_at stays
+    row.save(update_fields=["ranked"])
+
+
+def record_follow(user_id, target_ids):
+    _update(user_id, target_ids, 1)
+
+
+def record_unfollow(user_id, target_ids):
+    _update(user_id, target_ids, -1)
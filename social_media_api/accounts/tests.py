@@ -1,3 +1,535 @@
-from django.test import TestCase
+import io
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.contrib.auth.signals import user_login_failed
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connections
+from django.test import AsyncRequestFactory, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APITestCase
+
+from notifications.models import Notification
+from PIL import Image
+from social_media_api.media import get_render_pool, render_renditions
+from social_media_api.testing import use_configured_cache
+from posts.models import Post, TimelineEntry
+
+from .authentication import invalidate_token, local_cache
+from .hashing import get_hashing_pool
+from .models import AuthToken, FollowSuggestionList
+from .suggestions import FollowGraph
+from .throttles import LoginRateThrottle
+from .tokens import issue_token, token_digest
+from .views import async_login, async_register
+
+User = get_user_model()
+
+
+class FollowCounterTestCase(APITestCase):
+    """
+    Tests for the denormalized followers_count / following_count.
+    """
+
+    def setUp(self):
+        self.alice = User.objects.create_user(username="alice", password="pass12345")
+        self.bob = User.objects.create_user(username="bob", password="pass12345")
+        self.carol = User.objects.create_user(username="carol", password="pass12345")
+        token = Token.objects.create(user=self.alice)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+
+    def counts(self, user):
+        user.refresh_from_db()
+        return user.followers_count, user.following_count
+
+    def test_follow_and_unfollow_views_update_counters(self):
+        response = self.client.post(reverse("follow_user", args=[self.bob.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.post(reverse("follow_user", args=[self.bob.id]))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.counts(self.alice), (0, 1))
+        self.assertEqual(self.counts(self.bob), (1, 0))
+
+        self.client.post(reverse("unfollow_user", args=[self.bob.id]))
+        self.client.post(reverse("unfollow_user", args=[self.bob.id]))
+        self.assertEqual(self.counts(self.alice), (0, 0))
+        self.assertEqual(self.counts(self.bob), (0, 0))
+
+    def test_related_manager_edits_are_counted(self):
+        self.alice.following.add(self.bob, self.carol)
+        self.carol.followers.add(self.bob)
+        self.assertEqual(self.counts(self.carol), (2, 0))
+        self.assertEqual(self.counts(self.alice), (0, 2))
+
+        self.alice.following.clear()
+        self.assertEqual(self.counts(self.alice), (0, 0))
+        self.assertEqual(self.counts(self.carol), (1, 0))
+
+    def test_profile_reads_do_not_count_the_join_table(self):
+        self.bob.following.add(self.alice)
+        self.client.get(reverse("profile"))  # caches the token
+        with self.assertNumQueries(1):  # re-read of the user's counters
+            response = self.client.get(reverse("profile"))
+        self.assertEqual(response.data["followers_count"], 1)
+
+    def test_reconcile_command_repairs_drift(self):
+        self.alice.following.add(self.bob)
+        User.objects.update(followers_count=5, following_count=5)
+
+        call_command("reconcile_follow_counters", batch_size=2, stdout=StringIO())
+
+        self.assertEqual(self.counts(self.alice), (0, 1))
+        self.assertEqual(self.counts(self.bob), (1, 0))
+        self.assertEqual(self.counts(self.carol), (0, 0))
+
+
+@override_settings(NOTIFICATIONS_ASYNC=False)
+class BulkFollowTestCase(APITestCase):
+    """
+    Tests for POST /api/accounts/follow/bulk/ and the follow graph import.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="newbie", password="pass12345")
+        self.suggested = [User.objects.create(username=f"suggested{i}") for i in range(5)]
+        for author in self.suggested:
+            Post.objects.create(author=author, title=f"By {author.username}", content="Body")
+        self.user.following.add(self.suggested[0])
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+
+    def test_bulk_follow_skips_existing_self_and_unknown_ids(self):
+        ids = [u.id for u in self.suggested] + [self.user.id, 999999]
+        response = self.client.post(reverse("bulk_follow"), {"user_ids": ids}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertCountEqual(response.data["followed"], [u.id for u in self.suggested[1:]])
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.following_count, 5)
+        self.assertEqual(TimelineEntry.objects.filter(user=self.user).count(), 4)
+        self.assertEqual(Notification.objects.filter(actor=self.user).count(), 4)
+
+    def test_bulk_unfollow(self):
+        ids = [u.id for u in self.suggested[:2]]
+        response = self.client.post(reverse("bulk_unfollow"), {"user_ids": ids}, format="json")
+
+        self.assertEqual(response.data["unfollowed"], [self.suggested[0].id])
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.following_count, 0)
+
+    def test_import_follow_graph_from_csv(self):
+        lines = ["follower,followee", "newbie,suggested1", "suggested1,newbie", "newbie,ghost", "newbie,suggested0"]
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as handle:
+            handle.write("\n".join(lines))
+        self.addCleanup(os.remove, handle.name)
+
+        call_command(
+            "import_follow_graph", handle.name, key="username", chunk_size=2, stdout=StringIO()
+        )
+
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.followers_count, self.user.following_count), (1, 2))
+
+    def test_import_reports_malformed_jsonl_line(self):
+        lines = ['{"follower": "newbie", "followee": "suggested1"}', "", '{"follower": "newbie",']
+        with tempfile.NamedTemporaryFile("w", suffix=".jsonl", delete=False) as handle:
+            handle.write("\n".join(lines))
+        self.addCleanup(os.remove, handle.name)
+
+        with self.assertRaisesMessage(CommandError, "Line 3 is not a follow record"):
+            call_command("import_follow_graph", handle.name, key="username", chunk_size=1, stdout=StringIO())
+
+        # The edge before it was imported and counted
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.following_count, 2)
+
+
+class CachedTokenAuthenticationTestCase(APITestCase):
+    """
+    Tests for the cached token authentication and its invalidation.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="user", password="pass12345")
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+    def test_token_lookup_is_cached(self):
+        self.client.get(reverse("notifications_unread_count"))
+        local_cache.clear()  # force the shared-cache tier
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("notifications_unread_count"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_logout_revokes_cached_token(self):
+        self.client.get(reverse("profile"))
+        response = self.client.post(reverse("logout"))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Token.objects.filter(key=self.token.key).exists())
+        self.assertEqual(self.client.get(reverse("profile")).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivation_revokes_cached_user(self):
+        self.client.get(reverse("profile"))
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(reverse("profile")).status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class ConfiguredCacheTestCase(APITestCase):
+    """
+    Tests for token caching on the configured shared cache (the database
+    table, or Redis when CACHE_URL is set) rather than the test runner's.
+    """
+
+    def setUp(self):
+        use_configured_cache(self)
+        local_cache.clear()
+        self.user = User.objects.create_user(username="user", password="pass12345")
+        _, raw = issue_token(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {raw}")
+
+    def test_token_stays_cached_among_other_entries(self):
+        self.client.get(reverse("profile"))
+        # More entries than Django's default MAX_ENTRIES of 300
+        cache.set_many({f"filler:{i}": i for i in range(400)})
+        local_cache.clear()
+
+        with CaptureQueriesContext(connections["default"]) as queries:
+            response = self.client.get(reverse("notifications_unread_count"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse([query for query in queries if "accounts_authtoken" in query["sql"]])
+
+
+class HashedTokenTestCase(APITestCase):
+    """
+    Tests for the hashed, expiring tokens issued by login.
+    """
+
+    def setUp(self):
+        cache.clear()  # login throttle history
+        self.user = User.objects.create_user(username="user", password="pass12345")
+
+    def login(self):
+        response = self.client.post(reverse("login"), {"username": "user", "password": "pass12345"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()["token"]
+
+    def test_login_issues_hashed_token(self):
+        raw = self.login()
+        auth_token = AuthToken.objects.get(user=self.user)
+        self.assertTrue(raw.startswith("sma_"))
+        self.assertNotIn(auth_token.digest, raw)
+        self.assertEqual(auth_token.digest, token_digest(raw))
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {raw}")
+        self.client.get(reverse("notifications_unread_count"))
+        invalidate_token(auth_token.digest)
+        with self.assertNumQueries(1):  # indexed prefix lookup joined to the user
+            response = self.client.get(reverse("notifications_unread_count"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_wrong_secret_with_valid_prefix_is_rejected(self):
+        raw = self.login()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {raw[:-4]}AAAA")
+        self.assertEqual(self.client.get(reverse("profile")).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_expired_token_is_rejected_even_when_cached(self):
+        raw = self.login()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {raw}")
+        self.assertEqual(self.client.get(reverse("profile")).status_code, status.HTTP_200_OK)
+
+        later = timezone.now() + timedelta(seconds=settings.AUTH_TOKEN_TTL + 1)
+        with mock.patch("accounts.authentication.timezone.now", return_value=later):
+            self.assertEqual(self.client.get(reverse("profile")).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_logout_deletes_token(self):
+        raw = self.login()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {raw}")
+        self.assertEqual(self.client.post(reverse("logout")).status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(AuthToken.objects.exists())
+        self.assertEqual(self.client.get(reverse("profile")).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_prune_command_deletes_expired_tokens(self):
+        issue_token(self.user)
+        issue_token(self.user)
+        live, _ = issue_token(self.user)
+        AuthToken.objects.exclude(pk=live.pk).update(expires_at=timezone.now() - timedelta(days=1))
+
+        call_command("prune_auth_tokens", batch_size=1, stdout=StringIO())
+        self.assertEqual(list(AuthToken.objects.values_list("pk", flat=True)), [live.pk])
+
+    def test_legacy_tokens_can_be_retired(self):
+        legacy = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {legacy.key}")
+        self.assertEqual(self.client.get(reverse("profile")).status_code, status.HTTP_200_OK)
+
+        with self.settings(AUTH_LEGACY_TOKENS=False):
+            self.assertEqual(self.client.get(reverse("profile")).status_code, status.HTTP_401_UNAUTHORIZED)
+            call_command("delete_legacy_tokens", batch_size=1, stdout=StringIO())
+        self.assertFalse(Token.objects.exists())
+
+
+class AuthViewsTestCase(APITestCase):
+    """
+    Tests for register/login and the login throttle.
+    """
+
+    def setUp(self):
+        cache.clear()  # throttle history
+
+    def test_register_issues_hashed_token(self):
+        response = self.client.post(
+            reverse("register"), {"username": "new", "email": "new@example.com", "password": "pass12345"}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json()["user"]["username"], "new")
+        user = User.objects.get(username="new")
+        self.assertTrue(user.check_password("pass12345"))
+        raw = response.json()["token"]
+        self.assertEqual(AuthToken.objects.get(user=user).digest, token_digest(raw))
+        self.assertFalse(Token.objects.filter(user=user).exists())
+
+    def test_register_validation_errors(self):
+        User.objects.create_user(username="taken", password="pass12345")
+        response = self.client.post(reverse("register"), {"username": "taken", "password": "x"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("username", response.json())
+
+    def test_login_rejects_bad_credentials(self):
+        User.objects.create_user(username="user", password="pass12345")
+        for username, password in (("user", "wrong"), ("nobody", "pass12345")):
+            response = self.client.post(reverse("login"), {"username": username, "password": password}, format="json")
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @mock.patch.object(LoginRateThrottle, "rate", "2/min", create=True)
+    def test_login_is_rate_limited(self):
+        codes = [
+            self.client.post(reverse("login"), {"username": "user", "password": "wrong"}, format="json").status_code
+            for _ in range(3)
+        ]
+        self.assertEqual(codes, [400, 400, 429])
+
+
+class AsyncAuthViewsTestCase(TransactionTestCase):
+    """
+    Tests for the async register/login views (ASYNC_API_VIEWS) and their
+    hashing pool. Transactional: authenticate() runs on a pool thread with
+    its own database connection.
+    """
+
+    def setUp(self):
+        cache.clear()  # throttle history
+        self.factory = AsyncRequestFactory()
+
+    def post(self, view, data, content_type="application/json"):
+        body = json.dumps(data) if isinstance(data, dict) else data
+        return view(self.factory.post("/", body, content_type=content_type))
+
+    async def test_register_hashes_off_thread(self):
+        response = await self.post(async_register, {"username": "new", "password": "pass12345"})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        user = await User.objects.aget(username="new")
+        self.assertTrue(user.check_password("pass12345"))
+        digest = await AuthToken.objects.filter(user=user).values_list("digest", flat=True).aget()
+        self.assertEqual(digest, token_digest(json.loads(response.content)["token"]))
+
+    async def test_login_goes_through_authenticate(self):
+        await sync_to_async(User.objects.create_user)(username="user", password="pass12345")
+        failed = []
+
+        def record(credentials, **kwargs):
+            failed.append(credentials["username"])
+
+        user_login_failed.connect(record)
+        self.addCleanup(user_login_failed.disconnect, record)
+
+        response = await self.post(async_login, {"username": "user", "password": "wrong"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(failed, ["user"])
+
+        response = await self.post(async_login, {"username": "user", "password": "pass12345"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(json.loads(response.content)["token"].startswith("sma_"))
+
+    async def test_malformed_bodies_get_json_errors(self):
+        for view in (async_register, async_login):
+            response = await self.post(view, "{not json", content_type="application/json")
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn("JSON parse error", json.loads(response.content)["detail"])
+
+            response = await self.post(view, "<user/>", content_type="application/xml")
+            self.assertEqual(response.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+    async def test_full_pool_returns_503(self):
+        with mock.patch.object(get_hashing_pool(), "max_pending", 0):
+            response = await self.post(async_login, {"username": "user", "password": "pass12345"})
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response["Retry-After"], "1")
+
+
+def precompute_in_child_process():
+    call_command("precompute_follow_suggestions", stdout=StringIO())
+    connections.close_all()
+
+
+class FollowSuggestionsTestCase(APITestCase):
+    """
+    Tests for the precomputed who-to-follow lists and GET /api/accounts/suggestions/.
+    """
+
+    def setUp(self):
+        # Follows wake the notification workers on commit; their threads would
+        # write the outbox on another connection while this test's transaction
+        # holds the database
+        patcher = mock.patch("notifications.dispatch.get_dispatcher")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.users = {name: User.objects.create(username=name) for name in ("a", "b", "c", "d", "e", "f")}
+        edges = {"a": "bc", "b": "de", "c": "da", "d": "ef", "e": "f"}
+        for source, targets in edges.items():
+            self.users[source].following.add(*(self.users[name] for name in targets))
+        token = Token.objects.create(user=self.users["a"])
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+
+    def suggested(self):
+        response = self.client.get(reverse("follow_suggestions"))
+        return [(row["username"], row["mutual_count"]) for row in response.data["results"]]
+
+    def test_graph_is_stored_as_compact_rows(self):
+        graph = FollowGraph.load(chunk_size=2)
+        self.assertEqual(len(graph.targets), 9)
+        index = {user.pk: position for position, user in enumerate(sorted(self.users.values(), key=lambda u: u.pk))}
+        followees = [graph.user_ids[i] for i in graph.following(index[self.users["d"].pk])]
+        self.assertEqual(followees, [self.users["e"].pk, self.users["f"].pk])
+
+    def test_precomputed_friends_of_friends(self):
+        call_command("precompute_follow_suggestions", stdout=StringIO())
+        self.assertEqual(self.suggested(), [("d", 2), ("e", 1)])
+
+    def test_follow_and_unfollow_update_the_stored_list(self):
+        call_command("precompute_follow_suggestions", stdout=StringIO())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("follow_user", args=[self.users["d"].id]))
+        self.assertEqual(self.suggested(), [("e", 2), ("f", 1)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("unfollow_user", args=[self.users["d"].id]))
+        self.assertEqual(self.suggested(), [("e", 1)])
+
+    def test_users_without_a_list_get_popular_accounts(self):
+        call_command("precompute_follow_suggestions", stdout=StringIO())
+        newcomer = User.objects.create(username="newcomer")
+        newcomer.following.add(self.users["f"])
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=newcomer).key}")
+
+        self.assertEqual([name for name, _ in self.suggested()][:2], ["d", "e"])
+
+    def test_stale_lists_are_ignored(self):
+        call_command("precompute_follow_suggestions", stdout=StringIO())
+        stale = timezone.now() - timedelta(seconds=settings.SUGGESTIONS_MAX_AGE + 1)
+        FollowSuggestionList.objects.update(computed_at=stale)
+        self.assertEqual(self.suggested(), [])
+
+
+class FollowSuggestionsAcrossProcessesTestCase(TransactionTestCase):
+    """
+    Lists written by the command in another process (with its own cache)
+    are served by this one.
+    """
+
+    def test_endpoint_reads_lists_written_by_another_process(self):
+        users = {name: User.objects.create(username=name) for name in ("a", "b", "c")}
+        users["a"].following.add(users["b"])
+        users["b"].following.add(users["c"])
+
+        connections.close_all()  # the child opens its own connection
+        process = multiprocessing.get_context("fork").Process(target=precompute_in_child_process)
+        process.start()
+        process.join(60)
+        self.assertEqual(process.exitcode, 0)
+
+        client = APIClient()
+        client.force_authenticate(users["a"])
+        response = client.get(reverse("follow_suggestions"))
+        self.assertEqual([row["username"] for row in response.data["results"]], ["c"])
+
+
+def make_png(width=400, height=300, color="red"):
+    buffer = io.BytesIO()
+    Image.new("RGBA", (width, height), color).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+@override_settings(MEDIA_RENDITIONS_ASYNC=False)
+class ProfilePictureTestCase(APITestCase):
+    """
+    Tests for content-hashed profile pictures and their renditions.
+    """
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.user = User.objects.create_user(username="alice", password="pass12345")
+        self.client.force_authenticate(self.user)
+
+    def upload(self, content):
+        picture = SimpleUploadedFile("Me.PNG", content, content_type="image/png")
+        return self.client.put(reverse("profile"), {"profile_picture": picture}, format="multipart")
+
+    def stored_files(self):
+        return sorted(
+            os.path.relpath(os.path.join(root, name), self.media_root)
+            for root, _, names in os.walk(self.media_root)
+            for name in names
+        )
+
+    def test_upload_is_content_hashed_with_renditions(self):
+        response = self.upload(make_png())
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertRegex(response.data["profile_picture"], r"/media/profile_pics/[0-9a-f]{64}\.png$")
+        # Rendered after the response; MEDIA_RENDITIONS_ASYNC=False only makes it finish first
+        renditions = self.client.get(reverse("profile")).data["profile_picture_renditions"]
+        self.assertEqual(set(renditions), {"64", "256"})
+        self.assertTrue(renditions["64"]["webp"].endswith("_64.webp"))
+
+        self.user.refresh_from_db()
+        with Image.open(os.path.join(self.media_root, self.user.profile_picture_renditions["64"]["jpeg"])) as image:
+            self.assertEqual((image.format, image.size), ("JPEG", (64, 64)))
+
+    def test_identical_uploads_are_stored_once(self):
+        self.upload(make_png())
+        files = self.stored_files()
+        self.assertEqual(len(files), 5)  # original + 2 sizes x 2 formats
+
+        other = User.objects.create_user(username="bob", password="pass12345")
+        self.client.force_authenticate(other)
+        self.upload(make_png())
+        other.refresh_from_db()
+        self.user.refresh_from_db()
+        self.assertEqual(other.profile_picture.name, self.user.profile_picture.name)
+        self.assertEqual(self.stored_files(), files)
+
+    def test_renders_in_process_pool(self):
+        rendered = get_render_pool().submit(render_renditions, make_png(), [32], ["webp"], False, 80).result()
+        with Image.open(io.BytesIO(rendered[32]["webp"])) as image:
+            self.assertEqual(image.size, (32, 24))
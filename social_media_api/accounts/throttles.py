@@ -0,0 +1,14 @@
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class LoginRateThrottle(SimpleRateThrottle):
+    """
+    Limits login attempts per client address and username (the "login" rate),
+    counted in the shared cache so every process sees the same history.
+    """
+
+    scope = "login"
+
+    def get_cache_key(self, request, view):
+        username = str(request.data.get("username", "")).lower()
+        return self.cache_format % {"scope": self.scope, "ident": f"{self.get_ident(request)}:{username}"}
@@ -0,0 +1,114 @@
+"""
+Issuing, verifying and pruning hashed expiring tokens (AuthToken).
+
+A token is ``sma_`` + 43 url-safe characters. The first 8 of those are
+stored in clear as an indexed prefix; the token itself is only stored as an
+HMAC-SHA256 keyed with SECRET_KEY. Verifying is one indexed lookup on the
+prefix plus a constant-time digest comparison, and expired rows are pruned
+in batches so the table (and its index) stays small.
+
+DRF's plaintext ``Token`` is legacy: nothing issues it any more, and
+``delete_legacy_tokens`` removes the remaining ones once AUTH_LEGACY_TOKENS
+is off.
+"""
+
+import hmac
+import logging
+import secrets
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.crypto import salted_hmac
+from rest_framework.authtoken.models import Token
+
+from .models import AuthToken
+
+logger = logging.getLogger(__name__)
+
+TOKEN_TAG = "sma_"
+PREFIX_LENGTH = 8
+PRUNE_LOCK_KEY = "auth:tokens:prune"
+
+
+def is_hashed_token(raw):
+    return raw.startswith(TOKEN_TAG)
+
+
+def token_digest(raw):
+    return salted_hmac("accounts.AuthToken", raw, algorithm="sha256").hexdigest()
+
+
+def issue_token(user):
+    """
+    Returns ``(auth_token, raw)``; the raw token is never stored.
+    """
+    secret = secrets.token_urlsafe(32)
+    raw = TOKEN_TAG + secret
+    auth_token = AuthToken.objects.create(
+        user=user,
+        prefix=secret[:PREFIX_LENGTH],
+        digest=token_digest(raw),
+        expires_at=timezone.now() + timedelta(seconds=settings.AUTH_TOKEN_TTL),
+    )
+    schedule_prune()
+    return auth_token, raw
+
+
+def find_token(raw):
+    """
+    The live AuthToken for ``raw`` (with its user), or None.
+    """
+    if not is_hashed_token(raw):
+        return None
+    prefix = raw[len(TOKEN_TAG) : len(TOKEN_TAG) + PREFIX_LENGTH]
+    digest = token_digest(raw)
+    candidates = AuthToken.objects.select_related("user").filter(prefix=prefix, expires_at__gt=timezone.now())
+    for candidate in candidates:
+        if hmac.compare_digest(candidate.digest, digest):
+            return candidate
+    return None
+
+
+def prune_expired_tokens(batch_size=1000):
+    deleted = 0
+    while True:
+        batch = list(
+            AuthToken.objects.filter(expires_at__lte=timezone.now()).values_list("pk", flat=True)[:batch_size]
+        )
+        if not batch:
+            return deleted
+        AuthToken.objects.filter(pk__in=batch).delete()
+        deleted += len(batch)
+
+
+def delete_legacy_tokens(batch_size=1000):
+    deleted = 0
+    while True:
+        batch = list(Token.objects.values_list("pk", flat=True)[:batch_size])
+        if not batch:
+            return deleted
+        # Row by row deletes, so accounts.signals evicts each cached token
+        Token.objects.filter(pk__in=batch).delete()
+        deleted += len(batch)
+
+
+def _prune_in_background():
+    try:
+        prune_expired_tokens(settings.AUTH_TOKEN_PRUNE_BATCH_SIZE)
+    except Exception:
+        logger.exception("Pruning expired auth tokens failed")
+    finally:
+        connection.close()
+
+
+def schedule_prune():
+    # At most one pruning run per interval across all processes
+    interval = settings.AUTH_TOKEN_PRUNE_INTERVAL
+    if not interval or not cache.add(PRUNE_LOCK_KEY, True, interval):
+        return
+    thread = threading.Thread(target=_prune_in_background, name="auth-token-prune", daemon=True)
+    transaction.on_commit(thread.start)
@@ -1,11 +1,16 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
 urlpatterns = [
-    path("register/", views.register, name="register"),
-    path("login/", views.login, name="login"),
+    path("register/", views.async_register if settings.ASYNC_API_VIEWS else views.register, name="register"),
+    path("login/", views.async_login if settings.ASYNC_API_VIEWS else views.login, name="login"),
+    path("logout/", views.logout, name="logout"),
     path("profile/", views.profile, name="profile"),
+    path("suggestions/", views.suggestions, name="follow_suggestions"),
 
+    path("follow/bulk/", views.BulkFollowView.as_view(), name="bulk_follow"),
+    path("unfollow/bulk/", views.BulkUnfollowView.as_view(), name="bulk_unfollow"),
     path("follow/<int:user_id>/", views.FollowUserView.as_view(), name="follow_user"),
     path("unfollow/<int:user_id>/", views.UnfollowUserView.as_view(), name="unfollow_user"),
 ]
@@ -1,15 +1,27 @@
+import functools
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth import authenticate, get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import close_old_connections
 from django.shortcuts import get_object_or_404
-from django.contrib.contenttypes.models import ContentType
 
 from rest_framework import status, generics, permissions
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
-from rest_framework.authtoken.models import Token
 
-from notifications.models import Notification
-from .serializers import RegisterSerializer, UserProfileSerializer
+from notifications.dispatch import notify
+from social_media_api.asyncapi import async_api_view, json_response
+from .follows import follow, follow_many, unfollow, unfollow_many
+from .hashing import HashingBusy, run_hashing
+from .serializers import BulkFollowSerializer, RegisterSerializer, SuggestionSerializer, UserProfileSerializer
+from .suggestions import get_suggestions
+from .throttles import LoginRateThrottle
+from .tokens import issue_token
+
+CustomUser = get_user_model()
 
 
 @api_view(["POST"])
@@ -18,28 +30,104 @@ def register(request):
     serializer = RegisterSerializer(data=request.data)
     if serializer.is_valid():
         user = serializer.save()
-        token = Token.objects.get(user=user)
-        return Response({"token": token.key, "user": serializer.data}, status=status.HTTP_201_CREATED)
+        auth_token, raw = issue_token(user)
+        return Response(
+            {"token": raw, "expires_at": auth_token.expires_at, "user": serializer.data},
+            status=status.HTTP_201_CREATED,
+        )
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
 @api_view(["POST"])
 @permission_classes([AllowAny])
+@throttle_classes([LoginRateThrottle])
 def login(request):
     username = request.data.get("username")
     password = request.data.get("password")
 
-    user = authenticate(username=username, password=password)
+    user = authenticate(request, username=username, password=password)
     if not user:
         return Response({"error": "Invalid credentials"}, status=status.HTTP_400_BAD_REQUEST)
 
-    token, _ = Token.objects.get_or_create(user=user)
-    return Response({"token": token.key}, status=status.HTTP_200_OK)
+    auth_token, raw = issue_token(user)
+    return Response({"token": raw, "expires_at": auth_token.expires_at}, status=status.HTTP_200_OK)
+
+
+# Routed instead of register and login when ASYNC_API_VIEWS is on: the PBKDF2
+# work runs in accounts.hashing's bounded pool instead of blocking the
+# worker, and a full pool answers 503.
+def _busy():
+    response = json_response({"detail": "Server busy, try again shortly."}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    response["Retry-After"] = "1"
+    return response
+
+
+def _authenticate(request, username, password):
+    # Runs on a hashing pool thread, which has its own database connection
+    try:
+        return authenticate(request, username=username, password=password)
+    finally:
+        close_old_connections()
+
+
+@async_api_view(methods=("POST",), require_authentication=False)
+async def async_register(request):
+    # request.data raises ParseError/UnsupportedMediaType, answered by async_api_view
+    serializer = RegisterSerializer(data=request.data)
+    if not await sync_to_async(serializer.is_valid)():
+        return json_response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        password_hash = await run_hashing(make_password, serializer.validated_data["password"])
+    except HashingBusy:
+        return _busy()
+
+    user = await sync_to_async(serializer.save)(password_hash=password_hash)
+    auth_token, raw = await sync_to_async(issue_token)(user)
+    data = await sync_to_async(lambda: serializer.data)()
+    return json_response(
+        {"token": raw, "expires_at": auth_token.expires_at, "user": data}, status=status.HTTP_201_CREATED
+    )
+
+
+@async_api_view(methods=("POST",), require_authentication=False)
+async def async_login(request):
+    throttle = LoginRateThrottle()
+    # The attempt history lives in the cache, which may be the database
+    if not await sync_to_async(throttle.allow_request)(request, None):
+        response = json_response({"detail": "Too many login attempts."}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+        response["Retry-After"] = str(int(throttle.wait() or 1))
+        return response
+
+    username = request.data.get("username")
+    password = request.data.get("password")
+    try:
+        # authenticate() so AUTHENTICATION_BACKENDS, user_login_failed and
+        # hasher upgrades apply; unknown usernames are hashed too (ModelBackend)
+        user = await run_hashing(functools.partial(_authenticate, request._request, username, password))
+    except HashingBusy:
+        return _busy()
+
+    if not user:
+        return json_response({"error": "Invalid credentials"}, status=status.HTTP_400_BAD_REQUEST)
+
+    auth_token, raw = await sync_to_async(issue_token)(user)
+    return json_response({"token": raw, "expires_at": auth_token.expires_at}, status=status.HTTP_200_OK)
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def logout(request):
+    # Deleting the token also evicts it from the authentication cache
+    request.auth.delete()
+    return Response(status=status.HTTP_204_NO_CONTENT)
 
 
 @api_view(["GET", "PUT"])
 @permission_classes([IsAuthenticated])
 def profile(request):
+    # request.user may come from the token cache; show current counters
+    request.user.refresh_from_db()
     if request.method == "GET":
         serializer = UserProfileSerializer(request.user)
         return Response(serializer.data, status=status.HTTP_200_OK)
@@ -52,7 +140,19 @@ def profile(request):
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-CustomUser = get_user_model()
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def suggestions(request):
+    # Reads the precomputed list from its table: no graph traversal here
+    try:
+        limit = int(request.query_params.get("limit", settings.SUGGESTIONS_PAGE_SIZE))
+    except ValueError:
+        return Response({"limit": "A number is required."}, status=status.HTTP_400_BAD_REQUEST)
+    limit = min(max(limit, 1), settings.SUGGESTIONS_STORED)
+
+    serializer = SuggestionSerializer(get_suggestions(request.user, limit), many=True, context={"request": request})
+    return Response({"results": serializer.data}, status=status.HTTP_200_OK)
 
 
 class FollowUserView(generics.GenericAPIView):
@@ -67,18 +167,10 @@ class FollowUserView(generics.GenericAPIView):
         if target_user == request.user:
             return Response({"error": "You cannot follow yourself."}, status=status.HTTP_400_BAD_REQUEST)
 
-        if request.user.following.filter(id=target_user.id).exists():
+        if not follow(request.user, target_user):
             return Response({"detail": "You already follow this user."}, status=status.HTTP_400_BAD_REQUEST)
 
-        request.user.following.add(target_user)
-
-        Notification.objects.create(
-            recipient=target_user,
-            actor=request.user,
-            verb="started following you",
-            target_content_type=ContentType.objects.get_for_model(target_user),
-            target_object_id=target_user.id,
-        )
+        notify(target_user, request.user, "started following you", target=target_user)
 
         return Response({"message": f"You are now following {target_user.username}."}, status=status.HTTP_200_OK)
 
@@ -95,5 +187,27 @@ class UnfollowUserView(generics.GenericAPIView):
         if target_user == request.user:
             return Response({"error": "You cannot unfollow yourself."}, status=status.HTTP_400_BAD_REQUEST)
 
-        request.user.following.remove(target_user)
+        unfollow(request.user, target_user)
         return Response({"message": f"You unfollowed {target_user.username}."}, status=status.HTTP_200_OK)
+
+
+class BulkFollowView(generics.GenericAPIView):
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = BulkFollowSerializer
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        followed = follow_many(request.user, serializer.validated_data["user_ids"])
+        return Response({"followed": followed}, status=status.HTTP_200_OK)
+
+
+class BulkUnfollowView(generics.GenericAPIView):
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = BulkFollowSerializer
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        unfollowed = unfollow_many(request.user, serializer.validated_data["user_ids"])
+        return Response({"unfollowed": unfollowed}, status=status.HTTP_200_OK)
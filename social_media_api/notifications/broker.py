@@ -0,0 +1,115 @@
+"""
+Pub/sub for pushing new notifications to connected clients.
+
+``write_events`` publishes every inserted or coalesced Notification once its
+transaction commits; the stream and long-poll views subscribe per user and
+wait on the broker instead of querying, so idle clients cost no queries.
+
+The broker is loaded from NOTIFICATIONS_BROKER. Any replacement (e.g. one
+backed by an external message broker, for multi-process deployments) needs:
+
+* ``listening(user_ids)`` -- the subset of ``user_ids`` with subscribers
+* ``publish(user_id, message)`` -- thread-safe, never blocks
+* ``subscribe(user_id)`` -- async context manager yielding an object with
+  ``async get()`` and ``drain()``
+
+``InProcessBroker`` only reaches subscribers in the process that wrote the
+notification; clients catch up on reconnect (``Last-Event-ID`` / ``after``).
+"""
+
+import asyncio
+import logging
+import threading
+from collections import defaultdict
+from contextlib import asynccontextmanager
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .models import Notification
+from .serializers import NotificationSerializer
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    def __init__(self, loop, max_size):
+        self.loop = loop
+        self.queue = asyncio.Queue(max_size)
+
+    def offer(self, message):
+        # Runs on the subscriber's loop; a slow client loses its oldest messages
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+
+    async def get(self):
+        return await self.queue.get()
+
+    def drain(self):
+        messages = []
+        while not self.queue.empty():
+            messages.append(self.queue.get_nowait())
+        return messages
+
+
+class InProcessBroker:
+    def __init__(self):
+        self.subscribers = defaultdict(set)
+        self.lock = threading.Lock()
+
+    def listening(self, user_ids):
+        with self.lock:
+            return {user_id for user_id in user_ids if self.subscribers.get(user_id)}
+
+    def publish(self, user_id, message):
+        with self.lock:
+            subscriptions = list(self.subscribers.get(user_id, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, message)
+            except RuntimeError:
+                pass  # the subscriber's event loop is already closed
+
+    @asynccontextmanager
+    async def subscribe(self, user_id):
+        subscription = Subscription(asyncio.get_running_loop(), settings.NOTIFICATIONS_STREAM_QUEUE_SIZE)
+        with self.lock:
+            self.subscribers[user_id].add(subscription)
+        try:
+            yield subscription
+        finally:
+            with self.lock:
+                self.subscribers[user_id].discard(subscription)
+                if not self.subscribers[user_id]:
+                    del self.subscribers[user_id]
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(settings.NOTIFICATIONS_BROKER)()
+    return _broker
+
+
+def publish_notifications(rows):
+    """
+    Push ``(notification_id, recipient_id)`` pairs to their listeners.
+    """
+    broker = get_broker()
+    listening = broker.listening({recipient_id for _, recipient_id in rows})
+    if not listening:
+        return  # nobody connected: no query at all
+
+    ids = [notification_id for notification_id, recipient_id in rows if recipient_id in listening]
+    try:
+        for notification in Notification.objects.filter(pk__in=ids).select_related("actor"):
+            broker.publish(notification.recipient_id, NotificationSerializer(notification).data)
+    except Exception:
+        logger.exception("Publishing %d notification(s) failed", len(ids))
@@ -0,0 +1,346 @@
+"""
+Notification dispatch off the request path.
+
+Views call ``notify()`` / ``notify_many()``. When NOTIFICATIONS_ASYNC is on,
+events are inserted into the NotificationOutbox table in the caller's
+transaction, so they are durable as soon as the change that caused them
+commits, and dropped with it on rollback. After commit the process's worker
+threads are woken; they claim outbox rows in batches with
+``SELECT ... FOR UPDATE SKIP LOCKED`` (so workers in every process can drain
+the same table without delivering a row twice), write them with
+``bulk_create`` and delete them in the same transaction. Rows left by a
+crashed process are picked up by the next worker poll.
+"""
+
+import atexit
+import logging
+import threading
+import time
+from collections import Counter, namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import close_old_connections, transaction
+from django.db.models import F, OuterRef, Q, Subquery
+from django.utils import timezone
+
+from .broker import publish_notifications
+from .models import Notification, NotificationActor, NotificationLock, NotificationOutbox
+from .unread import increment_unread
+
+logger = logging.getLogger(__name__)
+
+NotificationEvent = namedtuple(
+    "NotificationEvent",
+    ["recipient_id", "actor_id", "verb", "target_model", "target_object_id"],
+)
+
+
+def make_event(recipient, actor, verb, target=None):
+    return NotificationEvent(
+        recipient_id=getattr(recipient, "pk", recipient),
+        actor_id=getattr(actor, "pk", actor),
+        verb=verb,
+        target_model=target._meta.label_lower if target is not None else None,
+        target_object_id=target.pk if target is not None else None,
+    )
+
+
+def _content_type_id(label):
+    if label is None:
+        return None
+    app_label, model = label.split(".")
+    # Served from ContentTypeManager's cache after the first lookup
+    return ContentType.objects.get_by_natural_key(app_label, model).id
+
+
+def _sequencer(recipient_ids):
+    """
+    Lock the recipients' NotificationLock rows (on databases with row locks)
+    and return ``next_sequence(recipient_id)``; the caller must hold a
+    transaction.
+
+    The next batch for a recipient waits for the lock, so sequence numbers
+    grow in commit order. They follow the clock (microseconds) where they
+    can, so a number freed by a deleted row is never handed out again.
+    """
+    recipient_ids = sorted(recipient_ids)
+    # First batch for a recipient: create their lock row
+    NotificationLock.objects.bulk_create(
+        [NotificationLock(recipient_id=recipient_id) for recipient_id in recipient_ids], ignore_conflicts=True
+    )
+    latest = (
+        Notification.objects.filter(recipient=OuterRef("recipient_id")).order_by("-sequence").values("sequence")[:1]
+    )
+    # Sorted, so two batches always lock recipients in the same order
+    last = dict(
+        NotificationLock.objects.select_for_update()
+        .filter(recipient_id__in=recipient_ids)
+        .order_by("recipient_id")
+        .annotate(last_sequence=Subquery(latest))
+        .values_list("recipient_id", "last_sequence")
+    )
+
+    def next_sequence(recipient_id):
+        last[recipient_id] = max((last.get(recipient_id) or 0) + 1, time.time_ns() // 1000)
+        return last[recipient_id]
+
+    return next_sequence
+
+
+def _new_notification(recipient_id, verb, content_type_id, object_id, actors, sequence):
+    return Notification(
+        recipient_id=recipient_id,
+        actor_id=actors[-1],
+        verb=verb,
+        target_content_type_id=content_type_id,
+        target_object_id=object_id,
+        actor_count=len(actors),
+        actor_sample=actors[-settings.NOTIFICATIONS_ACTOR_SAMPLE_SIZE :],
+        sequence=sequence,
+    )
+
+
+def _coalesce(events, next_sequence):
+    """
+    Merge events into open notifications sharing (recipient, verb, target).
+
+    Returns (unsaved Notification, actor ids) pairs for the rows that still
+    have to be inserted, (id, recipient_id) pairs for the rows that were
+    updated in place, and the NotificationActor rows to add to them. Must run
+    inside ``_sequencer``'s lock, so concurrent batches for one recipient
+    neither lose updates nor open duplicate rows.
+    """
+    groups = {}
+    for event in events:
+        key = (event.recipient_id, event.verb, _content_type_id(event.target_model), event.target_object_id)
+        actors = groups.setdefault(key, [])
+        if event.actor_id in actors:
+            actors.remove(event.actor_id)
+        actors.append(event.actor_id)
+
+    lookup = Q()
+    for recipient_id, verb, content_type_id, object_id in groups:
+        lookup |= Q(
+            recipient_id=recipient_id,
+            verb=verb,
+            target_content_type_id=content_type_id,
+            target_object_id=object_id,
+        )
+    since = timezone.now() - timedelta(seconds=settings.NOTIFICATIONS_COALESCE_WINDOW)
+    open_rows = {}
+    for row in Notification.objects.filter(lookup, is_read=False, timestamp__gte=since).order_by("timestamp"):
+        # Later rows overwrite earlier ones, leaving the newest per key
+        open_rows[(row.recipient_id, row.verb, row.target_content_type_id, row.target_object_id)] = row
+
+    # Actors already counted in each open row
+    counted = {}
+    if open_rows:
+        batch_actors = {actor_id for actors in groups.values() for actor_id in actors}
+        for notification_id, actor_id in NotificationActor.objects.filter(
+            notification__in=[row.pk for row in open_rows.values()], actor_id__in=batch_actors
+        ).values_list("notification_id", "actor_id"):
+            counted.setdefault(notification_id, set()).add(actor_id)
+
+    sample_size = settings.NOTIFICATIONS_ACTOR_SAMPLE_SIZE
+    new_rows = []
+    updated = []
+    new_actors = []
+    for key, actors in groups.items():
+        row = open_rows.get(key)
+        if row is None:
+            new_rows.append((_new_notification(*key, actors, next_sequence(key[0])), actors))
+            continue
+
+        # The sample covers rows written before NotificationActor existed
+        seen = counted.get(row.pk, set()) | set(row.actor_sample)
+        added = [actor_id for actor_id in actors if actor_id not in seen]
+        sample = [actor_id for actor_id in row.actor_sample if actor_id not in actors] + actors
+        Notification.objects.filter(pk=row.pk).update(
+            actor_id=actors[-1],
+            actor_count=F("actor_count") + len(added),
+            actor_sample=sample[-sample_size:],
+            timestamp=timezone.now(),
+            # Moves forward, so clients past the old id receive the update
+            sequence=next_sequence(row.recipient_id),
+        )
+        new_actors += [NotificationActor(notification_id=row.pk, actor_id=actor_id) for actor_id in added]
+        updated.append((row.pk, row.recipient_id))
+    return new_rows, updated, new_actors
+
+
+def write_events(events):
+    """
+    Persist events and return the newly inserted Notification rows.
+
+    Inserted and coalesced rows are published to live listeners once the
+    transaction commits.
+    """
+    coalesced = [event for event in events if event.verb in settings.NOTIFICATIONS_COALESCE_VERBS]
+    updated = []
+    with transaction.atomic():
+        next_sequence = _sequencer({event.recipient_id for event in events})
+        rows = [
+            _new_notification(
+                event.recipient_id,
+                event.verb,
+                _content_type_id(event.target_model),
+                event.target_object_id,
+                [event.actor_id],
+                next_sequence(event.recipient_id),
+            )
+            for event in events
+            if event.verb not in settings.NOTIFICATIONS_COALESCE_VERBS
+        ]
+        new_rows, new_actors = [], []
+        if coalesced:
+            new_rows, updated, new_actors = _coalesce(coalesced, next_sequence)
+            rows += [row for row, _ in new_rows]
+        created = Notification.objects.bulk_create(rows, batch_size=settings.NOTIFICATIONS_BATCH_SIZE)
+        # bulk_create has set the primary keys of the new rows
+        new_actors += [
+            NotificationActor(notification_id=row.pk, actor_id=actor_id) for row, actors in new_rows for actor_id in actors
+        ]
+        NotificationActor.objects.bulk_create(new_actors, batch_size=settings.NOTIFICATIONS_BATCH_SIZE)
+
+    # Coalesced updates only touch rows that are already unread; counted once
+    # the rows are visible, so a rolled-back batch is never counted
+    new_unread = Counter(row.recipient_id for row in created)
+    transaction.on_commit(lambda: increment_unread(new_unread))
+
+    published = updated + [(row.pk, row.recipient_id) for row in created]
+    transaction.on_commit(lambda: publish_notifications(published))
+    return created
+
+
+def enqueue_events(events):
+    """
+    Insert events into the outbox; one INSERT in the caller's transaction.
+    """
+    NotificationOutbox.objects.bulk_create(
+        [
+            NotificationOutbox(
+                recipient_id=event.recipient_id,
+                actor_id=event.actor_id,
+                verb=event.verb,
+                target_content_type_id=_content_type_id(event.target_model),
+                target_object_id=event.target_object_id,
+            )
+            for event in events
+        ],
+        batch_size=settings.NOTIFICATIONS_BATCH_SIZE,
+    )
+
+
+def _outbox_event(row):
+    target_model = None
+    if row.target_content_type_id:
+        content_type = ContentType.objects.get_for_id(row.target_content_type_id)
+        target_model = f"{content_type.app_label}.{content_type.model}"
+    return NotificationEvent(
+        recipient_id=row.recipient_id,
+        actor_id=row.actor_id,
+        verb=row.verb,
+        target_model=target_model,
+        target_object_id=row.target_object_id,
+    )
+
+
+def drain_outbox(batch_size=None):
+    """
+    Write outbox rows until none are left unclaimed; returns how many.
+    """
+    batch_size = batch_size or settings.NOTIFICATIONS_BATCH_SIZE
+    drained = 0
+    while True:
+        with transaction.atomic():
+            # Rows locked by another worker are skipped, not waited for
+            pending = list(NotificationOutbox.objects.select_for_update(skip_locked=True).order_by("id")[:batch_size])
+            if not pending:
+                return drained
+            write_events([_outbox_event(row) for row in pending])
+            NotificationOutbox.objects.filter(id__in=[row.id for row in pending]).delete()
+        drained += len(pending)
+
+
+class NotificationDispatcher:
+    """
+    Worker threads draining the outbox: woken after a commit that enqueued
+    events, and otherwise every ``poll_interval`` seconds.
+    """
+
+    def __init__(self, workers, batch_size, poll_interval):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._threads = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+
+    def wake(self):
+        self._ensure_started()
+        self._wakeup.set()
+
+    def _ensure_started(self):
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"notification-dispatch-{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            atexit.register(self.shutdown)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.poll_interval)
+            # Cleared before draining: a commit landing mid-drain wakes us again
+            self._wakeup.clear()
+            try:
+                drain_outbox(self.batch_size)
+            except Exception:
+                # The rows stay in the outbox and are retried on the next poll
+                logger.exception("Could not drain the notification outbox")
+            finally:
+                close_old_connections()
+
+    def shutdown(self):
+        self._stopping.set()
+        self._wakeup.set()
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher():
+    global _dispatcher
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                _dispatcher = NotificationDispatcher(
+                    workers=settings.NOTIFICATIONS_WORKERS,
+                    batch_size=settings.NOTIFICATIONS_BATCH_SIZE,
+                    poll_interval=settings.NOTIFICATIONS_OUTBOX_POLL_INTERVAL,
+                )
+    return _dispatcher
+
+
+def notify_many(events):
+    events = list(events)
+    if not events:
+        return
+    if not settings.NOTIFICATIONS_ASYNC:
+        write_events(events)
+        return
+    enqueue_events(events)
+    # Workers only see the rows once they are committed
+    transaction.on_commit(lambda: get_dispatcher().wake())
+
+
+def notify(recipient, actor, verb, target=None):
+    notify_many([make_event(recipient, actor, verb, target)])
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from notifications.dispatch import drain_outbox
+
+
+class Command(BaseCommand):
+    help = "Write notifications still pending in the outbox (e.g. with no web process running)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=None)
+
+    def handle(self, *args, **options):
+        drained = drain_outbox(options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {drained} notification(s) from the outbox."))
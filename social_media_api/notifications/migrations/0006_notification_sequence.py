@@ -0,0 +1,36 @@
+# Generated by Django 5.2.8 on 2026-10-18 04:08
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_sequence(apps, schema_editor):
+    # Existing rows keep their id as event id, so a client's Last-Event-ID
+    # from before the upgrade still means the same position
+    Notification = apps.get_model("notifications", "Notification")
+    Notification.objects.update(sequence=F("id"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contenttypes", "0002_remove_content_type_name"),
+        ("notifications", "0005_notification_actors"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="notification",
+            name="sequence",
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_sequence, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                fields=["recipient", "sequence"], name="notif_recipient_seq_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-18 04:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0006_follow_suggestion_list"),
+        ("notifications", "0006_notification_sequence"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="NotificationLock",
+            fields=[
+                (
+                    "recipient",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="+",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -26,8 +26,89 @@ class Notification(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)
     is_read = models.BooleanField(default=False)
 
+    # Coalesced notifications ("alice and 41 others liked your post"):
+    # `actor` is the most recent actor, `actor_count` how many acted in total
+    # (one NotificationActor row each) and `actor_sample` a capped list of
+    # recent actor ids.
+    actor_count = models.PositiveIntegerField(default=1)
+    actor_sample = models.JSONField(default=list, blank=True)
+
+    # Live event id: increases per recipient, in commit order, every time the
+    # row is inserted or coalesced (see notifications.dispatch)
+    sequence = models.BigIntegerField(default=0)
+
     class Meta:
         ordering = ["-timestamp"]
+        indexes = [
+            # Finds the open row to coalesce into
+            models.Index(
+                fields=["recipient", "verb", "target_content_type", "target_object_id", "-timestamp"],
+                name="notif_coalesce_idx",
+            ),
+            # Matches NotificationListView's keyset: unread first, newest first
+            models.Index(
+                fields=["recipient", "is_read", "-timestamp", "-id"],
+                name="notif_recipient_list_idx",
+            ),
+            # Stream replay after Last-Event-ID, and the next sequence number
+            models.Index(fields=["recipient", "sequence"], name="notif_recipient_seq_idx"),
+        ]
 
     def __str__(self):
         return f"{self.actor} {self.verb} -> {self.recipient}"
+
+
+class NotificationActor(models.Model):
+    """
+    Every actor merged into a coalesced notification, so an actor who acts
+    again after dropping out of ``actor_sample`` is not counted twice.
+    """
+
+    notification = models.ForeignKey(Notification, on_delete=models.CASCADE, related_name="actors")
+    actor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+
+    class Meta:
+        unique_together = ("notification", "actor")
+
+    def __str__(self):
+        return f"{self.actor_id} in notification {self.notification_id}"
+
+
+class NotificationOutbox(models.Model):
+    """
+    Durable queue of notification events that have not been written yet.
+
+    Rows are inserted in the transaction that caused the event and turned
+    into Notification rows by the dispatcher's workers (notifications.dispatch).
+    """
+
+    recipient = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+"
+    )
+    actor = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+"
+    )
+    verb = models.CharField(max_length=255)
+    target_content_type = models.ForeignKey(
+        ContentType, on_delete=models.CASCADE, null=True, blank=True
+    )
+    target_object_id = models.PositiveIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Pending: {self.actor_id} {self.verb} -> {self.recipient_id}"
+
+
+class NotificationLock(models.Model):
+    """
+    One row per recipient, locked while notifications.dispatch coalesces and
+    numbers a batch for them. A dedicated row, so the follow endpoints'
+    counter updates on the user row never wait for a notification batch.
+    """
+
+    recipient = models.OneToOneField(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name="+"
+    )
+
+    def __str__(self):
+        return f"Notification lock for {self.recipient_id}"
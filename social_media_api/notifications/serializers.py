@@ -4,6 +4,7 @@ from .models import Notification
 
 class NotificationSerializer(serializers.ModelSerializer):
     actor_username = serializers.ReadOnlyField(source="actor.username")
+    summary = serializers.SerializerMethodField()
 
     class Meta:
         model = Notification
@@ -11,6 +12,22 @@ class NotificationSerializer(serializers.ModelSerializer):
             "id",
             "actor_username",
             "verb",
+            "actor_count",
+            "actor_sample",
+            "summary",
             "timestamp",
             "is_read",
+            "sequence",
         )
+        select_related = ("actor",)
+
+    def get_summary(self, obj):
+        others = obj.actor_count - 1
+        if others <= 0:
+            return f"{obj.actor.username} {obj.verb}"
+        return f"{obj.actor.username} and {others} other{'s' if others > 1 else ''} {obj.verb}"
+
+
+class MarkReadSerializer(serializers.Serializer):
+    # Mark everything up to and including this timestamp; omit to mark all
+    up_to = serializers.DateTimeField(required=False)
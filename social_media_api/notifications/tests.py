@@ -1,3 +1,340 @@
-from django.test import TestCase
+import asyncio
+import json
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import AsyncRequestFactory, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from social_media_api.testing import QueryCountAssertionsMixin
+
+from . import views
+from .broker import get_broker, publish_notifications
+from .dispatch import NotificationDispatcher, drain_outbox, enqueue_events, make_event, notify_many, write_events
+from .models import Notification, NotificationLock, NotificationOutbox
+from .unread import decrement_unread
+from .views import async_notification_list, notification_poll, notification_stream
+
+User = get_user_model()
+
+
+class NotificationListTestCase(QueryCountAssertionsMixin, APITestCase):
+    """
+    Tests for GET /api/notifications/.
+    """
+
+    def setUp(self):
+        self.recipient = User.objects.create_user(username="recipient", password="pass12345")
+        for i in range(25):
+            actor = User.objects.create(username=f"actor{i}")
+            Notification.objects.create(recipient=self.recipient, actor=actor, verb="started following you")
+
+        token, _ = Token.objects.get_or_create(user=self.recipient)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+
+    def test_list_uses_constant_queries(self):
+        # page only; the token is cached
+        self.assertConstantQueries(reverse("notifications"), expected=1)
+
+    def test_list_includes_actor_username(self):
+        response = self.client.get(reverse("notifications"))
+        self.assertEqual(response.data["results"][0]["actor_username"], "actor24")
+
+    async def test_async_list_matches_sync_view(self):
+        expected = (await sync_to_async(self.client.get)(reverse("notifications"))).data
+        token = await Token.objects.aget(user=self.recipient)
+        request = AsyncRequestFactory().get("/api/notifications/", headers={"Authorization": f"Token {token.key}"})
+
+        response = await async_notification_list(request)
+        self.assertEqual(json.loads(response.content)["results"], json.loads(json.dumps(expected["results"])))
+
+
+class NotificationDispatchTestCase(TransactionTestCase):
+    """
+    Tests for the background dispatcher and its outbox.
+    """
+
+    def setUp(self):
+        self.recipient = User.objects.create(username="recipient")
+        self.actors = [User.objects.create(username=f"actor{i}") for i in range(5)]
+
+    def events(self):
+        return [make_event(self.recipient, actor, "started following you", target=self.recipient) for actor in self.actors]
+
+    def test_worker_writes_events_in_batches(self):
+        # One worker: SQLite takes a single writer at a time
+        dispatcher = NotificationDispatcher(workers=1, batch_size=2, poll_interval=0.05)
+        enqueue_events(self.events())
+        dispatcher.wake()
+        for _ in range(100):
+            if not NotificationOutbox.objects.exists():
+                break
+            time.sleep(0.05)
+        dispatcher.shutdown()
+
+        self.assertEqual(Notification.objects.filter(recipient=self.recipient).count(), 5)
+        self.assertFalse(NotificationOutbox.objects.exists())
+
+    def test_outbox_is_drained_into_notifications(self):
+        enqueue_events(self.events())
+        self.assertEqual(drain_outbox(batch_size=2), 5)
+
+        notification = Notification.objects.filter(recipient=self.recipient).first()
+        self.assertEqual(notification.target, self.recipient)
+        self.assertFalse(NotificationOutbox.objects.exists())
+
+    @override_settings(NOTIFICATIONS_ASYNC=True)
+    def test_events_are_durable_with_the_transaction(self):
+        with mock.patch("notifications.dispatch.get_dispatcher"):
+            with transaction.atomic():
+                notify_many(self.events())
+                # Queued with the request's writes, before any worker runs
+                self.assertEqual(NotificationOutbox.objects.count(), 5)
+            try:
+                with transaction.atomic():
+                    notify_many(self.events())
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(NotificationOutbox.objects.count(), 5)
+
+    @override_settings(NOTIFICATIONS_ASYNC=False)
+    def test_follow_notifies_synchronously_when_async_is_off(self):
+        token = Token.objects.create(user=self.actors[0])
+        self.client.post(
+            reverse("follow_user", args=[self.recipient.id]),
+            HTTP_AUTHORIZATION=f"Token {token.key}",
+        )
+        self.assertTrue(
+            Notification.objects.filter(recipient=self.recipient, verb="started following you").exists()
+        )
+
+
+class NotificationCoalescingTestCase(APITestCase):
+    """
+    Likes on the same target collapse into one unread notification.
+    """
+
+    def setUp(self):
+        self.recipient = User.objects.create(username="recipient")
+        self.other_target = User.objects.create(username="other")
+        self.actors = [User.objects.create(username=f"actor{i}") for i in range(8)]
+
+    def like(self, actor, target=None):
+        return make_event(self.recipient, actor, "liked your post", target=target or self.recipient)
+
+    def test_events_merge_into_one_row(self):
+        write_events([self.like(actor) for actor in self.actors[:3]])
+        write_events([self.like(actor) for actor in self.actors[3:]] + [self.like(self.actors[0])])
+
+        notification = Notification.objects.get(recipient=self.recipient)
+        self.assertEqual(notification.actor_count, 8)
+        self.assertEqual(notification.actor_id, self.actors[0].id)
+        self.assertEqual(len(notification.actor_sample), 5)
+        self.assertEqual(notification.actor_sample[-1], self.actors[0].id)
+
+    def test_actor_outside_the_sample_is_not_counted_twice(self):
+        write_events([self.like(actor) for actor in self.actors[:7]])
+        write_events([self.like(self.actors[0])])  # dropped out of the 5-actor sample
+
+        notification = Notification.objects.get(recipient=self.recipient)
+        self.assertEqual(notification.actor_count, 7)
+        self.assertEqual(notification.actor_sample[-1], self.actors[0].id)
+        self.assertEqual(notification.actors.count(), 7)
+
+    def test_different_targets_and_read_rows_are_not_merged(self):
+        write_events([self.like(self.actors[0]), self.like(self.actors[1], target=self.other_target)])
+        Notification.objects.update(is_read=True)
+        write_events([self.like(self.actors[2])])
+
+        self.assertEqual(Notification.objects.filter(recipient=self.recipient).count(), 3)
+
+    def test_batches_lock_a_dedicated_row_not_the_user(self):
+        with CaptureQueriesContext(connection) as queries:
+            write_events([self.like(self.actors[0])])
+            write_events([self.like(self.actors[1])])
+
+        self.assertTrue(NotificationLock.objects.filter(recipient=self.recipient).exists())
+        # Follows update the user row's counters; notification batches never touch it
+        self.assertFalse([query for query in queries if '"accounts_user"' in query["sql"]])
+
+    def test_summary_mentions_other_actors(self):
+        write_events([self.like(actor) for actor in self.actors[:3]])
+        token = Token.objects.create(user=self.recipient)
+        response = self.client.get(reverse("notifications"), HTTP_AUTHORIZATION=f"Token {token.key}")
+        self.assertEqual(response.data["results"][0]["summary"], "actor2 and 2 others liked your post")
+
+
+class UnreadNotificationsTestCase(APITestCase):
+    """
+    Tests for the unread badge counter and bulk mark-read endpoint.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.recipient = User.objects.create(username="recipient")
+        self.actors = [User.objects.create(username=f"actor{i}") for i in range(3)]
+        token = Token.objects.create(user=self.recipient)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+
+    def follow_events(self, actors):
+        return [make_event(self.recipient, actor, "started following you") for actor in actors]
+
+    def write(self, events):
+        # The counter moves once the notifications are committed
+        with self.captureOnCommitCallbacks(execute=True):
+            write_events(events)
+
+    def unread(self):
+        return self.client.get(reverse("notifications_unread_count")).data["unread"]
+
+    def test_counter_is_cached_and_incremented(self):
+        self.write(self.follow_events(self.actors[:2]))
+        self.assertEqual(self.unread(), 2)
+
+        self.write(self.follow_events(self.actors[2:]))
+        with self.assertNumQueries(0):  # token and counter are both cached
+            self.assertEqual(self.unread(), 3)
+
+    def test_mark_read_up_to_timestamp(self):
+        self.write(self.follow_events(self.actors))
+        self.assertEqual(self.unread(), 3)
+        oldest = Notification.objects.order_by("id").first()
+        Notification.objects.exclude(id=oldest.id).update(timestamp=oldest.timestamp + timedelta(minutes=5))
+
+        response = self.client.post(
+            reverse("notifications_mark_read"), {"up_to": oldest.timestamp.isoformat()}, format="json"
+        )
+        self.assertEqual(response.data["marked_read"], 1)
+        with self.assertNumQueries(0):  # decremented, not recounted
+            self.assertEqual(self.unread(), 2)
+
+    def test_mark_all_read(self):
+        self.write(self.follow_events(self.actors))
+        self.assertEqual(self.unread(), 3)
+
+        response = self.client.post(reverse("notifications_mark_read"))
+        self.assertEqual(response.data["marked_read"], 3)
+        self.assertEqual(self.unread(), 0)
+        self.assertFalse(Notification.objects.filter(is_read=False).exists())
+
+    def test_notification_arriving_during_mark_read_stays_counted(self):
+        self.write(self.follow_events(self.actors[:2]))
+        self.assertEqual(self.unread(), 2)
+
+        def insert_then_decrement(user_id, count):
+            # Lands between the UPDATE and the counter change
+            self.write(self.follow_events(self.actors[2:]))
+            decrement_unread(user_id, count)
+
+        with mock.patch("notifications.views.decrement_unread", insert_then_decrement):
+            self.client.post(reverse("notifications_mark_read"))
+        self.assertEqual(self.unread(), 1)
+        self.assertEqual(Notification.objects.filter(is_read=False).count(), 1)
+
+
+class LiveNotificationsTestCase(APITestCase):
+    """
+    Tests for the SSE stream and long-poll endpoints and the broker feeding them.
+    """
+
+    def setUp(self):
+        self.recipient = User.objects.create(username="recipient")
+        self.actor = User.objects.create(username="actor")
+        self.token = Token.objects.create(user=self.recipient)
+        self.factory = AsyncRequestFactory()
+
+    def get(self, path, **params):
+        return self.factory.get(path, params, headers={"Authorization": f"Token {self.token.key}"})
+
+    def write_committed(self, verb, actor=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            write_events([make_event(self.recipient, actor or self.actor, verb)])
+
+    async def write_when_listening(self, verb):
+        while not get_broker().listening({self.recipient.id}):
+            await asyncio.sleep(0.01)
+        await sync_to_async(self.write_committed)(verb)
+
+    def test_publish_skips_query_without_listeners(self):
+        with self.assertNumQueries(0):
+            publish_notifications([(1, self.recipient.id)])
+
+    async def test_poll_returns_backlog_immediately(self):
+        await sync_to_async(self.write_committed)("started following you")
+
+        response = await notification_poll(self.get("/api/notifications/poll/", after=0, timeout=5))
+        data = json.loads(response.content)
+        self.assertEqual([row["verb"] for row in data["results"]], ["started following you"])
+        self.assertEqual(data["last_event_id"], data["results"][0]["sequence"])
+
+        response = await notification_poll(
+            self.get("/api/notifications/poll/", after=data["last_event_id"], timeout=0)
+        )
+        self.assertEqual(json.loads(response.content)["results"], [])
+
+    async def test_coalesced_row_is_replayed_under_a_newer_event_id(self):
+        verb = "liked your post"
+        await sync_to_async(self.write_committed)(verb)
+        response = await notification_poll(self.get("/api/notifications/poll/", timeout=0))
+        first = json.loads(response.content)
+
+        # Coalesced while the client was away: same row, later event id
+        other = await User.objects.acreate(username="other")
+        await sync_to_async(self.write_committed)(verb, actor=other)
+        response = await notification_poll(
+            self.get("/api/notifications/poll/", after=first["last_event_id"], timeout=0)
+        )
+        data = json.loads(response.content)
+        self.assertEqual([row["id"] for row in data["results"]], [first["results"][0]["id"]])
+        self.assertEqual(data["results"][0]["actor_count"], 2)
+        self.assertGreater(data["last_event_id"], first["last_event_id"])
+
+    async def test_poll_wakes_up_on_new_notification(self):
+        poll = notification_poll(self.get("/api/notifications/poll/", timeout=5))
+        response, _ = await asyncio.gather(poll, self.write_when_listening("started following you"))
+
+        self.assertEqual(json.loads(response.content)["results"][0]["actor_username"], "actor")
+        self.assertFalse(get_broker().listening({self.recipient.id}))
+
+    @override_settings(NOTIFICATIONS_STREAM_KEEPALIVE=0.1, NOTIFICATIONS_STREAM_MAX_SECONDS=0.5)
+    async def test_stream_replays_backlog_then_pushes(self):
+        await sync_to_async(self.write_committed)("started following you")
+        response = await notification_stream(self.get("/api/notifications/stream/"))
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+
+        chunks = aiter(response.streaming_content)
+        # Retry hint and backlog first; a live notification only after that
+        body = (await anext(chunks) + await anext(chunks)).decode()
+        await sync_to_async(self.write_committed)("liked your post")
+        body += b"".join([chunk async for chunk in chunks]).decode()
+
+        events = [json.loads(line[len("data: "):]) for line in body.splitlines() if line.startswith("data: ")]
+        self.assertEqual([event["verb"] for event in events], ["started following you", "liked your post"])
+        self.assertTrue(body.startswith("retry: 3000"))
+        self.assertIn(": keepalive", body)
+        self.assertFalse(get_broker().listening({self.recipient.id}))
+
+    @override_settings(NOTIFICATIONS_STREAM_KEEPALIVE=0.1, NOTIFICATIONS_STREAM_MAX_SECONDS=0.3)
+    async def test_stream_sends_backlog_events_once(self):
+        unread_since = views._unread_since
+
+        async def written_meanwhile(user, after):
+            # Committed between subscribing and reading the backlog: queued and in the backlog
+            await sync_to_async(self.write_committed)("started following you")
+            return await unread_since(user, after)
+
+        with mock.patch.object(views, "_unread_since", written_meanwhile):
+            response = await notification_stream(self.get("/api/notifications/stream/"))
+            body = b"".join([chunk async for chunk in response.streaming_content]).decode()
+
+        events = [line for line in body.splitlines() if line.startswith("data: ")]
+        self.assertEqual(len(events), 1)
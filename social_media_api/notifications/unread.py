@@ -0,0 +1,53 @@
+"""
+Cached per-user unread notification counter.
+
+The count is computed once from the (recipient, is_read, timestamp) index,
+then kept in the cache: incremented as notifications are inserted and
+decremented by the number of rows each mark-read updated, so badge polling
+is a single cache read. On Redis both are atomic, so concurrent inserts and
+mark-reads never overwrite each other's changes; the database cache's
+incr/decr read and then write, and may drift until the TTL expires.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Notification
+
+
+def _key(user_id):
+    return f"notifications:unread:{user_id}"
+
+
+def get_unread_count(user_id):
+    count = cache.get(_key(user_id))
+    if count is None:
+        count = Notification.objects.filter(recipient_id=user_id, is_read=False).count()
+        # add(): never overwrite a counter another request has started moving
+        cache.add(_key(user_id), count, settings.NOTIFICATIONS_UNREAD_CACHE_TTL)
+    return count
+
+
+def increment_unread(counts):
+    """
+    ``counts`` maps recipient id -> number of new unread notifications.
+    """
+    for user_id, count in counts.items():
+        try:
+            cache.incr(_key(user_id), count)
+        except ValueError:
+            # Not cached yet: the next read counts from the database
+            pass
+
+
+def decrement_unread(user_id, count):
+    if not count:
+        return
+    try:
+        remaining = cache.decr(_key(user_id), count)
+    except ValueError:
+        return  # not cached
+    if remaining < 0:
+        # Drifted (e.g. rows deleted behind the counter's back); recount
+        cache.delete(_key(user_id))
+
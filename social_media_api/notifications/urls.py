@@ -1,6 +1,28 @@
+from django.conf import settings
 from django.urls import path
-from .views import NotificationListView
+from .views import (
+    NotificationListView,
+    async_notification_list,
+    mark_read,
+    notification_poll,
+    notification_stream,
+    unread_count,
+)
 
 urlpatterns = [
-    path("notifications/", NotificationListView.as_view(), name="notifications"),
+    path(
+        "notifications/",
+        async_notification_list if settings.ASYNC_API_VIEWS else NotificationListView.as_view(),
+        name="notifications",
+    ),
+    path("notifications/unread-count/", unread_count, name="notifications_unread_count"),
+    path("notifications/mark-read/", mark_read, name="notifications_mark_read"),
 ]
+
+if settings.ASYNC_API_VIEWS:
+    # Long-lived connections: only under ASGI, where WSGI would buffer the
+    # stream and hold a worker thread per client
+    urlpatterns += [
+        path("notifications/stream/", notification_stream, name="notifications_stream"),
+        path("notifications/poll/", notification_poll, name="notifications_poll"),
+    ]
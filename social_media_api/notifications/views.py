@@ -1,11 +1,158 @@
-from rest_framework import generics, permissions
+import asyncio
+import json
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from rest_framework import exceptions, generics, permissions, status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+from social_media_api.asyncapi import async_api_view, json_response
+from social_media_api.optimization import optimize_queryset
+from social_media_api.pagination import KeysetPagination
+
+from .broker import get_broker
 from .models import Notification
-from .serializers import NotificationSerializer
+from .serializers import MarkReadSerializer, NotificationSerializer
+from .unread import decrement_unread, get_unread_count
 
 
 class NotificationListView(generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = NotificationSerializer
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
-        return Notification.objects.filter(recipient=self.request.user).order_by("is_read", "-timestamp")
+        return notification_queryset(self.request)
+
+
+def notification_queryset(request):
+    queryset = Notification.objects.filter(recipient=request.user).order_by("is_read", "-timestamp", "-id")
+    return optimize_queryset(queryset, NotificationSerializer, request)
+
+
+# Routed instead of NotificationListView when ASYNC_API_VIEWS is on
+@async_api_view()
+async def async_notification_list(request):
+    paginator = KeysetPagination()
+    page = await paginator.apaginate_queryset(notification_queryset(request), request)
+    serializer = NotificationSerializer(page, many=True)
+    return json_response(paginator.get_paginated_data(serializer.data))
+
+
+def _cursor(request):
+    # EventSource sends Last-Event-ID when it reconnects
+    value = request.headers.get("Last-Event-ID") or request.query_params.get("after") or 0
+    try:
+        return max(int(value), 0)
+    except (TypeError, ValueError):
+        raise exceptions.ValidationError({"after": "An event id (notification sequence) is required."})
+
+
+async def _unread_since(user, after):
+    """
+    The newest NOTIFICATIONS_STREAM_BACKLOG unread rows inserted or coalesced
+    after event id ``after``, oldest first.
+    """
+    queryset = (
+        Notification.objects.filter(recipient_id=user.id, is_read=False, sequence__gt=after)
+        .select_related("actor")
+        .order_by("-sequence")[: settings.NOTIFICATIONS_STREAM_BACKLOG]
+    )
+    rows = [notification async for notification in queryset]
+    return NotificationSerializer(reversed(rows), many=True).data
+
+
+def _event(data):
+    # The sequence, not the pk: it only grows, also when a row is coalesced
+    return f"id: {data['sequence']}\nevent: notification\ndata: {json.dumps(data, cls=JSONEncoder)}\n\n"
+
+
+async def _stream(user, after):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.NOTIFICATIONS_STREAM_MAX_SECONDS
+    # Subscribe before reading the backlog so nothing committed in between is lost
+    async with get_broker().subscribe(user.id) as subscription:
+        yield "retry: 3000\n\n"
+        last_sent = after
+        for data in await _unread_since(user, after):
+            yield _event(data)
+            last_sent = max(last_sent, data["sequence"])
+        while (remaining := deadline - loop.time()) > 0:
+            try:
+                data = await asyncio.wait_for(
+                    subscription.get(), min(settings.NOTIFICATIONS_STREAM_KEEPALIVE, remaining)
+                )
+            except TimeoutError:
+                # Comment line: keeps proxies from closing an idle connection
+                yield ": keepalive\n\n"
+                continue
+            if data["sequence"] <= last_sent:
+                continue  # committed after subscribing, already sent with the backlog
+            last_sent = data["sequence"]
+            yield _event(data)
+
+
+@async_api_view()
+async def notification_stream(request):
+    """
+    Server-sent events: unread notifications inserted or coalesced after
+    Last-Event-ID (or ``?after=``), then every notification created or
+    coalesced while the connection is open. Event ids are the rows'
+    ``sequence``, which a coalesced row gets a new, higher value of.
+    """
+    response = StreamingHttpResponse(_stream(request.user, _cursor(request)), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # nginx would otherwise buffer the stream
+    return response
+
+
+@async_api_view()
+async def notification_poll(request):
+    """
+    Long-poll fallback for clients without EventSource: answers at once if
+    there are unread notifications past event id ``?after=``, otherwise waits
+    up to ``?timeout=`` seconds (capped at NOTIFICATIONS_POLL_TIMEOUT) for one.
+    """
+    after = _cursor(request)
+    try:
+        timeout = float(request.query_params.get("timeout", settings.NOTIFICATIONS_POLL_TIMEOUT))
+    except ValueError:
+        raise exceptions.ValidationError({"timeout": "A number of seconds is required."})
+    timeout = min(max(timeout, 0), settings.NOTIFICATIONS_POLL_TIMEOUT)
+
+    async with get_broker().subscribe(request.user.id) as subscription:
+        results = list(await _unread_since(request.user, after))
+        if not results:
+            try:
+                results.append(await asyncio.wait_for(subscription.get(), timeout))
+            except TimeoutError:
+                pass
+            results += subscription.drain()
+
+    last_event_id = max([data["sequence"] for data in results], default=after)
+    return json_response({"results": results, "last_event_id": last_event_id})
+
+
+@api_view(["GET"])
+@permission_classes([permissions.IsAuthenticated])
+def unread_count(request):
+    return Response({"unread": get_unread_count(request.user.id)})
+
+
+@api_view(["POST"])
+@permission_classes([permissions.IsAuthenticated])
+def mark_read(request):
+    serializer = MarkReadSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    up_to = serializer.validated_data.get("up_to")
+
+    # Single UPDATE over the (recipient, is_read, timestamp) index
+    unread = Notification.objects.filter(recipient=request.user, is_read=False)
+    if up_to is not None:
+        unread = unread.filter(timestamp__lte=up_to)
+    updated = unread.update(is_read=True)
+    # By what this UPDATE changed: a notification inserted meanwhile stays counted
+    decrement_unread(request.user.id, updated)
+
+    return Response({"marked_read": updated}, status=status.HTTP_200_OK)
@@ -0,0 +1,218 @@
+"""
+Response caching for the post endpoints.
+
+Every cached response is keyed on a version stamp. A post's detail depends
+on that post's stamp, which saving the post or any like or comment on it
+bumps (see posts.signals and posts.likes). A list page depends on the list
+membership stamp, bumped only when a post is created, edited or deleted,
+plus the stamps of the posts it shows: the page's post ids are remembered
+per membership stamp, so a like only invalidates the pages showing that
+post. The same key doubles as the ETag, letting clients and CDNs revalidate
+with ``If-None-Match`` and get a 304 without the response being rebuilt.
+
+Stamps and entries live in the default cache, which must be shared by all
+processes (see CACHES in settings).
+"""
+
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import urlencode
+from rest_framework import status
+from rest_framework.response import Response
+
+from social_media_api.asyncapi import json_response
+
+LIST_VERSION_KEY = "posts:list:version"
+
+
+def _post_version_key(post_id):
+    return f"posts:post:{post_id}:version"
+
+
+def _get_version(key):
+    version = cache.get(key)
+    if version is None:
+        # Time-based so a version lost to eviction is never reused
+        version = time.time_ns()
+        cache.add(key, version, None)
+        version = cache.get(key, version)
+    return version
+
+
+async def _aget_version(key):
+    version = await cache.aget(key)
+    if version is None:
+        version = time.time_ns()
+        await cache.aadd(key, version, None)
+        version = await cache.aget(key, version)
+    return version
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
+
+
+def list_version():
+    return _get_version(LIST_VERSION_KEY)
+
+
+def post_version(post_id):
+    return _get_version(_post_version_key(post_id))
+
+
+async def apost_version(post_id):
+    return await _aget_version(_post_version_key(post_id))
+
+
+def post_versions(post_ids):
+    """
+    The stamps of ``post_ids``, in order, with one or two cache round trips.
+    """
+    keys = [_post_version_key(post_id) for post_id in post_ids]
+    found = cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        now = time.time_ns()
+        for key in missing:
+            cache.add(key, now, None)
+        found.update(cache.get_many(missing))
+    return [found.get(key, 0) for key in keys]
+
+
+def invalidate_post(post_id):
+    # The post's detail and every list page showing it
+    _bump(_post_version_key(post_id))
+
+
+def invalidate_post_list():
+    # Which posts a list page shows (creates, deletes, edits)
+    _bump(LIST_VERSION_KEY)
+
+
+def _etag(request, version):
+    query = urlencode(sorted(request.query_params.lists()), doseq=True)
+    viewer = request.user.pk if request.user.is_authenticated else "anon"
+    raw = f"{request.get_host()}|{request.path}|{query}|{version}|{viewer}"
+    return '"' + hashlib.sha1(raw.encode()).hexdigest() + '"'
+
+
+def _not_modified(request, etag):
+    header = request.headers.get("If-None-Match", "")
+    return header.strip() == "*" or etag in [tag.strip() for tag in header.split(",")]
+
+
+def with_cache_headers(response, request, etag):
+    response["ETag"] = etag
+    scope = "private" if request.user.is_authenticated else "public"
+    response["Cache-Control"] = f"{scope}, max-age=0, must-revalidate"
+    patch_vary_headers(response, ("Authorization", "Accept"))
+    return response
+
+
+def _cache_key(etag):
+    return f"posts:response:{etag}"
+
+
+def cached_response(request, version, build):
+    """
+    Serve ``build()`` (returning a DRF Response) with an ETag derived from
+    ``version``; anonymous 200 responses are cached under that ETag.
+    """
+    etag = _etag(request, version)
+    if _not_modified(request, etag):
+        return with_cache_headers(Response(status=status.HTTP_304_NOT_MODIFIED), request, etag)
+
+    anonymous = not request.user.is_authenticated
+    cache_key = _cache_key(etag)
+    if anonymous:
+        data = cache.get(cache_key)
+        if data is not None:
+            response = with_cache_headers(Response(data), request, etag)
+            response["X-Cache"] = "HIT"
+            return response
+
+    response = build()
+    if response.status_code != status.HTTP_200_OK:
+        return response
+    if anonymous:
+        cache.set(cache_key, response.data, settings.POSTS_RESPONSE_CACHE_TTL)
+        response["X-Cache"] = "MISS"
+    return with_cache_headers(response, request, etag)
+
+
+async def acached_response(request, version, build):
+    """
+    Async twin of ``cached_response``; ``build`` is a coroutine
+    function returning the response data. Shares cache entries with it.
+    """
+    etag = _etag(request, version)
+    if _not_modified(request, etag):
+        return with_cache_headers(HttpResponseNotModified(), request, etag)
+
+    anonymous = not request.user.is_authenticated
+    if anonymous:
+        data = await cache.aget(_cache_key(etag))
+        if data is not None:
+            response = with_cache_headers(json_response(data), request, etag)
+            response["X-Cache"] = "HIT"
+            return response
+
+    data = await build()
+    response = json_response(data)
+    if anonymous:
+        await cache.aset(_cache_key(etag), data, settings.POSTS_RESPONSE_CACHE_TTL)
+        response["X-Cache"] = "MISS"
+    return with_cache_headers(response, request, etag)
+
+
+def _page_key(request, membership):
+    query = urlencode(sorted(request.query_params.lists()), doseq=True)
+    raw = f"{request.get_host()}|{request.path}|{query}|{membership}"
+    return "posts:page:" + hashlib.sha1(raw.encode()).hexdigest()
+
+
+def cached_list_response(request, build):
+    """
+    ``cached_response`` for a page of posts, versioned by the list membership
+    stamp and the stamps of the posts on the page.
+    """
+    membership = list_version()
+    page_key = _page_key(request, membership)
+    post_ids = cache.get(page_key)
+    if post_ids is None:
+        # First request for this page: learn which posts it shows. Not cached
+        # or tagged, since stamps read after building it may be newer than
+        # its data; the next request is versioned properly.
+        response = build()
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(page_key, [row["id"] for row in response.data["results"]], settings.POSTS_RESPONSE_CACHE_TTL)
+            if not request.user.is_authenticated:
+                response["X-Cache"] = "MISS"
+        return response
+
+    version = ":".join(map(str, [membership, *post_versions(post_ids)]))
+    return cached_response(request, version, build)
+
+
+class CachedResponseMixin:
+    """
+    ViewSet mixin caching anonymous list/retrieve responses and answering
+    conditional requests with 304 Not Modified.
+    """
+
+    def list(self, request, *args, **kwargs):
+        build = super().list
+        return cached_list_response(request, lambda: build(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        build = super().retrieve
+        version = post_version(kwargs[self.lookup_url_kwarg or self.lookup_field])
+        return cached_response(request, version, lambda: build(request, *args, **kwargs))
@@ -0,0 +1,29 @@
+"""
+Helpers for the denormalized ``likes_count`` / ``comments_count`` on Post.
+"""
+
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Comment, Like, Post
+
+COUNTED_MODELS = {
+    "likes_count": Like,
+    "comments_count": Comment,
+}
+
+
+def adjust_counter(post_id, field, delta):
+    # Single UPDATE ... SET field = field + delta; never drops below zero
+    Post.objects.filter(pk=post_id).update(**{field: Greatest(F(field) + delta, Value(0))})
+
+
+def actual_count(model):
+    counts = (
+        model.objects.filter(post=OuterRef("pk"))
+        .order_by()
+        .values("post")
+        .annotate(n=Count("id"))
+        .values("n")
+    )
+    return Coalesce(Subquery(counts), 0)
@@ -0,0 +1,101 @@
+"""
+Race-free like/unlike with single-statement writes.
+
+A like is one ``INSERT ... ON CONFLICT DO NOTHING`` and an unlike one
+``DELETE``; the affected row count tells us whether anything changed, so
+concurrent double-taps cannot double count. The post counter is adjusted in
+the same transaction.
+"""
+
+from django.db import IntegrityError, connection, transaction
+from django.http import Http404
+from django.utils import timezone
+
+from .caching import invalidate_post
+from .counters import adjust_counter
+from .models import Like, Post
+
+# Backends that understand INSERT ... ON CONFLICT DO NOTHING
+ON_CONFLICT_VENDORS = ("postgresql", "sqlite")
+
+
+def _insert_like(user_id, post_id):
+    table = connection.ops.quote_name(Like._meta.db_table)
+    if connection.vendor in ON_CONFLICT_VENDORS:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} (post_id, user_id, created_at) VALUES (%s, %s, %s) "
+                "ON CONFLICT (post_id, user_id) DO NOTHING",
+                [post_id, user_id, timezone.now()],
+            )
+            return cursor.rowcount == 1
+
+    try:
+        with transaction.atomic():
+            Like.objects.create(post_id=post_id, user_id=user_id)
+    except IntegrityError:
+        return False
+    return True
+
+
+def _delete_like(user_id, post_id):
+    table = connection.ops.quote_name(Like._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {table} WHERE post_id = %s AND user_id = %s", [post_id, user_id])
+        return cursor.rowcount
+
+
+def _post_state(post_id):
+    state = Post.objects.filter(pk=post_id).values("author_id", "likes_count").first()
+    if state is None:
+        raise Http404("No Post matches the given query.")
+    return state
+
+
+def add_like(user, post_id):
+    """
+    Returns ``(created, post_state)``; raises Http404 for a missing post.
+    """
+    with transaction.atomic():
+        created = _insert_like(user.pk, post_id)
+        if created:
+            adjust_counter(post_id, "likes_count", 1)
+        # Also rolls the insert back when the post does not exist
+        state = _post_state(post_id)
+    if created:
+        invalidate_post(post_id)
+    return created, state
+
+
+def remove_like(user, post_id):
+    """
+    Returns ``(deleted, post_state)``; raises Http404 for a missing post.
+    """
+    with transaction.atomic():
+        deleted = _delete_like(user.pk, post_id)
+        if deleted:
+            adjust_counter(post_id, "likes_count", -deleted)
+        state = _post_state(post_id)
+    if deleted:
+        invalidate_post(post_id)
+    return bool(deleted), state
+
+
+def toggle_like(user, post_id):
+    """
+    Unlike if liked, like otherwise; returns ``(liked, created, post_state)``.
+    """
+    with transaction.atomic():
+        created = False
+        deleted = _delete_like(user.pk, post_id)
+        if deleted:
+            adjust_counter(post_id, "likes_count", -deleted)
+        else:
+            created = _insert_like(user.pk, post_id)
+            if created:
+                adjust_counter(post_id, "likes_count", 1)
+        state = _post_state(post_id)
+    if deleted or created:
+        invalidate_post(post_id)
+    # A concurrent request may have liked it first; the post is liked either way
+    return not deleted, created, state
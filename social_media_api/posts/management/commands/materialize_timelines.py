@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from posts.timeline import materialize_pending
+
+
+class Command(BaseCommand):
+    help = "Copy the recent posts of authors back at the fan-out limit into their followers' timelines."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        written = materialize_pending(options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} timeline row(s)."))
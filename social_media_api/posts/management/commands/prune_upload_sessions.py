@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from posts.uploads import prune_expired_sessions
+
+
+class Command(BaseCommand):
+    help = "Delete expired resumable upload sessions and their partial files."
+
+    def handle(self, *args, **options):
+        pruned = prune_expired_sessions()
+        self.stdout.write(self.style.SUCCESS(f"Pruned {pruned} expired upload session(s)."))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.tags import sync_post_tags
+
+
+class Command(BaseCommand):
+    help = "Re-extract hashtags and mentions for every post (no mention notifications are sent)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        synced = 0
+        for post in Post.objects.only("id", "author_id", "content", "created_at").iterator(options["batch_size"]):
+            sync_post_tags(post, notify=False)
+            synced += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Synced hashtags and mentions for {synced} post(s)."))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from posts.search import install_search_index
+
+
+class Command(BaseCommand):
+    help = (
+        "(Re)create the full-text search index for posts and repopulate it. "
+        "Run after migrations that rebuild the posts_post table on SQLite, "
+        "which drops the FTS triggers."
+    )
+
+    def handle(self, *args, **options):
+        install_search_index(connection)
+        self.stdout.write(self.style.SUCCESS(f"Search index installed for {connection.vendor}."))
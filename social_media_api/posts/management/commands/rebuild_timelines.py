@@ -0,0 +1,40 @@
+from itertools import groupby
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from posts.models import TimelineEntry
+from posts.timeline import backfill_authors, fanout_limit
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Rebuild materialized home timelines from the current follow graph."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--clear",
+            action="store_true",
+            help="Delete all existing timeline entries first.",
+        )
+
+    def handle(self, *args, **options):
+        if options["clear"]:
+            TimelineEntry.objects.all().delete()
+
+        # Authors over the limit are served by fan-out on read
+        follows = (
+            User.following.through.objects.filter(to_user__followers_count__lte=fanout_limit())
+            .order_by("from_user_id")
+            .values_list("from_user_id", "to_user_id")
+        )
+        followers = count = 0
+        for follower_id, edges in groupby(follows.iterator(chunk_size=1000), key=lambda edge: edge[0]):
+            author_ids = [author_id for _, author_id in edges]
+            # One ROW_NUMBER() query per follower instead of one per follow
+            backfill_authors(User(pk=follower_id), author_ids)
+            followers += 1
+            count += len(author_ids)
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt timelines for {count} follow(s) of {followers} user(s)."))
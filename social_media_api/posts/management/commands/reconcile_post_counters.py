@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F, Q
+
+from posts.counters import COUNTED_MODELS, actual_count
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = "Recompute denormalized like/comment counters on posts that have drifted."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        actual = {f"actual_{field}": actual_count(model) for field, model in COUNTED_MODELS.items()}
+        drifted = Q()
+        for field in COUNTED_MODELS:
+            drifted |= ~Q(**{field: F(f"actual_{field}")})
+
+        fixed = 0
+        last_id = 0
+        while True:
+            batch = list(
+                Post.objects.filter(id__gt=last_id)
+                .order_by("id")
+                .values_list("id", flat=True)[:batch_size]
+            )
+            if not batch:
+                break
+            last_id = batch[-1]
+
+            posts = list(
+                Post.objects.filter(id__in=batch)
+                .annotate(**actual)
+                .filter(drifted)
+                .only("id", *COUNTED_MODELS)
+            )
+            for post in posts:
+                for field in COUNTED_MODELS:
+                    setattr(post, field, getattr(post, f"actual_{field}"))
+            Post.objects.bulk_update(posts, list(COUNTED_MODELS))
+            fixed += len(posts)
+
+        self.stdout.write(self.style.SUCCESS(f"Reconciled counters on {fixed} post(s)."))
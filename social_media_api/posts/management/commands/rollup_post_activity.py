@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from posts.trending import refresh_trending, rollup_activity
+
+
+class Command(BaseCommand):
+    help = "Fold minute activity buckets into hourly ones, expire old buckets and refresh trending posts."
+
+    def handle(self, *args, **options):
+        # Score first so the rollup can fold every minute up to the new watermark
+        ranked = refresh_trending()
+        rolled_up, expired = rollup_activity()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Ranked {len(ranked['posts'])} trending post(s); rolled up {rolled_up} minute bucket(s), "
+                f"deleted {expired} expired bucket(s)."
+            )
+        )
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-18 04:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0009_attachments"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TrendingState",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("scored_until", models.DateTimeField(null=True)),
+                ("scores", models.JSONField(default=dict)),
+            ],
+        ),
+    ]
@@ -1,3 +1,5 @@
+import uuid
+
 from django.conf import settings
 from django.db import models
 
@@ -13,6 +15,17 @@ class Post(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Denormalized counters, kept in sync with F() updates by the views.
+    # `python manage.py reconcile_post_counters` repairs any drift.
+    likes_count = models.PositiveIntegerField(default=0)
+    comments_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Backs keyset pagination on (created_at, id)
+            models.Index(fields=["-created_at", "-id"], name="post_recent_idx"),
+        ]
+
     def __str__(self):
         return f"{self.title} by {self.author}"
 
@@ -32,6 +45,11 @@ class Comment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["-created_at", "-id"], name="comment_recent_idx"),
+        ]
+
     def __str__(self):
         return f"Comment by {self.author} on {self.post_id}"
 
@@ -48,3 +66,202 @@ class Like(models.Model):
 
     def __str__(self):
         return f"{self.user} liked post {self.post_id}"
+
+
+class TimelineEntry(models.Model):
+    """
+    One row per (follower, post) in a user's materialized home timeline.
+
+    Rows are written when a post is created (fan-out on write) so the feed
+    is a range scan over (user, created_at) instead of a join across every
+    followed author.
+    """
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="timeline_entries",
+    )
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE, related_name="timeline_entries"
+    )
+    # Copied from the post so unfollow can drop entries without a join
+    author = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+"
+    )
+    created_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ("user", "post")
+        indexes = [
+            models.Index(fields=["user", "-created_at", "-post"], name="timeline_user_recent_idx"),
+            models.Index(fields=["user", "author"], name="timeline_user_author_idx"),
+        ]
+
+    def __str__(self):
+        return f"Post {self.post_id} in timeline of {self.user_id}"
+
+
+class PendingMaterialization(models.Model):
+    """
+    An author who dropped back to FEED_FANOUT_MAX_FOLLOWERS and whose recent
+    posts still have to be copied into their followers' timelines.
+
+    Queued by unfollows and worked off by ``materialize_timelines``; until
+    then the feed keeps merging the author in at read time. Repeated
+    crossings collapse into the one row.
+    """
+
+    author = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="pending_materialization",
+    )
+    queued_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Materialize timelines for author {self.author_id}"
+
+
+class PostActivity(models.Model):
+    """
+    Likes and comments a post received in one time bucket.
+
+    Writes land in per-minute buckets; ``rollup_post_activity`` folds old
+    minute buckets into hourly ones and drops hours past the trending
+    window, so the table stays proportional to recent activity.
+    """
+
+    MINUTE = "minute"
+    HOUR = "hour"
+    GRANULARITY_CHOICES = [(MINUTE, "Minute"), (HOUR, "Hour")]
+
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="activity")
+    granularity = models.CharField(max_length=6, choices=GRANULARITY_CHOICES)
+    bucket = models.DateTimeField()
+    likes = models.PositiveIntegerField(default=0)
+    comments = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("post", "granularity", "bucket")
+        indexes = [
+            models.Index(fields=["granularity", "bucket"], name="activity_bucket_idx"),
+        ]
+
+    def __str__(self):
+        return f"Post {self.post_id} {self.granularity} {self.bucket:%Y-%m-%d %H:%M}"
+
+
+class TrendingState(models.Model):
+    """
+    The incremental trending scores; a single row, see posts.trending.
+
+    Every minute bucket before ``scored_until`` is already counted in
+    ``scores``, so ``rollup_post_activity`` only folds minutes before it.
+    Refreshes and rollups lock the row, which serializes them across
+    processes.
+    """
+
+    scored_until = models.DateTimeField(null=True)
+    # {post id: decayed score as of scored_until}
+    scores = models.JSONField(default=dict)
+
+    def __str__(self):
+        return f"Trending scores until {self.scored_until}"
+
+
+class Hashtag(models.Model):
+    # Stored lower-cased; see posts.tags
+    name = models.CharField(max_length=100, unique=True)
+
+    def __str__(self):
+        return f"#{self.name}"
+
+
+class PostHashtag(models.Model):
+    """
+    A hashtag used in a post. Written by posts.tags when the post is saved;
+    ``created_at`` is copied from the post like TimelineEntry's so
+    posts-by-tag pages are a range scan over (hashtag, created_at).
+    """
+
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="post_hashtags")
+    hashtag = models.ForeignKey(Hashtag, on_delete=models.CASCADE, related_name="post_hashtags")
+    created_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ("hashtag", "post")
+        indexes = [
+            models.Index(fields=["hashtag", "-created_at", "-post"], name="posthashtag_recent_idx"),
+        ]
+
+    def __str__(self):
+        return f"#{self.hashtag_id} in post {self.post_id}"
+
+
+class PostMention(models.Model):
+    """
+    A user @mentioned in a post; maintained alongside PostHashtag.
+    """
+
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="mentions")
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="post_mentions"
+    )
+    created_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ("user", "post")
+        indexes = [
+            models.Index(fields=["user", "-created_at", "-post"], name="postmention_recent_idx"),
+        ]
+
+    def __str__(self):
+        return f"User {self.user_id} mentioned in post {self.post_id}"
+
+
+class UploadSession(models.Model):
+    """
+    A resumable upload in progress (see posts.uploads).
+
+    Chunks are appended to a file in ATTACHMENT_UPLOAD_DIR; ``offset`` is how
+    many bytes of ``size`` have been written and flushed so far.
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="upload_sessions"
+    )
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100)
+    size = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"Upload {self.id} ({self.offset}/{self.size} bytes)"
+
+
+class Attachment(models.Model):
+    """
+    A finalized upload, stored under its content hash. Attachments belong to
+    their uploader until a post claims them via ``attachment_ids``.
+    """
+
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE, null=True, blank=True, related_name="attachments"
+    )
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="attachments"
+    )
+    file = models.FileField(upload_to="attachments/", max_length=255)
+    content_type = models.CharField(max_length=100)
+    size = models.PositiveBigIntegerField()
+    # {"<size>": {"webp": name, "jpeg": name}} for images, filled in the background
+    thumbnails = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.file.name} on post {self.post_id}"
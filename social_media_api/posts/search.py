@@ -0,0 +1,241 @@
+"""
+Full-text search over posts.
+
+``FullTextSearchFilter`` replaces DRF's SearchFilter (``ILIKE '%term%'``,
+a sequential scan) with a ranked, index-backed search. The backend is picked
+from POSTS_SEARCH_BACKEND, or automatically from the database vendor:
+
+* postgres -- a generated ``tsvector`` column with a GIN index
+* sqlite   -- an FTS5 external-content table kept in sync by triggers
+* python   -- an in-process inverted index, for anything else (dev only:
+  it is built lazily and only sees writes made by the same process)
+
+Matching posts are annotated with ``search_rank`` and ordered by it, which
+the keyset paginator can page on like any other field.
+"""
+
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import BooleanField, Case, FloatField, Value, When
+from django.db.models.expressions import RawSQL
+from rest_framework.filters import BaseFilterBackend
+from rest_framework.settings import api_settings
+
+from .models import Post
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+SQLITE_FTS_TABLE = "posts_post_fts"
+
+SQLITE_INSTALL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_FTS_TABLE} USING fts5(
+        title, content, content='posts_post', content_rowid='id',
+        tokenize='porter unicode61'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SQLITE_FTS_TABLE}_ai AFTER INSERT ON posts_post BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SQLITE_FTS_TABLE}_ad AFTER DELETE ON posts_post BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, title, content)
+        VALUES ('delete', old.id, old.title, old.content);
+    END
+    """,
+    # Only title/content edits re-index; counter updates leave the index alone
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SQLITE_FTS_TABLE}_au AFTER UPDATE OF title, content ON posts_post BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, title, content)
+        VALUES ('delete', old.id, old.title, old.content);
+        INSERT INTO {SQLITE_FTS_TABLE}(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END
+    """,
+    f"INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}) VALUES ('rebuild')",
+]
+
+SQLITE_UNINSTALL = [
+    f"DROP TRIGGER IF EXISTS {SQLITE_FTS_TABLE}_ai",
+    f"DROP TRIGGER IF EXISTS {SQLITE_FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {SQLITE_FTS_TABLE}_au",
+    f"DROP TABLE IF EXISTS {SQLITE_FTS_TABLE}",
+]
+
+POSTGRES_INSTALL = [
+    """
+    ALTER TABLE posts_post ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(content, '')), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS posts_post_search_idx ON posts_post USING GIN (search_vector)",
+]
+
+POSTGRES_UNINSTALL = [
+    "DROP INDEX IF EXISTS posts_post_search_idx",
+    "ALTER TABLE posts_post DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def install_search_index(schema_connection):
+    statements = {"sqlite": SQLITE_INSTALL, "postgresql": POSTGRES_INSTALL}.get(schema_connection.vendor, [])
+    with schema_connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def uninstall_search_index(schema_connection):
+    statements = {"sqlite": SQLITE_UNINSTALL, "postgresql": POSTGRES_UNINSTALL}.get(schema_connection.vendor, [])
+    with schema_connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def tokenize(text):
+    return [token.lower() for token in TOKEN_RE.findall(text or "")]
+
+
+def no_results(queryset):
+    # Still annotated so ordering by search_rank keeps working
+    return queryset.annotate(search_rank=Value(0.0, output_field=FloatField())).none()
+
+
+class PostgresSearchBackend:
+    def search(self, queryset, text):
+        query = "websearch_to_tsquery('english', %s)"
+        matches = RawSQL(f"posts_post.search_vector @@ {query}", [text], output_field=BooleanField())
+        rank = RawSQL(f"ts_rank_cd(posts_post.search_vector, {query})", [text], output_field=FloatField())
+        return queryset.filter(matches).annotate(search_rank=rank)
+
+
+class SqliteSearchBackend:
+    def search(self, queryset, text):
+        tokens = tokenize(text)
+        if not tokens:
+            return no_results(queryset)
+        # Quote every token so user input can never be parsed as FTS5 syntax
+        match = " ".join(f'"{token}"' for token in tokens)
+        matches = RawSQL(f"SELECT rowid FROM {SQLITE_FTS_TABLE} WHERE {SQLITE_FTS_TABLE} MATCH %s", [match])
+        rank = RawSQL(
+            f"SELECT -bm25({SQLITE_FTS_TABLE}, 2.0, 1.0) FROM {SQLITE_FTS_TABLE} "
+            f"WHERE {SQLITE_FTS_TABLE} MATCH %s AND rowid = posts_post.id",
+            [match],
+            output_field=FloatField(),
+        )
+        return queryset.filter(id__in=matches).annotate(search_rank=rank)
+
+
+class InvertedIndex:
+    """
+    term -> {post id: term frequency}, with title terms weighted double.
+    """
+
+    def __init__(self):
+        self.postings = defaultdict(dict)
+        self.documents = {}
+        self.lock = threading.Lock()
+        self.loaded = False
+
+    def _terms(self, title, content):
+        terms = Counter(tokenize(content))
+        for token in tokenize(title):
+            terms[token] += 2
+        return terms
+
+    def load(self):
+        with self.lock:
+            if self.loaded:
+                return
+            for post_id, title, content in Post.objects.values_list("id", "title", "content").iterator():
+                self._add(post_id, title, content)
+            self.loaded = True
+
+    def _add(self, post_id, title, content):
+        terms = self._terms(title, content)
+        self.documents[post_id] = set(terms)
+        for term, frequency in terms.items():
+            self.postings[term][post_id] = frequency
+
+    def _remove(self, post_id):
+        for term in self.documents.pop(post_id, ()):
+            self.postings[term].pop(post_id, None)
+            if not self.postings[term]:
+                del self.postings[term]
+
+    def update(self, post):
+        if not self.loaded:
+            return
+        with self.lock:
+            self._remove(post.id)
+            self._add(post.id, post.title, post.content)
+
+    def remove(self, post_id):
+        if not self.loaded:
+            return
+        with self.lock:
+            self._remove(post_id)
+
+    def query(self, text, limit):
+        self.load()
+        tokens = set(tokenize(text))
+        if not tokens:
+            return {}
+        with self.lock:
+            postings = [dict(self.postings.get(token, {})) for token in tokens]
+            total = max(len(self.documents), 1)
+        # Every token must match (AND), scored by tf-idf
+        candidates = set.intersection(*(set(posting) for posting in postings))
+        scores = {}
+        for post_id in candidates:
+            scores[post_id] = sum(
+                posting[post_id] * math.log(1 + total / len(posting)) for posting in postings
+            )
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return dict(best)
+
+
+class PythonSearchBackend:
+    index = InvertedIndex()
+
+    def search(self, queryset, text):
+        scores = self.index.query(text, settings.POSTS_SEARCH_MAX_RESULTS)
+        if not scores:
+            return no_results(queryset)
+        rank = Case(
+            *[When(id=post_id, then=Value(score)) for post_id, score in scores.items()],
+            output_field=FloatField(),
+        )
+        return queryset.filter(id__in=list(scores)).annotate(search_rank=rank)
+
+
+BACKENDS = {
+    "postgres": PostgresSearchBackend,
+    "sqlite": SqliteSearchBackend,
+    "python": PythonSearchBackend,
+}
+
+
+def get_search_backend():
+    name = settings.POSTS_SEARCH_BACKEND
+    if name == "auto":
+        name = {"postgresql": "postgres", "sqlite": "sqlite"}.get(connection.vendor, "python")
+    return BACKENDS[name]()
+
+
+class FullTextSearchFilter(BaseFilterBackend):
+    search_param = api_settings.SEARCH_PARAM
+
+    def filter_queryset(self, request, queryset, view):
+        text = request.query_params.get(self.search_param, "").strip()
+        if not text:
+            return queryset
+        queryset = get_search_backend().search(queryset, text)
+        return queryset.order_by("-search_rank", "-id")
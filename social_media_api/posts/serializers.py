@@ -1,10 +1,47 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
 from rest_framework import serializers
-from .models import Post, Comment
+from social_media_api.media import RenditionURLsField
+
+from .models import Attachment, Comment, Like, Post, UploadSession
+
+
+class AttachmentSerializer(serializers.ModelSerializer):
+    # Empty until the background rendering finishes, and for non-images
+    thumbnails = RenditionURLsField()
+
+    class Meta:
+        model = Attachment
+        fields = ("id", "file", "content_type", "size", "thumbnails", "created_at")
+        read_only_fields = fields
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UploadSession
+        fields = ("id", "filename", "content_type", "size", "offset", "expires_at")
+        read_only_fields = ("id", "offset", "expires_at")
+        extra_kwargs = {"content_type": {"required": False, "default": "application/octet-stream"}}
+
+    def validate_size(self, value):
+        if not 0 < value <= settings.ATTACHMENT_MAX_SIZE:
+            raise serializers.ValidationError(f"Size must be between 1 and {settings.ATTACHMENT_MAX_SIZE} bytes.")
+        return value
 
 
 class PostSerializer(serializers.ModelSerializer):
     author_username = serializers.ReadOnlyField(source="author.username")
-    likes_count = serializers.SerializerMethodField()
+    # Filled in by the ``liked_by_me`` annotation; False for anonymous viewers
+    liked_by_me = serializers.BooleanField(read_only=True, default=False)
+    attachments = AttachmentSerializer(many=True, read_only=True)
+    # Finalized uploads (see posts.uploads) to attach; replaces the current set on update
+    attachment_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        write_only=True,
+        required=False,
+        max_length=settings.ATTACHMENT_MAX_PER_POST,
+    )
 
     class Meta:
         model = Post
@@ -15,13 +52,65 @@ class PostSerializer(serializers.ModelSerializer):
             "title",
             "content",
             "likes_count",
+            "comments_count",
+            "liked_by_me",
+            "attachments",
+            "attachment_ids",
             "created_at",
             "updated_at",
         )
-        read_only_fields = ("author", "created_at", "updated_at")
+        select_related = ("author",)
+        prefetch_related = ("attachments",)
+        read_only_fields = (
+            "author",
+            "likes_count",
+            "comments_count",
+            "created_at",
+            "updated_at",
+        )
+
+    @classmethod
+    def get_annotations(cls, request):
+        # One EXISTS subquery per page instead of a lookup per post
+        if request is None or not request.user.is_authenticated:
+            return {}
+        liked = Like.objects.filter(post=OuterRef("pk"), user=request.user)
+        return {"liked_by_me": Exists(liked)}
+
+    def _available_attachments(self, post):
+        # The requester's own attachments that are free or already on ``post``
+        free = Q(post__isnull=True) | Q(post=post) if post else Q(post__isnull=True)
+        return Attachment.objects.filter(owner=self.context["request"].user).filter(free)
+
+    def validate_attachment_ids(self, value):
+        ids = set(value)
+        if self._available_attachments(self.instance).filter(pk__in=ids).count() != len(ids):
+            raise serializers.ValidationError("Unknown or unavailable attachment.")
+        return ids
+
+    def _claim_attachments(self, post, attachment_ids):
+        # Re-checked in the UPDATE: another post may have claimed one since validation
+        claimed = self._available_attachments(post).filter(pk__in=attachment_ids).update(post=post)
+        if claimed != len(attachment_ids):
+            raise serializers.ValidationError({"attachment_ids": ["Unknown or unavailable attachment."]})
+
+    def create(self, validated_data):
+        attachment_ids = validated_data.pop("attachment_ids", None)
+        with transaction.atomic():
+            post = super().create(validated_data)
+            if attachment_ids:
+                self._claim_attachments(post, attachment_ids)
+        return post
 
-    def get_likes_count(self, obj):
-        return obj.likes.count()
+    def update(self, instance, validated_data):
+        attachment_ids = validated_data.pop("attachment_ids", None)
+        with transaction.atomic():
+            post = super().update(instance, validated_data)
+            if attachment_ids is not None:
+                # Detached ones go back to their owner, like unused uploads
+                post.attachments.exclude(pk__in=attachment_ids).update(post=None)
+                self._claim_attachments(post, attachment_ids)
+        return post
 
 
 class CommentSerializer(serializers.ModelSerializer):
@@ -38,4 +127,5 @@ class CommentSerializer(serializers.ModelSerializer):
             "created_at",
             "updated_at",
         )
+        select_related = ("author",)
         read_only_fields = ("author", "created_at", "updated_at")
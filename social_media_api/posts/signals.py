@@ -0,0 +1,38 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .caching import invalidate_post, invalidate_post_list
+from .models import Comment, Like, Post
+from .search import PythonSearchBackend
+from .tags import sync_post_tags
+
+
+@receiver([post_save, post_delete], sender=Post)
+def invalidate_cached_post(sender, instance, **kwargs):
+    invalidate_post(instance.pk)
+    invalidate_post_list()
+
+
+@receiver(post_save, sender=Post)
+def update_search_index(sender, instance, **kwargs):
+    PythonSearchBackend.index.update(instance)
+
+
+@receiver(post_save, sender=Post)
+def update_hashtags_and_mentions(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and "content" not in update_fields):
+        return  # fixture load, or a save that left the content alone
+    sync_post_tags(instance, created=created)
+
+
+@receiver(post_delete, sender=Post)
+def remove_from_search_index(sender, instance, **kwargs):
+    PythonSearchBackend.index.remove(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Like)
+@receiver([post_save, post_delete], sender=Comment)
+def invalidate_cached_post_counts(sender, instance, **kwargs):
+    # Likes and comments change the counters shown for the post, not which
+    # posts a list shows
+    invalidate_post(instance.post_id)
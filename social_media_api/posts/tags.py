@@ -0,0 +1,81 @@
+"""
+Hashtag and @mention extraction for posts.
+
+When a post is saved its content is parsed and the PostHashtag / PostMention
+rows are diffed against what is stored: only added tags are bulk-inserted
+and only removed ones deleted, so an edit that keeps its tags writes
+nothing. Newly mentioned users get one bulk ``notify_many`` per save.
+Posts-by-tag lookups then use the join tables' indexes instead of scanning
+``content``.
+"""
+
+import re
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from notifications.dispatch import make_event, notify_many
+
+from .models import Hashtag, PostHashtag, PostMention
+
+User = get_user_model()
+
+# Not preceded by a word character, so "a#b" and "mail@example.com" do not match
+HASHTAG_RE = re.compile(r"(?<![\w#])#(\w{1,100})", re.UNICODE)
+MENTION_RE = re.compile(r"(?<![\w@])@([\w.@+-]{1,150})", re.UNICODE)
+
+
+def normalize_hashtag(name):
+    return name.lstrip("#").lower()
+
+
+def extract_hashtags(text):
+    return {normalize_hashtag(name) for name in HASHTAG_RE.findall(text or "")}
+
+
+def extract_mentions(text):
+    # A trailing "." or "," ends the sentence, not the username
+    return {name.rstrip(".,") for name in MENTION_RE.findall(text or "")} - {""}
+
+
+def _hashtag_ids(names):
+    Hashtag.objects.bulk_create([Hashtag(name=name) for name in names], ignore_conflicts=True)
+    return set(Hashtag.objects.filter(name__in=names).values_list("id", flat=True))
+
+
+def _sync(model, field, post, wanted_ids, created):
+    current = set() if created else set(model.objects.filter(post=post).values_list(field, flat=True))
+    added = wanted_ids - current
+    removed = current - wanted_ids
+    if removed:
+        model.objects.filter(post=post, **{f"{field}__in": removed}).delete()
+    model.objects.bulk_create(
+        [model(post=post, created_at=post.created_at, **{field: value}) for value in added],
+        ignore_conflicts=True,
+    )
+    return added
+
+
+def sync_post_tags(post, created=False, notify=True):
+    """
+    Bring the post's hashtag and mention rows in line with its content;
+    returns the ids of newly mentioned users. ``created`` skips reading the
+    (empty) existing rows of a new post.
+    """
+    hashtags = extract_hashtags(post.content)
+    usernames = extract_mentions(post.content)
+    with transaction.atomic():
+        _sync(PostHashtag, "hashtag_id", post, _hashtag_ids(hashtags) if hashtags else set(), created)
+
+        mentioned = set()
+        if usernames:
+            mentioned = set(
+                User.objects.filter(username__in=usernames).exclude(pk=post.author_id).values_list("id", flat=True)
+            )
+        added = _sync(PostMention, "user_id", post, mentioned, created)
+
+    if notify:
+        notify_many(
+            make_event(user_id, post.author_id, "mentioned you in a post", target=post) for user_id in added
+        )
+    return added
@@ -1,3 +1,830 @@
-from django.test import TestCase
+import io
+import json
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import AsyncRequestFactory, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APITestCase
+
+from social_media_api.pagination import encode_cursor
+from social_media_api.testing import QueryCountAssertionsMixin
+
+from notifications.models import Notification
+from PIL import Image
+
+from .models import (
+    Attachment,
+    Comment,
+    Hashtag,
+    Like,
+    PendingMaterialization,
+    Post,
+    PostActivity,
+    PostHashtag,
+    PostMention,
+    TimelineEntry,
+    TrendingState,
+    UploadSession,
+)
+from .search import InvertedIndex, PythonSearchBackend
+from .serializers import PostSerializer
+from .tags import extract_hashtags, extract_mentions
+from .uploads import session_path, update_thumbnails
+from .trending import get_trending, refresh_trending, rollup_activity
+from .views import async_feed, async_post_detail
+
+User = get_user_model()
+
+
+class FeedTimelineTestCase(APITestCase):
+    """
+    Tests for the materialized home timeline behind GET /api/feed/.
+    """
+
+    def setUp(self):
+        # No notification workers: the follow requests below would start them
+        patcher = mock.patch("notifications.dispatch.get_dispatcher")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.author = User.objects.create_user(username="author", password="pass12345")
+        self.reader = User.objects.create_user(username="reader", password="pass12345")
+        self.reader.following.add(self.author)
+
+    def authenticate(self, user):
+        token, _ = Token.objects.get_or_create(user=user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+
+    def create_post(self, title="Hello"):
+        self.authenticate(self.author)
+        response = self.client.post(
+            reverse("posts-list"), {"title": title, "content": "Body"}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return Post.objects.get(id=response.data["id"])
+
+    def feed_titles(self):
+        self.authenticate(self.reader)
+        response = self.client.get(reverse("feed"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [post["title"] for post in response.data["results"]]
+
+    def test_new_post_is_fanned_out_to_followers(self):
+        post = self.create_post()
+        self.assertTrue(TimelineEntry.objects.filter(user=self.reader, post=post).exists())
+        self.assertEqual(self.feed_titles(), ["Hello"])
+
+    @override_settings(FEED_FANOUT_MAX_FOLLOWERS=0)
+    def test_large_authors_are_merged_on_read(self):
+        self.create_post()
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.feed_titles(), ["Hello"])
+
+    def test_follow_backfills_and_unfollow_removes(self):
+        self.reader.following.remove(self.author)
+        self.create_post("Older")
+
+        self.authenticate(self.reader)
+        self.client.post(reverse("follow_user", args=[self.author.id]))
+        self.assertEqual(self.feed_titles(), ["Older"])
+
+        self.client.post(reverse("unfollow_user", args=[self.author.id]))
+        self.assertEqual(self.feed_titles(), [])
+
+    @override_settings(FEED_FANOUT_MAX_FOLLOWERS=1)
+    def test_author_back_at_limit_is_materialized_off_the_request(self):
+        other = User.objects.create_user(username="other", password="pass12345")
+        other.following.add(self.author)
+        self.create_post("While big")
+        self.assertFalse(TimelineEntry.objects.exists())
+
+        self.authenticate(other)
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(3):  # repeated crossings queue the author once
+                self.client.post(reverse("unfollow_user", args=[self.author.id]))
+                self.client.post(reverse("follow_user", args=[self.author.id]))
+            self.client.post(reverse("unfollow_user", args=[self.author.id]))
+        self.assertEqual(list(PendingMaterialization.objects.values_list("author_id", flat=True)), [self.author.id])
+        self.assertFalse(TimelineEntry.objects.filter(user=self.reader).exists())
+        # Still merged in at read time while queued
+        self.assertEqual(self.feed_titles(), ["While big"])
+
+        call_command("materialize_timelines", stdout=StringIO())
+        self.assertFalse(PendingMaterialization.objects.exists())
+        self.assertTrue(TimelineEntry.objects.filter(user=self.reader).exists())
+        self.assertEqual(self.feed_titles(), ["While big"])
+
+    def test_rebuild_queries_once_per_follower(self):
+        second = User.objects.create_user(username="second", password="pass12345")
+        self.reader.following.add(second)
+        Post.objects.create(author=self.author, title="First", content="Body")
+        Post.objects.create(author=second, title="Second", content="Body")
+
+        with self.assertNumQueries(4):  # clear, follow edges, then one select and insert per follower
+            call_command("rebuild_timelines", "--clear", stdout=StringIO())
+        self.assertEqual(
+            set(TimelineEntry.objects.filter(user=self.reader).values_list("author_id", flat=True)),
+            {self.author.id, second.id},
+        )
+
+    def test_feed_pages_by_timeline_keyset(self):
+        for i in range(3):
+            self.create_post(f"Post {i}")
+        self.authenticate(self.reader)
+        first = self.client.get(reverse("feed"), {"page_size": 2}).data
+        second = self.client.get(first["next"]).data
+        titles = [post["title"] for post in first["results"] + second["results"]]
+        self.assertEqual(titles, ["Post 2", "Post 1", "Post 0"])
+        self.assertIsNone(second["next"])
+
+
+class KeysetPaginationTestCase(APITestCase):
+    """
+    Tests for cursor pagination on GET /api/posts/.
+    """
+
+    def setUp(self):
+        self.author = User.objects.create_user(username="author", password="pass12345")
+        self.posts = [
+            Post.objects.create(author=self.author, title=f"Post {i}", content="Body")
+            for i in range(5)
+        ]
+        # Identical timestamps must still page deterministically via the id tiebreak
+        Post.objects.filter(id__in=[p.id for p in self.posts[1:4]]).update(
+            created_at=self.posts[2].created_at
+        )
+
+    def test_pages_cover_every_post_once(self):
+        seen = []
+        url = reverse("posts-list") + "?page_size=2"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn("count", response.data)
+            seen.extend(post["id"] for post in response.data["results"])
+            url = response.data["next"]
+
+        self.assertEqual(seen, [p.id for p in reversed(self.posts)])
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(reverse("posts-list") + "?cursor=garbage")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_wrongly_typed_cursor_values_are_rejected(self):
+        for values in ([[1], [2]], [None, None], [{"a": 1}, 1], ["not a date", 1]):
+            cursor = encode_cursor(values)
+            response = self.client.get(reverse("posts-list"), {"cursor": cursor})
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND, values)
+            self.assertEqual(response.data["detail"], "Invalid cursor.")
+
+        self.client.force_authenticate(self.author)
+        response = self.client.get(reverse("feed"), {"cursor": encode_cursor(["not a date", 1])})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class PostCounterTestCase(APITestCase):
+    """
+    Tests for the denormalized likes_count / comments_count on Post.
+    """
+
+    def setUp(self):
+        self.author = User.objects.create_user(username="author", password="pass12345")
+        self.fan = User.objects.create_user(username="fan", password="pass12345")
+        self.post = Post.objects.create(author=self.author, title="Hello", content="Body")
+        token, _ = Token.objects.get_or_create(user=self.fan)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+
+    def test_like_and_comment_endpoints_maintain_counters(self):
+        self.client.post(reverse("like_post", args=[self.post.id]))
+        self.client.post(reverse("like_post", args=[self.post.id]))
+        response = self.client.post(
+            reverse("comments-list"), {"post": self.post.id, "content": "Nice"}, format="json"
+        )
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.likes_count, self.post.comments_count), (1, 1))
+
+        self.client.post(reverse("unlike_post", args=[self.post.id]))
+        self.client.delete(reverse("comments-detail", args=[response.data["id"]]))
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.likes_count, self.post.comments_count), (0, 0))
+
+    def test_reconcile_command_repairs_drift(self):
+        Like.objects.create(post=self.post, user=self.fan)
+        Comment.objects.create(post=self.post, author=self.fan, content="Nice")
+        Post.objects.filter(id=self.post.id).update(likes_count=7)
+
+        call_command("reconcile_post_counters", batch_size=1, stdout=StringIO())
+
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.likes_count, self.post.comments_count), (1, 1))
+
+
+@override_settings(NOTIFICATIONS_ASYNC=False)
+class LikeEndpointTestCase(APITestCase):
+    """
+    Tests for like/unlike/toggle status codes and notifications.
+    """
+
+    def setUp(self):
+        self.author = User.objects.create_user(username="author", password="pass12345")
+        self.fan = User.objects.create_user(username="fan", password="pass12345")
+        self.post = Post.objects.create(author=self.author, title="Hello", content="Body")
+        token, _ = Token.objects.get_or_create(user=self.fan)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+
+    def test_like_twice_is_rejected_and_notifies_once(self):
+        first = self.client.post(reverse("like_post", args=[self.post.id]))
+        second = self.client.post(reverse("like_post", args=[self.post.id]))
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.author.notifications.count(), 1)
+
+    def test_unlike_without_like_is_rejected(self):
+        response = self.client.post(reverse("unlike_post", args=[self.post.id]))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_missing_post_is_404(self):
+        response = self.client.post(reverse("like_post", args=[self.post.id + 100]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(Like.objects.exists())
+
+    def test_toggle(self):
+        url = reverse("toggle_like_post", args=[self.post.id])
+        self.assertEqual(self.client.post(url).data, {"liked": True, "likes_count": 1})
+        self.assertEqual(self.client.post(url).data, {"liked": False, "likes_count": 0})
+        self.assertFalse(Like.objects.exists())
+
+
+@override_settings(NOTIFICATIONS_ASYNC=False)
+class ConcurrentLikeTestCase(TransactionTestCase):
+    """
+    Parallel likes must neither fail nor double count.
+    """
+
+    def setUp(self):
+        self.author = User.objects.create(username="author")
+        self.post = Post.objects.create(author=self.author, title="Hello", content="Body")
+        self.fans = [User.objects.create(username=f"fan{i}") for i in range(4)]
+        self.tokens = {fan.id: Token.objects.create(user=fan).key for fan in self.fans}
+
+    def like(self, fan):
+        try:
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION=f"Token {self.tokens[fan.id]}")
+            return client.post(reverse("like_post", args=[self.post.id])).status_code
+        finally:
+            connection.close()
+
+    def test_parallel_likes_count_once_per_user(self):
+        # Every fan double-taps: one like each is created, the repeats are rejected
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            codes = list(pool.map(self.like, self.fans * 2))
+
+        self.assertEqual(sorted(codes), [201] * 4 + [400] * 4)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 4)
+        self.assertEqual(Like.objects.filter(post=self.post).count(), 4)
+
+
+class ListQueryCountTestCase(QueryCountAssertionsMixin, APITestCase):
+    """
+    List endpoints must not issue per-row queries (N+1).
+    """
+
+    def setUp(self):
+        self.reader = User.objects.create_user(username="reader", password="pass12345")
+        for i in range(25):
+            author = User.objects.create(username=f"author{i}")
+            self.reader.following.add(author)
+            post = Post.objects.create(author=author, title=f"Post {i}", content="Body")
+            TimelineEntry.objects.create(
+                user=self.reader, post=post, author=author, created_at=post.created_at
+            )
+            Comment.objects.create(post=post, author=author, content="First")
+
+    def test_post_list(self):
+        # page + attachments prefetch
+        self.assertConstantQueries(reverse("posts-list"), expected=2)
+
+    def test_comment_list(self):
+        self.assertConstantQueries(reverse("comments-list"), expected=1)
+
+    def test_feed(self):
+        token, _ = Token.objects.get_or_create(user=self.reader)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+        # fan-out-on-read check + page + attachments; the token is cached
+        self.assertConstantQueries(reverse("feed"), expected=3)
+
+
+class LikedByMeTestCase(QueryCountAssertionsMixin, APITestCase):
+    """
+    Tests for the viewer-specific liked_by_me field.
+    """
+
+    def setUp(self):
+        self.reader = User.objects.create_user(username="reader", password="pass12345")
+        author = User.objects.create(username="author")
+        self.reader.following.add(author)
+        for i in range(6):
+            post = Post.objects.create(author=author, title=f"Post {i}", content="Body")
+            TimelineEntry.objects.create(user=self.reader, post=post, author=author, created_at=post.created_at)
+            if i % 2:
+                Like.objects.create(post=post, user=self.reader)
+        self.liked = set(Like.objects.values_list("post_id", flat=True))
+
+    def authenticate(self):
+        token, _ = Token.objects.get_or_create(user=self.reader)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+
+    def assertLikedFlags(self, results):
+        self.assertEqual({post["id"] for post in results if post["liked_by_me"]}, self.liked)
+
+    def test_post_list_and_feed(self):
+        self.authenticate()
+        self.assertLikedFlags(self.client.get(reverse("posts-list")).data["results"])
+        self.assertLikedFlags(self.client.get(reverse("feed")).data["results"])
+        # page (liked_by_me included) + attachments; the token is cached
+        self.assertConstantQueries(reverse("posts-list"), expected=2)
+
+    def test_anonymous_viewer_sees_false(self):
+        results = self.client.get(reverse("posts-list")).data["results"]
+        self.assertFalse(any(post["liked_by_me"] for post in results))
+
+
+class AsyncViewsTestCase(APITestCase):
+    """
+    The async feed and post detail views must answer like their sync versions.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.reader = User.objects.create_user(username="reader", password="pass12345")
+        author = User.objects.create(username="author")
+        self.reader.following.add(author)
+        for i in range(3):
+            post = Post.objects.create(author=author, title=f"Post {i}", content="Body")
+            TimelineEntry.objects.create(user=self.reader, post=post, author=author, created_at=post.created_at)
+        self.post = post
+        self.token = Token.objects.create(user=self.reader).key
+        self.factory = AsyncRequestFactory()
+
+    def sync_get(self, url):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token}")
+        return self.client.get(url).data
+
+    async def test_feed_matches_sync_view(self):
+        expected = await sync_to_async(self.sync_get)(reverse("feed") + "?page_size=2")
+
+        request = self.factory.get("/api/feed/", {"page_size": 2}, headers={"Authorization": f"Token {self.token}"})
+        response = await async_feed(request)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = json.loads(response.content)
+        self.assertEqual([post["id"] for post in data["results"]], [post["id"] for post in expected["results"]])
+        self.assertIn("cursor=", data["next"])
+
+    async def test_feed_requires_authentication(self):
+        response = await async_feed(self.factory.get("/api/feed/"))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def test_post_detail_with_etag(self):
+        url = f"/api/posts/{self.post.id}/"
+        response = await async_post_detail(self.factory.get(url), pk=self.post.id)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content)["title"], "Post 2")
+        self.assertEqual(response["X-Cache"], "MISS")
+
+        again = await async_post_detail(self.factory.get(url, headers={"If-None-Match": response["ETag"]}), pk=self.post.id)
+        self.assertEqual(again.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    async def test_missing_post_is_404(self):
+        response = await async_post_detail(self.factory.get("/api/posts/999/"), pk=999)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class PostResponseCacheTestCase(APITestCase):
+    """
+    Tests for cached GET /api/posts/ responses and ETag revalidation.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username="author", password="pass12345")
+        self.post = Post.objects.create(author=self.author, title="Hello", content="Body")
+
+    def test_anonymous_list_is_served_from_cache(self):
+        # The first request learns the page's posts, the second caches it
+        for _ in range(2):
+            first = self.client.get(reverse("posts-list"))
+            self.assertEqual(first["X-Cache"], "MISS")
+
+        with self.assertNumQueries(0):
+            second = self.client.get(reverse("posts-list"))
+        self.assertEqual(second["X-Cache"], "HIT")
+        self.assertEqual(second.data, first.data)
+
+    def test_like_only_invalidates_pages_showing_the_post(self):
+        newer = Post.objects.create(author=self.author, title="Newer", content="Body")
+        for _ in range(2):
+            self.client.get(reverse("posts-list"), {"page_size": 1})
+
+        Like.objects.create(post=self.post, user=self.author)  # not on the first page
+        self.assertEqual(self.client.get(reverse("posts-list"), {"page_size": 1})["X-Cache"], "HIT")
+
+        Like.objects.create(post=newer, user=self.author)
+        Post.objects.filter(id=newer.id).update(likes_count=1)
+        response = self.client.get(reverse("posts-list"), {"page_size": 1})
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.data["results"][0]["likes_count"], 1)
+
+    def test_new_post_changes_the_list(self):
+        for _ in range(2):
+            self.client.get(reverse("posts-list"))
+        Post.objects.create(author=self.author, title="Newer", content="Body")
+
+        response = self.client.get(reverse("posts-list"))
+        self.assertEqual([post["title"] for post in response.data["results"]], ["Newer", "Hello"])
+
+    def test_like_invalidates_cached_detail(self):
+        url = reverse("posts-detail", args=[self.post.id])
+        etag = self.client.get(url)["ETag"]
+
+        Like.objects.create(post=self.post, user=self.author)
+        Post.objects.filter(id=self.post.id).update(likes_count=1)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.data["likes_count"], 1)
+
+    def test_matching_etag_returns_304(self):
+        url = reverse("posts-detail", args=[self.post.id])
+        etag = self.client.get(url)["ETag"]
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response["ETag"], etag)
+
+
+class PostSearchTestCase(APITestCase):
+    """
+    Tests for ranked full-text search on GET /api/posts/?search=.
+    """
+
+    def setUp(self):
+        cache.clear()
+        author = User.objects.create_user(username="author", password="pass12345")
+        self.title_hit = Post.objects.create(author=author, title="Django tips", content="Short body")
+        self.body_hit = Post.objects.create(author=author, title="Weekly notes", content="Some django here")
+        self.miss = Post.objects.create(author=author, title="Cooking", content="Pasta recipes")
+
+    def search(self, text):
+        response = self.client.get(reverse("posts-list"), {"search": text})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [post["id"] for post in response.data["results"]]
+
+    def test_sqlite_fts_ranks_title_matches_first(self):
+        self.assertEqual(self.search("django"), [self.title_hit.id, self.body_hit.id])
+        self.assertEqual(self.search('pasta"*'), [self.miss.id])
+
+    def test_search_results_page_by_rank(self):
+        response = self.client.get(reverse("posts-list"), {"search": "django", "page_size": 1})
+        second = self.client.get(response.data["next"])
+        self.assertEqual(second.data["results"][0]["id"], self.body_hit.id)
+        self.assertIsNone(second.data["next"])
+
+    def test_sqlite_fts_follows_edits(self):
+        self.miss.title = "Django pasta"
+        self.miss.save()
+        self.assertIn(self.miss.id, self.search("django"))
+
+    @override_settings(POSTS_SEARCH_BACKEND="python")
+    def test_python_inverted_index_fallback(self):
+        with mock.patch.object(PythonSearchBackend, "index", InvertedIndex()):
+            self.assertEqual(self.search("django"), [self.title_hit.id, self.body_hit.id])
+            self.assertEqual(self.search("django pasta"), [])
+
+
+class TrendingPostsTestCase(APITestCase):
+    """
+    Tests for the activity buckets, trending scores and GET /api/posts/trending/.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username="author", password="pass12345")
+        self.posts = [Post.objects.create(author=self.author, title=f"Post {i}", content="Body") for i in range(3)]
+        self.now = timezone.now().replace(second=0, microsecond=0)
+
+    def activity(self, post, minutes_ago, likes=0, comments=0, granularity=PostActivity.MINUTE):
+        return PostActivity.objects.create(
+            post=post,
+            granularity=granularity,
+            bucket=self.now - timedelta(minutes=minutes_ago),
+            likes=likes,
+            comments=comments,
+        )
+
+    def test_likes_and_comments_share_a_minute_bucket(self):
+        for i in range(2):
+            user = User.objects.create_user(username=f"fan{i}", password="pass12345")
+            self.client.force_authenticate(user)
+            self.client.post(reverse("like_post", args=[self.posts[0].id]))
+        self.client.post(reverse("comments-list"), {"post": self.posts[0].id, "content": "Nice"})
+
+        bucket = PostActivity.objects.get()
+        self.assertEqual((bucket.granularity, bucket.likes, bucket.comments), (PostActivity.MINUTE, 2, 1))
+
+    def test_incremental_refresh_matches_full_recompute(self):
+        self.activity(self.posts[0], 300, likes=10, granularity=PostActivity.HOUR)
+        self.activity(self.posts[1], 20, likes=3, comments=1)
+        refresh_trending(now=self.now - timedelta(minutes=10))
+
+        self.activity(self.posts[1], 5, likes=2)
+        self.activity(self.posts[2], 1, comments=4)
+        incremental = dict(refresh_trending(now=self.now)["posts"])
+
+        TrendingState.objects.all().delete()
+        full = dict(refresh_trending(now=self.now)["posts"])
+        self.assertEqual(incremental.keys(), full.keys())
+        for post_id, score in full.items():
+            self.assertAlmostEqual(incremental[post_id], score)
+
+    def test_rollup_folds_minutes_into_hours_and_expires_old_buckets(self):
+        hour_start = self.now.replace(minute=0) - timedelta(hours=3)
+        for minute in (1, 2, 3):
+            PostActivity.objects.create(
+                post=self.posts[0],
+                granularity=PostActivity.MINUTE,
+                bucket=hour_start + timedelta(minutes=minute),
+                likes=1,
+                comments=1,
+            )
+        self.activity(self.posts[1], 5, likes=1)
+        self.activity(self.posts[2], 60 * 72, likes=1, granularity=PostActivity.HOUR)
+
+        self.assertEqual(rollup_activity(now=self.now), (3, 1))
+        hourly = PostActivity.objects.get(granularity=PostActivity.HOUR)
+        self.assertEqual(
+            (hourly.post, hourly.bucket, hourly.likes, hourly.comments), (self.posts[0], hour_start, 3, 3)
+        )
+        self.assertTrue(PostActivity.objects.filter(post=self.posts[1], granularity=PostActivity.MINUTE).exists())
+
+    @override_settings(TRENDING_MINUTE_RETENTION=0)
+    def test_rollup_keeps_unscored_minutes_without_the_cache(self):
+        self.activity(self.posts[0], 20, likes=1)
+        refresh_trending(now=self.now - timedelta(minutes=10))
+        self.activity(self.posts[1], 5, likes=1)  # after the watermark
+        cache.clear()  # e.g. another process, or an eviction
+
+        self.assertEqual(rollup_activity(now=self.now), (1, 0))
+        self.assertTrue(PostActivity.objects.filter(post=self.posts[1], granularity=PostActivity.MINUTE).exists())
+        scores = dict(refresh_trending(now=self.now)["posts"])
+        self.assertIn(self.posts[1].id, scores)
+
+    def test_ranking_is_rebuilt_from_the_stored_scores(self):
+        self.activity(self.posts[0], 2, likes=3)
+        ranked = refresh_trending(now=self.now)
+        cache.clear()
+        with mock.patch("posts.trending.refresh_trending") as refresh:
+            self.assertEqual(get_trending()["posts"], ranked["posts"])
+        refresh.assert_not_called()
+
+    def test_endpoint_ranks_by_decayed_score_and_caches(self):
+        self.activity(self.posts[0], 60 * 24, likes=20)  # popular yesterday
+        self.activity(self.posts[1], 30, likes=5)
+        self.activity(self.posts[2], 2, likes=2, comments=2)
+
+        first = self.client.get(reverse("trending_posts"))
+        ranked = [row["id"] for row in first.data["results"]]
+        self.assertEqual(ranked, [post.id for post in reversed(self.posts)])
+        self.assertEqual(first["X-Cache"], "MISS")
+
+        second = self.client.get(reverse("trending_posts"), {"limit": 1})
+        self.assertEqual(len(second.data["results"]), 1)
+        self.assertEqual(self.client.get(reverse("trending_posts"))["X-Cache"], "HIT")
+
+
+@override_settings(NOTIFICATIONS_ASYNC=False)
+class HashtagMentionTestCase(APITestCase):
+    """
+    Tests for hashtag/mention extraction and the posts-by-hashtag and mention endpoints.
+    """
+
+    def setUp(self):
+        self.author = User.objects.create_user(username="author", password="pass12345")
+        self.bob = User.objects.create_user(username="bob", password="pass12345")
+        self.client.force_authenticate(self.author)
+
+    def tags(self, post):
+        return set(PostHashtag.objects.filter(post=post).values_list("hashtag__name", flat=True))
+
+    def test_extraction(self):
+        self.assertEqual(extract_hashtags("Loving #Django and #django, not a#b or ##"), {"django"})
+        self.assertEqual(extract_mentions("hi @bob, mail x@example.com and @carol."), {"bob", "carol"})
+
+    def test_edit_diffs_tags_and_mentions_notify_once(self):
+        response = self.client.post(
+            reverse("posts-list"), {"title": "T", "content": "#one #two hello @bob @author @nobody"}
+        )
+        post = Post.objects.get(pk=response.data["id"])
+        self.assertEqual(self.tags(post), {"one", "two"})
+        self.assertEqual(list(PostMention.objects.values_list("user__username", flat=True)), ["bob"])
+        self.assertEqual(Notification.objects.filter(recipient=self.bob, verb="mentioned you in a post").count(), 1)
+
+        kept = PostHashtag.objects.get(post=post, hashtag__name="two").pk
+        self.client.patch(reverse("posts-detail", args=[post.id]), {"content": "#two #three still @bob"})
+        self.assertEqual(self.tags(post), {"two", "three"})
+        self.assertTrue(PostHashtag.objects.filter(pk=kept).exists())  # unchanged rows are left alone
+        self.assertEqual(Notification.objects.filter(recipient=self.bob).count(), 1)
+
+    def test_hashtag_posts_are_keyset_paginated(self):
+        posts = [Post.objects.create(author=self.author, title=f"P{i}", content=f"#Cats {i}") for i in range(3)]
+        Post.objects.create(author=self.author, title="Other", content="#dogs")
+        self.assertEqual(Hashtag.objects.count(), 2)
+
+        first = self.client.get(reverse("hashtag_posts", args=["CATS"]), {"page_size": 2})
+        self.assertEqual([row["id"] for row in first.data["results"]], [posts[2].id, posts[1].id])
+        second = self.client.get(first.data["next"])
+        self.assertEqual([row["id"] for row in second.data["results"]], [posts[0].id])
+        self.assertIsNone(second.data["next"])
+
+        self.assertEqual(self.client.get(reverse("hashtag_posts", args=["unknown"])).status_code, 404)
+
+    def test_mention_posts(self):
+        post = Post.objects.create(author=self.author, title="Hi", content="Thanks @bob!")
+        Post.objects.create(author=self.author, title="Other", content="No mentions")
+
+        response = self.client.get(reverse("mention_posts", args=["bob"]))
+        self.assertEqual([row["id"] for row in response.data["results"]], [post.id])
+
+
+@override_settings(MEDIA_RENDITIONS_ASYNC=False)
+class AttachmentUploadTestCase(APITestCase):
+    """
+    Tests for resumable chunked uploads and post attachments.
+    """
+
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=os.path.join(root, "media"), ATTACHMENT_UPLOAD_DIR=os.path.join(root, "parts"))
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.user = User.objects.create_user(username="uploader", password="pass12345")
+        self.client.force_authenticate(self.user)
+        buffer = io.BytesIO()
+        Image.new("RGB", (1200, 600), "blue").save(buffer, "PNG")
+        self.image = buffer.getvalue()
+
+    def start(self, content, content_type="image/png", filename="photo.png"):
+        response = self.client.post(
+            reverse("create_upload"), {"filename": filename, "size": len(content), "content_type": content_type}
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data["id"]
+
+    def put(self, session_id, offset, chunk):
+        return self.client.generic(
+            "PUT",
+            reverse("upload_chunk", args=[session_id]),
+            chunk,
+            content_type="application/offset+octet-stream",
+            HTTP_UPLOAD_OFFSET=str(offset),
+        )
+
+    def upload(self, content=None):
+        content = content or self.image
+        session_id = self.start(content)
+        self.put(session_id, 0, content)
+        return self.client.post(reverse("finalize_upload", args=[session_id])).data
+
+    def test_resumed_upload_is_finalized_with_thumbnails(self):
+        session_id = self.start(self.image)
+        half = len(self.image) // 2
+        self.assertEqual(self.put(session_id, 0, self.image[:half])["Upload-Offset"], str(half))
+
+        stale = self.put(session_id, 0, self.image[:half])  # retried chunk
+        self.assertEqual(stale.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(stale.data["offset"], half)
+        self.assertEqual(
+            self.client.post(reverse("finalize_upload", args=[session_id])).status_code, status.HTTP_409_CONFLICT
+        )
+
+        resumed = self.client.get(reverse("upload_chunk", args=[session_id])).data["offset"]
+        self.put(session_id, resumed, self.image[resumed:])
+        part = session_path(UploadSession.objects.get())
+        response = self.client.post(reverse("finalize_upload", args=[session_id]))
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertRegex(response.data["file"], r"/media/attachments/[0-9a-f]{64}\.png$")
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertFalse(os.path.exists(part))  # moved into storage
+        attachment = Attachment.objects.get()
+        with attachment.file.open("rb") as handle:
+            self.assertEqual(handle.read(), self.image)
+        self.assertEqual(set(attachment.thumbnails), {"320", "960"})
+
+    def test_chunk_past_declared_size_is_rejected(self):
+        session_id = self.start(b"12345")
+        response = self.put(session_id, 3, b"456")
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+    def test_negative_offset_or_length_is_rejected(self):
+        session_id = self.start(b"12345")
+        self.assertEqual(self.put(session_id, -2, b"12").status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.generic(
+            "PUT",
+            reverse("upload_chunk", args=[session_id]),
+            b"",
+            content_type="application/offset+octet-stream",
+            HTTP_UPLOAD_OFFSET="0",
+            CONTENT_LENGTH="-3",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(UploadSession.objects.get().offset, 0)
+
+    def test_thumbnails_invalidate_cached_post(self):
+        attachment = self.upload()
+        post = self.client.post(
+            reverse("posts-list"), {"title": "Pics", "content": "Body", "attachment_ids": [attachment["id"]]}, format="json"
+        ).data
+        name = Attachment.objects.get().file.name
+        Attachment.objects.update(thumbnails={})  # as if still rendering
+        self.client.force_authenticate(None)
+        url = reverse("posts-detail", args=[post["id"]])
+        for _ in range(2):
+            self.assertEqual(self.client.get(url).data["attachments"][0]["thumbnails"], {})
+
+        update_thumbnails(attachment["id"], name)
+        self.assertEqual(set(self.client.get(url).data["attachments"][0]["thumbnails"]), {"320", "960"})
+
+    def test_post_claims_own_unused_attachments(self):
+        attachment = self.upload()
+        other = User.objects.create_user(username="other", password="pass12345")
+        foreign = Attachment.objects.create(owner=other, file="attachments/x.png", content_type="image/png", size=1)
+
+        response = self.client.post(
+            reverse("posts-list"),
+            {"title": "Pics", "content": "Body", "attachment_ids": [attachment["id"], foreign.id]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.post(
+            reverse("posts-list"), {"title": "Pics", "content": "Body", "attachment_ids": [attachment["id"]]}, format="json"
+        )
+        self.assertEqual([row["id"] for row in response.data["attachments"]], [attachment["id"]])
+        listed = self.client.get(reverse("posts-list")).data["results"][0]
+        self.assertEqual(listed["attachments"][0]["size"], len(self.image))
+
+    def test_type_is_sniffed_not_taken_from_the_client(self):
+        page = b"<html><script>alert(document.cookie)</script></html>"
+        session_id = self.start(page, content_type="image/png", filename="evil.html")
+        self.put(session_id, 0, page)
+        response = self.client.post(reverse("finalize_upload", args=[session_id]))
+
+        self.assertRegex(response.data["file"], r"/media/attachments/[0-9a-f]{64}$")
+        self.assertEqual(response.data["content_type"], "application/octet-stream")
+        self.assertEqual(response.data["thumbnails"], {})
+
+        session_id = self.start(self.image, content_type="text/html", filename="photo.html")
+        self.put(session_id, 0, self.image)
+        response = self.client.post(reverse("finalize_upload", args=[session_id]))
+        self.assertRegex(response.data["file"], r"/media/attachments/[0-9a-f]{64}\.png$")
+        self.assertEqual(response.data["content_type"], "image/png")
+
+    def test_attachment_claimed_after_validation_is_rejected(self):
+        attachment = self.upload()
+        other_post = Post.objects.create(author=self.user, title="Other", content="Body")
+        validate = PostSerializer.validate_attachment_ids
+
+        def claimed_meanwhile(serializer, value):
+            ids = validate(serializer, value)
+            # A concurrent request claims it between validation and save
+            Attachment.objects.filter(pk=attachment["id"]).update(post=other_post)
+            return ids
+
+        with mock.patch.object(PostSerializer, "validate_attachment_ids", claimed_meanwhile):
+            response = self.client.post(
+                reverse("posts-list"), {"title": "Pics", "content": "Body", "attachment_ids": [attachment["id"]]}, format="json"
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("attachment_ids", response.data)
+        self.assertEqual(Attachment.objects.get().post, other_post)
+        self.assertEqual(Post.objects.get(), other_post)  # the new post was rolled back
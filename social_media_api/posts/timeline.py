@@ -0,0 +1,201 @@
+"""
+Materialized home timelines.
+
+New posts are fanned out to every follower's timeline when they are written.
+Authors with more than FEED_FANOUT_MAX_FOLLOWERS followers are skipped on
+write and merged into the feed at read time instead (fan-out on read), so a
+single post never has to insert an unbounded number of rows. When such an
+author drops back to the limit, their recent posts were never fanned out:
+``queue_materialization`` records a PendingMaterialization and the
+``materialize_timelines`` command later copies the posts into the
+followers' timelines (``materialize_pending``), off the request path. The
+feed keeps merging a queued author in at read time until then.
+
+With no such authors followed, the feed is one range scan over the
+TimelineEntry (user, -created_at, -post) index; posts are joined by primary key.
+"""
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+
+from .models import PendingMaterialization, Post, TimelineEntry
+
+User = get_user_model()
+Follow = User.following.through
+
+
+def fanout_limit():
+    return settings.FEED_FANOUT_MAX_FOLLOWERS
+
+
+def fan_out_post(post):
+    # Read the count from the database: post.author may be a cached request.user
+    followers_count = User.objects.filter(pk=post.author_id).values_list("followers_count", flat=True).first()
+    if (followers_count or 0) > fanout_limit():
+        # Too many followers: readers pick this author up via fan-out on read
+        return 0
+
+    follower_ids = Follow.objects.filter(to_user_id=post.author_id).values_list("from_user_id", flat=True)
+    entries = [
+        TimelineEntry(
+            user_id=follower_id,
+            post_id=post.id,
+            author_id=post.author_id,
+            created_at=post.created_at,
+        )
+        for follower_id in follower_ids
+    ]
+    TimelineEntry.objects.bulk_create(entries, batch_size=500, ignore_conflicts=True)
+    return len(entries)
+
+
+def _recent_posts(author_ids):
+    # One query: the latest FEED_BACKFILL_POSTS posts per author via ROW_NUMBER()
+    return list(
+        Post.objects.filter(author_id__in=author_ids)
+        .annotate(
+            position=Window(
+                RowNumber(),
+                partition_by=F("author_id"),
+                order_by=[F("created_at").desc(), F("id").desc()],
+            )
+        )
+        .filter(position__lte=settings.FEED_BACKFILL_POSTS)
+        .values_list("id", "author_id", "created_at")
+    )
+
+
+def backfill_authors(user, author_ids):
+    # Called on follow so the new authors' recent posts show up immediately
+    if not author_ids:
+        return
+    recent = _recent_posts(author_ids)
+    entries = [
+        TimelineEntry(
+            user_id=user.id,
+            post_id=post_id,
+            author_id=author_id,
+            created_at=created_at,
+        )
+        for post_id, author_id, created_at in recent
+    ]
+    TimelineEntry.objects.bulk_create(entries, batch_size=500, ignore_conflicts=True)
+
+
+def backfill_author(user, author):
+    backfill_authors(user, [author.id])
+
+
+def materialize_authors(author_ids, batch_size=500):
+    """
+    Copy the recent posts of authors back at FEED_FANOUT_MAX_FOLLOWERS into
+    every follower's timeline; returns the number of entries written.
+    """
+    authors = list(
+        User.objects.filter(pk__in=author_ids, followers_count__lte=fanout_limit()).values_list("pk", flat=True)
+    )
+    written = 0
+    for author_id in authors:
+        recent = _recent_posts([author_id])
+        if not recent:
+            continue
+        follower_ids = Follow.objects.filter(to_user_id=author_id).values_list("from_user_id", flat=True)
+        entries = []
+        for follower_id in follower_ids.iterator(chunk_size=batch_size):
+            entries.extend(
+                TimelineEntry(user_id=follower_id, post_id=post_id, author_id=author_id, created_at=created_at)
+                for post_id, _, created_at in recent
+            )
+            if len(entries) >= batch_size:
+                TimelineEntry.objects.bulk_create(entries, ignore_conflicts=True)
+                written += len(entries)
+                entries = []
+        TimelineEntry.objects.bulk_create(entries, ignore_conflicts=True)
+        written += len(entries)
+    return written
+
+
+def crossed_fanout_limit(author_ids):
+    """
+    Of authors who just lost followers, those now exactly at the limit: they
+    were served by fan-out on read until this change.
+    """
+    return list(
+        User.objects.filter(pk__in=author_ids, followers_count=fanout_limit()).values_list("pk", flat=True)
+    )
+
+
+def queue_materialization(author_ids):
+    """
+    Queue the authors in ``author_ids`` that are now back at the limit; cheap
+    enough for the unfollow request itself.
+    """
+    crossed = crossed_fanout_limit(author_ids)
+    PendingMaterialization.objects.bulk_create(
+        [PendingMaterialization(author_id=author_id) for author_id in crossed], ignore_conflicts=True
+    )
+    return crossed
+
+
+def materialize_pending(batch_size=500):
+    """
+    Materialize every queued author; returns the number of entries written.
+    Rows another process is working on are skipped.
+    """
+    written = 0
+    for author_id in list(PendingMaterialization.objects.values_list("author_id", flat=True)):
+        with transaction.atomic():
+            pending = PendingMaterialization.objects.select_for_update(skip_locked=True).filter(author_id=author_id)
+            if not pending.exists():
+                continue
+            # A no-op if the author has grown past the limit again
+            written += materialize_authors([author_id], batch_size)
+            pending.delete()
+    return written
+
+
+def remove_authors(user, author_ids):
+    TimelineEntry.objects.filter(user=user, author_id__in=author_ids).delete()
+
+
+def remove_author(user, author):
+    TimelineEntry.objects.filter(user=user, author=author).delete()
+
+
+def _fallback_authors(user):
+    # Followed authors that are too big to fan out on write, or not yet materialized
+    return user.following.filter(
+        Q(followers_count__gt=fanout_limit()) | Q(pending_materialization__isnull=False)
+    ).values_list("id", flat=True)
+
+
+def fallback_author_ids(user):
+    return list(_fallback_authors(user))
+
+
+def _timeline(user, fallback_ids):
+    """
+    The feed, annotated with its keyset: ``timeline_at`` and the unique
+    ``timeline_post`` (see TimelinePagination).
+    """
+    if not fallback_ids:
+        # Ordered by the entry's own columns so the index supplies the order
+        return Post.objects.filter(timeline_entries__user=user).annotate(
+            timeline_at=F("timeline_entries__created_at"), timeline_post=F("timeline_entries__post")
+        )
+
+    materialized = TimelineEntry.objects.filter(user=user).values("post_id")
+    return Post.objects.filter(Q(pk__in=materialized) | Q(author_id__in=fallback_ids)).annotate(
+        timeline_at=F("created_at"), timeline_post=F("id")
+    )
+
+
+def home_timeline(user):
+    return _timeline(user, fallback_author_ids(user))
+
+
+async def ahome_timeline(user):
+    return _timeline(user, [author_id async for author_id in _fallback_authors(user)])
@@ -0,0 +1,213 @@
+"""
+Trending posts from time-bucketed activity counters.
+
+Likes and comments increment a per-minute ``PostActivity`` bucket with one
+upsert. A post's trending score is the weighted sum of its activity, each
+bucket decayed by its age (halving every TRENDING_HALF_LIFE seconds).
+
+Because the decay is exponential, the scores can be advanced instead of
+recomputed: ``refresh_trending`` decays the previous scores by the time that
+has passed and adds only the minute buckets closed since the last run. The
+scores and their watermark live in the TrendingState row, whose lock also
+keeps refreshes and rollups from overlapping in any process; the full scan
+over the window is only needed when that state is missing. The top
+TRENDING_SIZE posts are kept in the cache for the endpoint.
+"""
+
+import heapq
+import logging
+import threading
+from datetime import timedelta
+from operator import itemgetter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .likes import ON_CONFLICT_VENDORS
+from .models import PostActivity, TrendingState
+
+logger = logging.getLogger(__name__)
+
+RANKED_KEY = "posts:trending:ranked"
+REFRESH_LOCK_KEY = "posts:trending:refresh-lock"
+
+
+def _minute(moment):
+    return moment.replace(second=0, microsecond=0)
+
+
+def _upsert(rows):
+    """
+    Add ``(post_id, granularity, bucket, likes, comments)`` rows to their buckets.
+    """
+    if connection.vendor in ON_CONFLICT_VENDORS:
+        table = connection.ops.quote_name(PostActivity._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {table} (post_id, granularity, bucket, likes, comments) "
+                "VALUES (%s, %s, %s, %s, %s) "
+                "ON CONFLICT (post_id, granularity, bucket) DO UPDATE SET "
+                f"likes = {table}.likes + excluded.likes, comments = {table}.comments + excluded.comments",
+                rows,
+            )
+        return
+
+    for post_id, granularity, bucket, likes, comments in rows:
+        lookup = PostActivity.objects.filter(post_id=post_id, granularity=granularity, bucket=bucket)
+        if lookup.update(likes=F("likes") + likes, comments=F("comments") + comments):
+            continue
+        try:
+            with transaction.atomic():
+                PostActivity.objects.create(
+                    post_id=post_id, granularity=granularity, bucket=bucket, likes=likes, comments=comments
+                )
+        except IntegrityError:
+            # Created concurrently; add to it instead
+            lookup.update(likes=F("likes") + likes, comments=F("comments") + comments)
+
+
+def record_activity(post_id, likes=0, comments=0):
+    _upsert([(post_id, PostActivity.MINUTE, _minute(timezone.now()), likes, comments)])
+
+
+def _score(likes, comments):
+    return likes * settings.TRENDING_LIKE_WEIGHT + comments * settings.TRENDING_COMMENT_WEIGHT
+
+
+def _decay(seconds):
+    return 0.5 ** (seconds / settings.TRENDING_HALF_LIFE)
+
+
+def _locked_state(skip_locked=False):
+    """
+    The TrendingState row, locked until the end of the transaction; None
+    with ``skip_locked`` if another process holds it.
+    """
+    TrendingState.objects.get_or_create(pk=1)
+    return TrendingState.objects.select_for_update(skip_locked=skip_locked).filter(pk=1).first()
+
+
+def _rank(at, scores):
+    return {"at": at, "posts": heapq.nlargest(settings.TRENDING_SIZE, scores.items(), key=itemgetter(1))}
+
+
+def _stored_ranking():
+    state = TrendingState.objects.filter(pk=1, scored_until__isnull=False).first()
+    if state is None:
+        return None
+    return _rank(state.scored_until, {int(post_id): score for post_id, score in state.scores.items()})
+
+
+def refresh_trending(now=None, wait=True):
+    """
+    Advance the scores to the start of the current minute and store the
+    ranking; returns it as ``{"at": datetime, "posts": [(post_id, score), ...]}``,
+    or None without ``wait`` when another refresh is running.
+    """
+    at = _minute(now or timezone.now())
+    window_start = at - timedelta(hours=settings.TRENDING_WINDOW_HOURS)
+
+    with transaction.atomic():
+        state = _locked_state(skip_locked=not wait)
+        if state is None:
+            return None
+
+        if state.scored_until is None or state.scored_until < window_start:
+            scores = {}
+            # Both granularities; the still-open current minute waits for the next run
+            buckets = PostActivity.objects.filter(bucket__gte=window_start, bucket__lt=at)
+        else:
+            factor = _decay((at - state.scored_until).total_seconds())
+            # JSON object keys are strings
+            scores = {int(post_id): score * factor for post_id, score in state.scores.items()}
+            buckets = PostActivity.objects.filter(
+                granularity=PostActivity.MINUTE, bucket__gte=state.scored_until, bucket__lt=at
+            )
+
+        for post_id, granularity, bucket, likes, comments in buckets.values_list(
+            "post_id", "granularity", "bucket", "likes", "comments"
+        ).iterator():
+            if granularity == PostActivity.HOUR:
+                bucket += timedelta(minutes=30)  # activity is spread over the hour
+            age = max((at - bucket).total_seconds(), 0)
+            scores[post_id] = scores.get(post_id, 0) + _score(likes, comments) * _decay(age)
+
+        scores = {post_id: score for post_id, score in scores.items() if score >= settings.TRENDING_MIN_SCORE}
+        state.scored_until = at
+        state.scores = scores
+        state.save()
+
+    ranked = _rank(at, scores)
+    cache.set(RANKED_KEY, ranked, None)
+    return ranked
+
+
+def rollup_activity(now=None):
+    """
+    Fold minute buckets older than TRENDING_MINUTE_RETENTION into hourly
+    buckets and delete buckets older than the window. Returns
+    ``(minute_buckets_rolled_up, buckets_deleted)``.
+    """
+    now = now or timezone.now()
+    cutoff = _minute(now) - timedelta(minutes=settings.TRENDING_MINUTE_RETENTION)
+
+    with transaction.atomic():
+        # Waits for a running refresh, and keeps the next one out until done
+        state = _locked_state()
+        if state.scored_until is not None:
+            # Never fold minutes the incremental refresh has not scored yet
+            cutoff = min(cutoff, state.scored_until)
+
+        minutes = PostActivity.objects.filter(granularity=PostActivity.MINUTE, bucket__lt=cutoff)
+        hourly = (
+            minutes.annotate(hour=TruncHour("bucket"))
+            .values("post_id", "hour")
+            .annotate(likes_sum=Sum("likes"), comments_sum=Sum("comments"))
+            .order_by()
+        )
+        _upsert(
+            [
+                (row["post_id"], PostActivity.HOUR, row["hour"], row["likes_sum"], row["comments_sum"])
+                for row in hourly
+            ]
+        )
+        rolled_up, _ = minutes.delete()
+
+    expired, _ = PostActivity.objects.filter(
+        bucket__lt=now - timedelta(hours=settings.TRENDING_WINDOW_HOURS)
+    ).delete()
+    return rolled_up, expired
+
+
+def _refresh_in_background():
+    try:
+        refresh_trending(wait=False)
+    except Exception:
+        logger.exception("Refreshing trending posts failed")
+    finally:
+        connection.close()
+
+
+def get_trending():
+    """
+    The cached ranking (rebuilt from the stored scores if evicted); computed
+    in-request only when there is none yet, otherwise refreshed in the
+    background once it is TRENDING_REFRESH_INTERVAL seconds old.
+    """
+    ranked = cache.get(RANKED_KEY)
+    if ranked is None:
+        ranked = _stored_ranking()
+        if ranked is None:
+            return refresh_trending()
+        cache.set(RANKED_KEY, ranked, None)
+
+    stale = (timezone.now() - ranked["at"]).total_seconds() >= settings.TRENDING_REFRESH_INTERVAL
+    # One background thread per interval; the state row's lock makes any
+    # overlapping refresh in another process give way
+    if stale and cache.add(REFRESH_LOCK_KEY, True, settings.TRENDING_REFRESH_INTERVAL):
+        threading.Thread(target=_refresh_in_background, name="trending-refresh", daemon=True).start()
+    return ranked
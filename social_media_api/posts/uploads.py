@@ -0,0 +1,153 @@
+"""
+Resumable chunked uploads for post attachments.
+
+The protocol follows tus (https://tus.io) loosely:
+
+1. ``POST /api/uploads/`` declares the filename, size and content type and
+   returns a session id.
+2. ``PUT /api/uploads/<id>/`` with ``Upload-Offset: n`` streams one chunk
+   of the raw body straight into the session's file at ``n``. A chunk cut
+   off by a dropped connection still counts as far as it got.
+   ``GET /api/uploads/<id>/`` reports the offset to resume from.
+3. ``POST /api/uploads/<id>/finalize/`` once ``offset == size`` moves the file
+   to its content-hashed name and creates an Attachment. Its content type is
+   sniffed from the file; the declared one is only informational. Image
+   thumbnails are rendered in the background (social_media_api.media).
+
+The body is never read as a whole: it is copied from the request stream to
+the file in CHUNK_SIZE pieces, and the assembled file is renamed into
+storage, not copied. An exclusive ``flock`` on the session file serializes
+chunks, so a duplicated or concurrent PUT gets 409 instead of interleaving.
+"""
+
+import fcntl
+import logging
+import os
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from social_media_api.media import StagedFile, generate_renditions, run_in_background, store_hashed
+
+from .caching import invalidate_post
+from .models import Attachment, UploadSession
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 256 * 1024
+PREFIX = "attachments"
+THUMBNAILS_PREFIX = "attachments/thumbnails"
+
+
+class UploadConflict(Exception):
+    """
+    The chunk does not start at the session's offset, or another request is
+    writing to the session.
+    """
+
+
+def session_path(session):
+    return os.path.join(settings.ATTACHMENT_UPLOAD_DIR, f"{session.pk}.part")
+
+
+def create_session(user, filename, size, content_type):
+    session = UploadSession.objects.create(
+        user=user,
+        filename=os.path.basename(filename),
+        size=size,
+        content_type=content_type,
+        expires_at=timezone.now() + timedelta(seconds=settings.ATTACHMENT_SESSION_TTL),
+    )
+    os.makedirs(settings.ATTACHMENT_UPLOAD_DIR, exist_ok=True)
+    open(session_path(session), "wb").close()
+    return session
+
+
+@contextmanager
+def _locked(session):
+    with open(session_path(session), "r+b") as handle:
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadConflict("Another chunk is being written.")
+        # Re-read under the lock: the previous holder may have moved the offset
+        session.refresh_from_db(fields=["offset"])
+        yield handle
+
+
+def write_chunk(session, offset, stream, length):
+    """
+    Copy ``length`` bytes from ``stream`` into the session at ``offset``;
+    returns the new offset.
+    """
+    with _locked(session) as handle:
+        if offset != session.offset:
+            raise UploadConflict(f"Expected offset {session.offset}.")
+        handle.seek(offset)
+        remaining = length
+        try:
+            while remaining:
+                chunk = stream.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break  # client went away; keep what arrived
+                handle.write(chunk)
+                remaining -= len(chunk)
+        finally:
+            # Durable before it is acknowledged, so a resume never skips lost bytes
+            handle.flush()
+            os.fsync(handle.fileno())
+            session.offset = offset + length - remaining
+            UploadSession.objects.filter(pk=session.pk).update(offset=session.offset)
+        return session.offset
+
+
+def finalize(session, user):
+    with _locked(session):
+        if session.offset != session.size:
+            raise UploadConflict(f"Upload incomplete: {session.offset} of {session.size} bytes.")
+        path = session_path(session)
+        staged = StagedFile(path, name=session.filename)
+        try:
+            name, content_type = store_hashed(default_storage, PREFIX, staged)
+        finally:
+            staged.close()
+        with transaction.atomic():
+            attachment = Attachment.objects.create(
+                owner=user, file=name, content_type=content_type, size=session.size
+            )
+            session.delete()
+    if os.path.exists(path):
+        os.remove(path)  # identical content was already stored
+
+    if attachment.content_type.startswith("image/"):
+        run_in_background(update_thumbnails, attachment.pk, name)
+    return attachment
+
+
+def update_thumbnails(attachment_id, name):
+    try:
+        thumbnails = generate_renditions(default_storage, name, THUMBNAILS_PREFIX, settings.ATTACHMENT_THUMBNAIL_SIZES)
+    except Exception:
+        # Not a decodable image after all; the attachment is served without thumbnails
+        logger.warning("Could not render thumbnails for attachment %s", attachment_id, exc_info=True)
+        return
+    Attachment.objects.filter(pk=attachment_id).update(thumbnails=thumbnails)
+    # update() sends no signals: drop cached responses still showing no thumbnails
+    post_id = Attachment.objects.filter(pk=attachment_id).values_list("post_id", flat=True).first()
+    if post_id:
+        invalidate_post(post_id)
+
+
+def prune_expired_sessions():
+    expired = list(UploadSession.objects.filter(expires_at__lte=timezone.now()))
+    for session in expired:
+        try:
+            os.remove(session_path(session))
+        except FileNotFoundError:
+            pass
+    UploadSession.objects.filter(pk__in=[session.pk for session in expired]).delete()
+    return len(expired)
@@ -1,14 +1,42 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import PostViewSet, CommentViewSet, feed, like_post, unlike_post
+from .views import (
+    PostViewSet,
+    CommentViewSet,
+    HashtagPostsView,
+    MentionPostsView,
+    async_feed,
+    async_post_detail,
+    create_upload,
+    feed,
+    finalize_upload,
+    like_post,
+    toggle_like_post,
+    trending,
+    unlike_post,
+    upload_chunk,
+)
 
 router = DefaultRouter()
 router.register(r"posts", PostViewSet, basename="posts")
 router.register(r"comments", CommentViewSet, basename="comments")
 
 urlpatterns = [
-    path("feed/", feed, name="feed"),
+    path("feed/", async_feed if settings.ASYNC_API_VIEWS else feed, name="feed"),
+    # Ahead of the router, whose posts/<pk>/ route would match "trending"
+    path("posts/trending/", trending, name="trending_posts"),
     path("posts/<int:pk>/like/", like_post, name="like_post"),
     path("posts/<int:pk>/unlike/", unlike_post, name="unlike_post"),
+    path("posts/<int:pk>/like/toggle/", toggle_like_post, name="toggle_like_post"),
+    path("hashtags/<str:name>/posts/", HashtagPostsView.as_view(), name="hashtag_posts"),
+    path("users/<str:username>/mentions/", MentionPostsView.as_view(), name="mention_posts"),
+    path("uploads/", create_upload, name="create_upload"),
+    path("uploads/<uuid:session_id>/", upload_chunk, name="upload_chunk"),
+    path("uploads/<uuid:session_id>/finalize/", finalize_upload, name="finalize_upload"),
     path("", include(router.urls)),
 ]
+
+if settings.ASYNC_API_VIEWS:
+    # Ahead of the router so GET /posts/<id>/ is served by the async view
+    urlpatterns.insert(-1, path("posts/<int:pk>/", async_post_detail, name="posts-detail"))
@@ -1,76 +1,205 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import F
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
 from rest_framework import viewsets, permissions, status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, parser_classes, permission_classes
 from rest_framework.response import Response
-from rest_framework.filters import SearchFilter, OrderingFilter
-from django.contrib.contenttypes.models import ContentType
+from rest_framework.filters import OrderingFilter
+from django.db import transaction
 
-from .models import Post, Comment, Like
-from .serializers import PostSerializer, CommentSerializer
+from .models import Comment, Hashtag, Post, UploadSession
+from .serializers import AttachmentSerializer, CommentSerializer, PostSerializer, UploadSessionSerializer
+from .caching import CachedResponseMixin, acached_response, apost_version, cached_response, post_versions
+from .counters import adjust_counter
+from .likes import add_like, remove_like, toggle_like
 from .permissions import IsOwnerOrReadOnly
+from .search import FullTextSearchFilter
+from .tags import normalize_hashtag
+from .timeline import ahome_timeline, fan_out_post, home_timeline
+from .trending import get_trending, record_activity
+from .uploads import UploadConflict, create_session, finalize, write_chunk
 from rest_framework import generics
 
-from notifications.models import Notification
+from notifications.dispatch import notify
+from social_media_api.asyncapi import async_api_view, json_response
+from social_media_api.optimization import OptimizedQuerySetMixin, optimize_queryset
+from social_media_api.pagination import KeysetPagination
 
 
-class PostViewSet(viewsets.ModelViewSet):
-    queryset = Post.objects.all().order_by("-created_at")
+class PostViewSet(CachedResponseMixin, OptimizedQuerySetMixin, viewsets.ModelViewSet):
+    queryset = Post.objects.all().order_by("-created_at", "-id")
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
+    pagination_class = KeysetPagination
 
-    filter_backends = [SearchFilter, OrderingFilter]
-    search_fields = ["title", "content"]
+    # ?search= is ranked full-text search over title and content
+    filter_backends = [FullTextSearchFilter, OrderingFilter]
     ordering_fields = ["created_at", "updated_at"]
 
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        post = serializer.save(author=self.request.user)
+        fan_out_post(post)
 
 
-class CommentViewSet(viewsets.ModelViewSet):
-    queryset = Comment.objects.all().order_by("-created_at")
+class CommentViewSet(OptimizedQuerySetMixin, viewsets.ModelViewSet):
+    queryset = Comment.objects.all().order_by("-created_at", "-id")
     serializer_class = CommentSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
+    pagination_class = KeysetPagination
 
     def perform_create(self, serializer):
-        comment = serializer.save(author=self.request.user)
+        with transaction.atomic():
+            comment = serializer.save(author=self.request.user)
+            adjust_counter(comment.post_id, "comments_count", 1)
+            record_activity(comment.post_id, comments=1)
 
         # Notification for post owner (if not commenting on own post)
-        if comment.post.author != self.request.user:
-            Notification.objects.create(
-                recipient=comment.post.author,
-                actor=self.request.user,
-                verb="commented on your post",
-                target_content_type=ContentType.objects.get_for_model(Post),
-                target_object_id=comment.post.id,
-            )
+        if comment.post.author_id != self.request.user.id:
+            notify(comment.post.author_id, self.request.user, "commented on your post", target=comment.post)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            post_id = instance.post_id
+            instance.delete()
+            adjust_counter(post_id, "comments_count", -1)
+
+
+class HashtagPostsView(generics.ListAPIView):
+    """
+    Posts using a hashtag, newest first; pages by the PostHashtag index.
+    """
+
+    serializer_class = PostSerializer
+    pagination_class = KeysetPagination
+    permission_classes = [permissions.AllowAny]
+
+    def get_queryset(self):
+        hashtag = get_object_or_404(Hashtag, name=normalize_hashtag(self.kwargs["name"]))
+        queryset = (
+            Post.objects.filter(post_hashtags__hashtag=hashtag)
+            .annotate(tagged_at=F("post_hashtags__created_at"))
+            .order_by("-tagged_at", "-id")
+        )
+        return optimize_queryset(queryset, PostSerializer, self.request)
+
+
+class MentionPostsView(generics.ListAPIView):
+    """
+    Posts mentioning a user, newest first; pages by the PostMention index.
+    """
+
+    serializer_class = PostSerializer
+    pagination_class = KeysetPagination
+    permission_classes = [permissions.AllowAny]
+
+    def get_queryset(self):
+        user = get_object_or_404(get_user_model(), username=self.kwargs["username"])
+        queryset = (
+            Post.objects.filter(mentions__user=user)
+            .annotate(mentioned_at=F("mentions__created_at"))
+            .order_by("-mentioned_at", "-id")
+        )
+        return optimize_queryset(queryset, PostSerializer, self.request)
+
+
+class TimelinePagination(KeysetPagination):
+    # Unique within one user's feed; see posts.timeline._timeline
+    tiebreaker = "timeline_post"
 
 
 @api_view(["GET"])
 @permission_classes([permissions.IsAuthenticated])
 def feed(request):
-    following_users = request.user.following.all()
-    posts = Post.objects.filter(author__in=following_users).order_by("-created_at")
+    posts = home_timeline(request.user).order_by("-timeline_at", "-timeline_post")
+    posts = optimize_queryset(posts, PostSerializer, request)
+
+    paginator = TimelinePagination()
+    page = paginator.paginate_queryset(posts, request)
+    serializer = PostSerializer(page, many=True)
+    return paginator.get_paginated_response(serializer.data)
+
+
+# Async (ASGI-native) variants, routed instead of the sync views when
+# ASYNC_API_VIEWS is on; see social_media_api.asyncapi.
+@async_api_view()
+async def async_feed(request):
+    posts = (await ahome_timeline(request.user)).order_by("-timeline_at", "-timeline_post")
+    posts = optimize_queryset(posts, PostSerializer, request)
+
+    paginator = TimelinePagination()
+    page = await paginator.apaginate_queryset(posts, request)
+    serializer = PostSerializer(page, many=True)
+    return json_response(paginator.get_paginated_data(serializer.data))
+
+
+@async_api_view(require_authentication=False)
+async def async_post_retrieve(request, pk):
+    async def build():
+        queryset = optimize_queryset(Post.objects.all(), PostSerializer, request)
+        try:
+            post = await queryset.aget(pk=pk)
+        except Post.DoesNotExist:
+            raise Http404
+        return PostSerializer(post, context={"request": request}).data
+
+    return await acached_response(request, await apost_version(pk), build)
+
+
+post_detail = PostViewSet.as_view({"get": "retrieve", "put": "update", "patch": "partial_update", "delete": "destroy"})
+
+
+@csrf_exempt
+async def async_post_detail(request, pk):
+    # Reads are async; writes still go through the viewset
+    if request.method == "GET":
+        return await async_post_retrieve(request, pk=pk)
+    return await sync_to_async(post_detail)(request, pk=pk)
+
+
+@api_view(["GET"])
+@permission_classes([permissions.AllowAny])
+def trending(request):
+    # Ranking comes precomputed from the cache (posts.trending)
+    ranked = get_trending()
+    try:
+        limit = int(request.query_params.get("limit", settings.TRENDING_PAGE_SIZE))
+    except ValueError:
+        return Response({"limit": "A number is required."}, status=status.HTTP_400_BAD_REQUEST)
+    ranked_posts = ranked["posts"][: min(max(limit, 1), settings.TRENDING_SIZE)]
+
+    def build():
+        scores = dict(ranked_posts)
+        queryset = optimize_queryset(Post.objects.filter(pk__in=scores), PostSerializer, request)
+        posts = {post.pk: post for post in queryset}
+        serializer = PostSerializer(
+            [posts[post_id] for post_id, _ in ranked_posts if post_id in posts],
+            many=True,
+            context={"request": request},
+        )
+        results = [{**data, "trending_score": round(scores[data["id"]], 3)} for data in serializer.data]
+        return Response({"results": results})
 
-    serializer = PostSerializer(posts, many=True)
-    return Response(serializer.data)
+    # A new ranking or a change to a listed post gives a new ETag
+    versions = post_versions([post_id for post_id, _ in ranked_posts])
+    return cached_response(request, ":".join(map(str, [ranked["at"].timestamp(), *versions])), build)
 
 
 @api_view(["POST"])
 @permission_classes([permissions.IsAuthenticated])
 def like_post(request, pk):
-    post = generics.get_object_or_404(Post, pk=pk)
-
-    like, created = Like.objects.get_or_create(user=request.user, post=post)
+    created, post = add_like(request.user, pk)
     if not created:
         return Response({"detail": "You already liked this post."}, status=status.HTTP_400_BAD_REQUEST)
 
-    if post.author != request.user:
-        Notification.objects.create(
-            recipient=post.author,
-            actor=request.user,
-            verb="liked your post",
-            target_content_type=ContentType.objects.get_for_model(Post),
-            target_object_id=post.id,
-        )
+    record_activity(pk, likes=1)
+
+    if post["author_id"] != request.user.id:
+        notify(post["author_id"], request.user, "liked your post", target=Post(pk=pk))
 
     return Response({"detail": "Post liked."}, status=status.HTTP_201_CREATED)
 
@@ -78,10 +207,89 @@ def like_post(request, pk):
 @api_view(["POST"])
 @permission_classes([permissions.IsAuthenticated])
 def unlike_post(request, pk):
-    post = generics.get_object_or_404(Post, pk=pk)
-
-    deleted, _ = Like.objects.filter(user=request.user, post=post).delete()
-    if deleted == 0:
+    deleted, _ = remove_like(request.user, pk)
+    if not deleted:
         return Response({"detail": "You have not liked this post."}, status=status.HTTP_400_BAD_REQUEST)
 
     return Response({"detail": "Post unliked."}, status=status.HTTP_200_OK)
+
+
+@api_view(["POST"])
+@permission_classes([permissions.IsAuthenticated])
+def toggle_like_post(request, pk):
+    liked, created, post = toggle_like(request.user, pk)
+    if created:
+        record_activity(pk, likes=1)
+    if created and post["author_id"] != request.user.id:
+        notify(post["author_id"], request.user, "liked your post", target=Post(pk=pk))
+
+    return Response({"liked": liked, "likes_count": post["likes_count"]}, status=status.HTTP_200_OK)
+
+
+def _upload_session(request, session_id):
+    return get_object_or_404(UploadSession, pk=session_id, user=request.user, expires_at__gt=timezone.now())
+
+
+def _offset_response(session, status_code=status.HTTP_200_OK, detail=None):
+    data = {"id": session.pk, "offset": session.offset, "size": session.size}
+    if detail:
+        data["detail"] = detail
+    response = Response(data, status=status_code)
+    response["Upload-Offset"] = str(session.offset)
+    return response
+
+
+@api_view(["POST"])
+@permission_classes([permissions.IsAuthenticated])
+def create_upload(request):
+    serializer = UploadSessionSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    session = create_session(request.user, **serializer.validated_data)
+    return Response(UploadSessionSerializer(session).data, status=status.HTTP_201_CREATED)
+
+
+# No parsers: the chunk is read from request.stream, never as request.data
+@api_view(["GET", "PUT"])
+@parser_classes([])
+@permission_classes([permissions.IsAuthenticated])
+def upload_chunk(request, session_id):
+    session = _upload_session(request, session_id)
+    if request.method == "GET":
+        return _offset_response(session)
+
+    try:
+        offset = int(request.headers["Upload-Offset"])
+        length = int(request.headers["Content-Length"])
+    except (KeyError, ValueError):
+        return Response(
+            {"detail": "Upload-Offset and Content-Length headers are required."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    if offset < 0 or length < 0:
+        return Response(
+            {"detail": "Upload-Offset and Content-Length must not be negative."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    if offset + length > session.size:
+        return _offset_response(
+            session, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, "Chunk runs past the declared size."
+        )
+
+    try:
+        write_chunk(session, offset, request.stream, length)
+    except UploadConflict as exc:
+        return _offset_response(session, status.HTTP_409_CONFLICT, str(exc))
+    return _offset_response(session)
+
+
+@api_view(["POST"])
+@permission_classes([permissions.IsAuthenticated])
+def finalize_upload(request, session_id):
+    session = _upload_session(request, session_id)
+    try:
+        attachment = finalize(session, request.user)
+    except UploadConflict as exc:
+        return _offset_response(session, status.HTTP_409_CONFLICT, str(exc))
+    return Response(
+        AttachmentSerializer(attachment, context={"request": request}).data, status=status.HTTP_201_CREATED
+    )
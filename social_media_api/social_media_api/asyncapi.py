@@ -0,0 +1,79 @@
+"""
+Plumbing for async (ASGI-native) API views.
+
+DRF's APIView is synchronous, so ``async_api_view`` provides the parts the
+async views need: it wraps the Django request in a DRF ``Request`` (for
+``query_params``, ``data`` and the configured authentication and parser
+classes), resolves the
+user off the event loop, enforces authentication, turns DRF/Django
+exceptions into the same JSON error bodies DRF would send, and renders
+``data`` with DRF's JSON encoder.
+
+The async views themselves only use the async ORM (``aget``, ``aiterator``,
+``acount``), so under ASGI a worker holds many slow connections on one event
+loop instead of one thread per request.
+"""
+
+import functools
+
+from asgiref.sync import sync_to_async
+from django.http import Http404, JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions, status
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+
+def json_response(data, status=status.HTTP_200_OK):
+    return JsonResponse(data, status=status, encoder=JSONEncoder, safe=False)
+
+
+def _error_response(exc):
+    response = json_response({"detail": str(exc.detail)}, status=exc.status_code)
+    if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+        # Same challenge DRF sends for TokenAuthentication
+        response.status_code = status.HTTP_401_UNAUTHORIZED
+        response["WWW-Authenticate"] = "Token"
+    return response
+
+
+def _authenticated_user(request):
+    # Touching .user runs the authentication classes
+    return request.user
+
+
+def async_api_view(methods=("GET",), require_authentication=True):
+    """
+    Decorator for ``async def view(request, *args, **kwargs)`` receiving a
+    DRF Request with ``user`` resolved.
+    """
+
+    def decorator(view):
+        @csrf_exempt
+        @functools.wraps(view)
+        async def wrapper(django_request, *args, **kwargs):
+            if django_request.method not in methods:
+                return json_response(
+                    {"detail": f'Method "{django_request.method}" not allowed.'},
+                    status=status.HTTP_405_METHOD_NOT_ALLOWED,
+                )
+
+            request = Request(
+                django_request,
+                parsers=[parser() for parser in api_settings.DEFAULT_PARSER_CLASSES],
+                authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES],
+            )
+            try:
+                user = await sync_to_async(_authenticated_user)(request)
+                if require_authentication and not user.is_authenticated:
+                    raise exceptions.NotAuthenticated()
+                return await view(request, *args, **kwargs)
+            except exceptions.APIException as exc:
+                return _error_response(exc)
+            except Http404:
+                return _error_response(exceptions.NotFound())
+
+        return wrapper
+
+    return decorator
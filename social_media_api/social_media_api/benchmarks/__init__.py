@@ -0,0 +1,13 @@
+"""
+Benchmark harness for the API.
+
+Seeds a synthetic social graph into a throwaway test database, then drives
+the hot endpoints (feed, post list/detail, like, follow, notifications)
+either in-process through the DRF test client or over HTTP against a
+threaded WSGI server with concurrent workers. Reports p50/p95/p99 latency,
+queries per request and throughput, and can save/compare a JSON baseline.
+
+Run it from the project directory::
+
+    DJANGO_DEBUG=True python -m social_media_api.benchmarks --users 500 --mode both
+"""
@@ -0,0 +1,125 @@
+import argparse
+import os
+import sys
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m social_media_api.benchmarks",
+        description="Seed a synthetic social graph into a test database and benchmark the API.",
+    )
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--follows-per-user", type=int, default=20, help="Mean accounts followed per user.")
+    parser.add_argument("--zipf", type=float, default=1.1, help="Skew of followee popularity.")
+    parser.add_argument("--posts-per-user", type=int, default=5)
+    parser.add_argument("--likes-per-post", type=int, default=3)
+    parser.add_argument("--notifications-per-user", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+
+    parser.add_argument("--mode", choices=["inprocess", "http", "both"], default="inprocess")
+    parser.add_argument("--scenarios", default="all", help="Comma-separated scenario names, or 'all'.")
+    parser.add_argument("--iterations", type=int, default=200, help="In-process requests per scenario.")
+    parser.add_argument("--requests", type=int, default=400, help="HTTP requests per scenario.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent HTTP workers.")
+    parser.add_argument(
+        "--server",
+        choices=["wsgi", "asgi"],
+        default="wsgi",
+        help="HTTP server for --mode http; asgi needs uvicorn (pair it with ASYNC_API_VIEWS=True).",
+    )
+
+    parser.add_argument("--save-baseline", metavar="PATH")
+    parser.add_argument("--compare", metavar="PATH", help="Fail if results regress against this baseline.")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    return parser.parse_args(argv)
+
+
+def print_table(results, stream=sys.stdout):
+    columns = ("requests", "errors", "p50_ms", "p95_ms", "p99_ms", "queries_per_request", "throughput_rps")
+    header = f"{'scenario':<26}" + "".join(f"{column:>20}" for column in columns)
+    stream.write(header + "\n" + "-" * len(header) + "\n")
+    for mode, scenarios in results.items():
+        for name, summary in scenarios.items():
+            cells = "".join(f"{summary.get(column, '-'):>20}" for column in columns)
+            stream.write(f"{mode + '/' + name:<26}{cells}\n")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "social_media_api.settings")
+
+    import django
+
+    django.setup()
+
+    from django.conf import settings
+    from django.db import connection
+    from django.test.utils import override_settings
+
+    from social_media_api.testing import configure_test_database
+
+    from .baseline import compare, load_baseline, save_baseline
+    from .runner import SERVERS, run_http, run_inprocess
+    from .scenarios import SCENARIOS
+    from .seed import seed_graph
+
+    names = list(SCENARIOS) if args.scenarios == "all" else args.scenarios.split(",")
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        sys.exit(f"Unknown scenario(s): {', '.join(sorted(unknown))}")
+
+    config = {
+        key: getattr(args, key)
+        for key in ("users", "follows_per_user", "zipf", "posts_per_user", "likes_per_post",
+                    "notifications_per_user", "seed", "iterations", "requests", "concurrency", "server")
+    }
+    config["vendor"] = connection.vendor
+    config["async_views"] = settings.ASYNC_API_VIEWS
+
+    # Never touch the real database: everything runs against a throwaway test one
+    configure_test_database()
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    results = {}
+    try:
+        # Production-like request handling, minus the HTTPS redirect
+        with override_settings(DEBUG=False, ALLOWED_HOSTS=["*"], SECURE_SSL_REDIRECT=False):
+            dataset = seed_graph(
+                users=args.users,
+                follows_per_user=args.follows_per_user,
+                zipf=args.zipf,
+                posts_per_user=args.posts_per_user,
+                likes_per_post=args.likes_per_post,
+                notifications_per_user=args.notifications_per_user,
+                seed=args.seed,
+            )
+            if args.mode in ("inprocess", "both"):
+                results["inprocess"] = {
+                    name: run_inprocess(dataset, SCENARIOS[name], args.iterations, seed=args.seed) for name in names
+                }
+            if args.mode in ("http", "both"):
+                with SERVERS[args.server]() as server:
+                    results["http"] = {
+                        name: run_http(server, dataset, SCENARIOS[name], args.requests, args.concurrency, seed=args.seed)
+                        for name in names
+                    }
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    print_table(results)
+
+    if args.save_baseline:
+        save_baseline(args.save_baseline, config, results)
+        print(f"Baseline written to {args.save_baseline}")
+
+    if args.compare:
+        regressions = compare(results, load_baseline(args.compare), args.tolerance)
+        if regressions:
+            print("Regressions:\n  " + "\n  ".join(regressions))
+            return 1
+        print(f"No regressions against {args.compare}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
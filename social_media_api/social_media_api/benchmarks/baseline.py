@@ -0,0 +1,51 @@
+"""
+JSON baselines for regression comparison.
+
+A baseline file holds the run configuration and, per mode and scenario,
+the summary produced by the runner::
+
+    {"config": {...}, "results": {"inprocess": {"feed": {"p95_ms": ...}}}}
+"""
+
+import json
+
+# Higher is worse for these; throughput is checked the other way round
+LATENCY_METRICS = ("p50_ms", "p95_ms", "p99_ms")
+
+
+def save_baseline(path, config, results):
+    with open(path, "w", encoding="utf-8") as handle:
+        json.dump({"config": config, "results": results}, handle, indent=2, sort_keys=True)
+
+
+def load_baseline(path):
+    with open(path, encoding="utf-8") as handle:
+        return json.load(handle)
+
+
+def compare(results, baseline, tolerance=0.25):
+    """
+    Returns a list of human-readable regressions; empty when within tolerance.
+
+    Latencies may grow and throughput may shrink by ``tolerance`` (a
+    fraction); queries per request must not grow at all.
+    """
+    regressions = []
+    for mode, scenarios in results.items():
+        for name, current in scenarios.items():
+            previous = baseline.get("results", {}).get(mode, {}).get(name)
+            if previous is None:
+                continue
+            label = f"{mode}/{name}"
+            for metric in LATENCY_METRICS:
+                if previous.get(metric) and current[metric] > previous[metric] * (1 + tolerance):
+                    regressions.append(f"{label}: {metric} {previous[metric]} -> {current[metric]}")
+            if previous.get("throughput_rps") and current["throughput_rps"] < previous["throughput_rps"] * (1 - tolerance):
+                regressions.append(
+                    f"{label}: throughput_rps {previous['throughput_rps']} -> {current['throughput_rps']}"
+                )
+            if "queries_per_request" in previous and current.get("queries_per_request", 0) > previous["queries_per_request"]:
+                regressions.append(
+                    f"{label}: queries_per_request {previous['queries_per_request']} -> {current['queries_per_request']}"
+                )
+    return regressions
@@ -0,0 +1,168 @@
+"""
+Drive scenarios in-process (DRF test client) or over HTTP (a threaded WSGI
+server, or uvicorn for ASGI, plus a pool of concurrent client workers) and
+summarize the timings.
+"""
+
+import http.client
+import math
+import random
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler, get_internal_wsgi_application
+from django.db import connection, connections
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+
+def percentile(samples, pct):
+    # Nearest-rank percentile of an unsorted list
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(latencies, elapsed, queries=None, errors=0):
+    summary = {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+    }
+    if queries is not None:
+        summary["queries_per_request"] = round(sum(queries) / len(queries), 2) if queries else 0.0
+    return summary
+
+
+def run_inprocess(dataset, scenario, iterations, seed=1):
+    rng = random.Random(seed)
+    client = APIClient(raise_request_exception=False)
+    latencies, queries, errors = [], [], 0
+
+    started = time.perf_counter()
+    for _ in range(iterations):
+        request = scenario(dataset, rng)
+        client.credentials(HTTP_AUTHORIZATION=f"Token {dataset.tokens[request.user_id]}")
+        with CaptureQueriesContext(connection) as captured:
+            begin = time.perf_counter()
+            response = getattr(client, request.method)(request.path)
+            latencies.append(time.perf_counter() - begin)
+        queries.append(len(captured))
+        errors += response.status_code != request.status
+        if request.cleanup:
+            method, path, expected = request.cleanup
+            # A failed cleanup leaves the dataset changed for later iterations
+            errors += getattr(client, method)(path).status_code != expected
+    return summarize(latencies, time.perf_counter() - started, queries, errors)
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class BenchmarkServer:
+    """
+    The project's WSGI application on a threaded server bound to a free port.
+    """
+
+    def __init__(self, host="127.0.0.1"):
+        self.httpd = ThreadedWSGIServer((host, 0), QuietRequestHandler)
+        self.httpd.set_app(get_internal_wsgi_application())
+        self.host, self.port = self.httpd.server_address[:2]
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.thread.join()
+
+
+class AsgiBenchmarkServer:
+    """
+    The project's ASGI application under uvicorn, bound to a free port.
+    """
+
+    def __init__(self, host="127.0.0.1"):
+        # Optional dependency: only needed for --server asgi
+        import uvicorn
+        from django.core.asgi import get_asgi_application
+
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.bind((host, 0))
+        self.host, self.port = self.socket.getsockname()[:2]
+        config = uvicorn.Config(get_asgi_application(), lifespan="off", log_level="warning", access_log=False)
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(target=self.server.run, kwargs={"sockets": [self.socket]}, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.should_exit = True
+        self.thread.join()
+        self.socket.close()
+
+
+SERVERS = {"wsgi": BenchmarkServer, "asgi": AsgiBenchmarkServer}
+
+
+def _http_call(server, method, path, token):
+    conn = http.client.HTTPConnection(server.host, server.port, timeout=30)
+    try:
+        conn.request(method.upper(), path, headers={"Authorization": f"Token {token}"})
+        response = conn.getresponse()
+        response.read()
+        return response.status
+    finally:
+        conn.close()
+
+
+def run_http(server, dataset, scenario, requests, concurrency, seed=1):
+    # Draw every request up front so the run is reproducible across workers
+    rng = random.Random(seed)
+    planned = [scenario(dataset, rng) for _ in range(requests)]
+
+    def worker(request):
+        token = dataset.tokens[request.user_id]
+        begin = time.perf_counter()
+        try:
+            status = _http_call(server, request.method, request.path, token)
+        except OSError:
+            status = None
+        latency = time.perf_counter() - begin
+        ok = status == request.status
+        if request.cleanup:
+            method, path, expected = request.cleanup
+            try:
+                ok = _http_call(server, method, path, token) == expected and ok
+            except OSError:
+                ok = False
+        return latency, ok
+
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(worker, planned))
+    finally:
+        connections.close_all()
+    elapsed = time.perf_counter() - started
+
+    latencies = [latency for latency, _ in results]
+    errors = sum(1 for _, ok in results if not ok)
+    return summarize(latencies, elapsed, errors=errors)
@@ -0,0 +1,79 @@
+"""
+Benchmark scenarios.
+
+Each scenario turns the seeded dataset and a random generator into one
+``BenchRequest``: the timed call with the status it must return, plus an
+optional untimed ``cleanup`` call ``(method, path, status)`` that undoes a
+write (unlike after like, unfollow after follow) so every iteration starts
+from the same state. Writes only pick pairs that are not seeded likes or
+follows, so the cleanup never removes seeded rows; any other status counts
+as an error.
+"""
+
+from collections import namedtuple
+
+from django.urls import reverse
+
+BenchRequest = namedtuple("BenchRequest", "user_id method path status cleanup")
+
+MAX_DRAWS = 1000
+
+
+def _unseeded(rng, draw, seeded):
+    # Redraw until the pair is not already in the seeded graph
+    for _ in range(MAX_DRAWS):
+        pair = draw()
+        if pair not in seeded:
+            return pair
+    raise ValueError("The seeded graph is too dense to draw an unseeded pair.")
+
+
+def feed(dataset, rng):
+    return BenchRequest(rng.choice(dataset.user_ids), "get", reverse("feed"), 200, None)
+
+
+def post_list(dataset, rng):
+    return BenchRequest(rng.choice(dataset.user_ids), "get", reverse("posts-list"), 200, None)
+
+
+def post_detail(dataset, rng):
+    path = reverse("posts-detail", args=[rng.choice(dataset.post_ids)])
+    return BenchRequest(rng.choice(dataset.user_ids), "get", path, 200, None)
+
+
+def like_post(dataset, rng):
+    user_id, post_id = _unseeded(
+        rng, lambda: (rng.choice(dataset.user_ids), rng.choice(dataset.post_ids)), dataset.likes
+    )
+    return BenchRequest(
+        user_id,
+        "post",
+        reverse("like_post", args=[post_id]),
+        201,
+        ("post", reverse("unlike_post", args=[post_id]), 200),
+    )
+
+
+def follow_user(dataset, rng):
+    follower, followee = _unseeded(rng, lambda: tuple(rng.sample(dataset.user_ids, 2)), dataset.follows)
+    return BenchRequest(
+        follower,
+        "post",
+        reverse("follow_user", args=[followee]),
+        200,
+        ("post", reverse("unfollow_user", args=[followee]), 200),
+    )
+
+
+def notifications(dataset, rng):
+    return BenchRequest(rng.choice(dataset.user_ids), "get", reverse("notifications"), 200, None)
+
+
+SCENARIOS = {
+    "feed": feed,
+    "post_list": post_list,
+    "post_detail": post_detail,
+    "like_post": like_post,
+    "follow_user": follow_user,
+    "notifications": notifications,
+}
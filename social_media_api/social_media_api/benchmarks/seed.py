@@ -0,0 +1,119 @@
+"""
+Synthetic social graph for benchmarks.
+
+Followees are drawn from a Zipf-like popularity distribution so a handful of
+authors end up with most of the followers (and some of them past
+FEED_FANOUT_MAX_FOLLOWERS, exercising fan-out on read), while the number of
+accounts each user follows is exponentially distributed around the mean.
+"""
+
+import random
+from collections import namedtuple
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+
+from accounts.follows import recount_follow_counters
+from accounts.tokens import issue_token
+from notifications.models import Notification
+from posts.counters import actual_count
+from posts.models import Like, Post
+from posts.timeline import backfill_authors, fanout_limit
+
+User = get_user_model()
+Follow = User.following.through
+
+BATCH_SIZE = 1000
+
+# ``follows`` and ``likes`` are the seeded (user, followee) and (user, post) pairs
+Dataset = namedtuple("Dataset", "user_ids post_ids tokens follows likes")
+
+
+def _chunks(items, size=BATCH_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+def seed_graph(
+    users=200,
+    follows_per_user=20,
+    zipf=1.1,
+    posts_per_user=5,
+    likes_per_post=3,
+    notifications_per_user=20,
+    seed=1,
+):
+    rng = random.Random(seed)
+    # Hash once: every synthetic account shares the same password
+    password = make_password("bench-pass")
+
+    User.objects.bulk_create(
+        [User(username=f"bench{i}", password=password) for i in range(users)],
+        batch_size=BATCH_SIZE,
+    )
+    user_ids = list(User.objects.filter(username__startswith="bench").order_by("id").values_list("id", flat=True))
+
+    # Rank i is followed with weight 1 / i**zipf
+    cumulative = list(accumulate(1 / (rank**zipf) for rank in range(1, len(user_ids) + 1)))
+    follows = set()
+    for follower in user_ids:
+        wanted = min(max(1, int(rng.expovariate(1 / follows_per_user))), len(user_ids) - 1)
+        for followee in rng.choices(user_ids, cum_weights=cumulative, k=wanted):
+            if followee != follower:
+                follows.add((follower, followee))
+    Follow.objects.bulk_create(
+        [Follow(from_user_id=a, to_user_id=b) for a, b in follows],
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    for chunk in _chunks(user_ids):
+        recount_follow_counters(chunk)
+
+    Post.objects.bulk_create(
+        [
+            Post(author_id=author, title=f"Post {n} by {author}", content=f"Synthetic post body {n}")
+            for author in user_ids
+            for n in range(rng.randint(0, 2 * posts_per_user))
+        ],
+        batch_size=BATCH_SIZE,
+    )
+    post_ids = list(Post.objects.values_list("id", flat=True))
+
+    likes = [
+        Like(post_id=post_id, user_id=user_id)
+        for post_id in post_ids
+        for user_id in rng.sample(user_ids, min(rng.randint(0, 2 * likes_per_post), len(user_ids)))
+    ]
+    Like.objects.bulk_create(likes, batch_size=BATCH_SIZE, ignore_conflicts=True)
+    # The database only holds seeded rows, so recount every post in one UPDATE
+    Post.objects.update(likes_count=actual_count(Like))
+
+    # Materialize timelines: one backfill query per reader
+    big_authors = set(User.objects.filter(followers_count__gt=fanout_limit()).values_list("id", flat=True))
+    following = {}
+    for follower, followee in follows:
+        if followee not in big_authors:
+            following.setdefault(follower, []).append(followee)
+    for follower, author_ids in following.items():
+        backfill_authors(User(pk=follower), author_ids)
+
+    Notification.objects.bulk_create(
+        [
+            Notification(recipient_id=recipient, actor_id=rng.choice(user_ids), verb="started following you")
+            for recipient in user_ids
+            for _ in range(notifications_per_user)
+        ],
+        batch_size=BATCH_SIZE,
+    )
+
+    # Hashed tokens, as login issues them, so requests take the current auth path
+    tokens = {user_id: issue_token(User(pk=user_id))[1] for user_id in user_ids}
+
+    return Dataset(
+        user_ids=user_ids,
+        post_ids=post_ids,
+        tokens=tokens,
+        follows=frozenset(follows),
+        likes=frozenset((like.user_id, like.post_id) for like in likes),
+    )
@@ -0,0 +1,52 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from accounts.models import AuthToken
+from posts.models import Like, Post, TimelineEntry
+
+from .baseline import compare
+from .runner import percentile, run_inprocess
+from .scenarios import SCENARIOS
+from .seed import seed_graph
+
+User = get_user_model()
+
+
+class BenchmarkHarnessTestCase(TestCase):
+    """
+    Smoke tests for the benchmark seeding, runner and baseline comparison.
+    """
+
+    def test_seed_and_run_every_scenario(self):
+        dataset = seed_graph(users=20, follows_per_user=4, posts_per_user=2, notifications_per_user=2)
+        self.assertEqual(len(dataset.tokens), 20)
+        self.assertEqual(AuthToken.objects.count(), 20)  # hashed tokens, not legacy ones
+        self.assertEqual(Post.objects.count(), len(dataset.post_ids))
+        self.assertTrue(TimelineEntry.objects.exists())
+
+        for name, scenario in SCENARIOS.items():
+            summary = run_inprocess(dataset, scenario, iterations=3)
+            self.assertEqual((summary["requests"], summary["errors"]), (3, 0), name)
+            self.assertGreater(summary["queries_per_request"], 0, name)
+
+    def test_writes_leave_the_seeded_graph_unchanged(self):
+        dataset = seed_graph(users=10, follows_per_user=6, posts_per_user=2, likes_per_post=4, notifications_per_user=0)
+        for scenario in (SCENARIOS["like_post"], SCENARIOS["follow_user"]):
+            summary = run_inprocess(dataset, scenario, iterations=20)
+            self.assertEqual(summary["errors"], 0)
+
+        follows = set(User.following.through.objects.values_list("from_user_id", "to_user_id"))
+        self.assertEqual(follows, dataset.follows)
+        self.assertEqual(set(Like.objects.values_list("user_id", "post_id")), dataset.likes)
+
+    def test_percentile_is_nearest_rank(self):
+        samples = list(range(1, 101))
+        self.assertEqual((percentile(samples, 50), percentile(samples, 99)), (50, 99))
+
+    def test_compare_flags_regressions(self):
+        baseline = {"results": {"inprocess": {"feed": {"p95_ms": 10.0, "throughput_rps": 100.0, "queries_per_request": 3}}}}
+        current = {"inprocess": {"feed": {"p50_ms": 1, "p95_ms": 11.0, "p99_ms": 1, "throughput_rps": 90.0, "queries_per_request": 3}}}
+        self.assertEqual(compare(current, baseline, tolerance=0.25), [])
+
+        current["inprocess"]["feed"].update(p95_ms=20.0, queries_per_request=4)
+        self.assertEqual(len(compare(current, baseline, tolerance=0.25)), 2)
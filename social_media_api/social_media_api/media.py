@@ -0,0 +1,249 @@
+"""
+Upload storage and image renditions.
+
+Uploads reach the views as temporary files (FILE_UPLOAD_HANDLERS streams
+them to disk), are hashed in chunks and stored under their SHA-256 digest, so
+identical files are stored once and every name is immutable and can be
+cached forever by clients and CDNs. The extension and content type come from
+sniffing the content, never from the client: only the image formats in
+SNIFFED_TYPES keep an extension, anything else is stored without one and
+typed ``application/octet-stream``, so an uploaded page or script is never
+served as HTML.
+
+Resized WebP/JPEG renditions are rendered by ``render_renditions`` in a
+process pool: decoding and resampling hold the GIL, so threads would stall
+the web workers. ``run_in_background`` hands the whole job (render, store,
+update the row) to a small thread pool after the request's transaction
+commits, so the response never waits for it. With MEDIA_RENDITIONS_ASYNC off
+everything runs inline instead; it is on unless the environment turns it off,
+so one-off scripts that store uploads should run with
+MEDIA_RENDITIONS_ASYNC=False (the daemon threads die with the process), and
+tests override it.
+"""
+
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile, File
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from rest_framework import serializers
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+FORMATS = {
+    # format -> (Pillow format, extension, save options)
+    "webp": ("WEBP", "webp", {"method": 4}),
+    "jpeg": ("JPEG", "jpg", {"optimize": True, "progressive": True}),
+}
+
+
+# Pillow format -> (extension, content type) of uploads stored as what they are
+SNIFFED_TYPES = {
+    "PNG": (".png", "image/png"),
+    "JPEG": (".jpg", "image/jpeg"),
+    "GIF": (".gif", "image/gif"),
+    "WEBP": (".webp", "image/webp"),
+}
+UNKNOWN_TYPE = ("", "application/octet-stream")
+
+
+def sniff_type(file):
+    """
+    ``(extension, content_type)`` for the content of ``file``; only the
+    header is decoded.
+    """
+    from PIL import Image
+
+    file.seek(0)
+    try:
+        with Image.open(file) as image:
+            detected = SNIFFED_TYPES.get(image.format, UNKNOWN_TYPE)
+    except Exception:
+        # Not an image Pillow can identify (UnidentifiedImageError, bombs, ...)
+        detected = UNKNOWN_TYPE
+    file.seek(0)
+    return detected
+
+
+def file_digest(file):
+    """
+    SHA-256 of an uploaded or stored file, read in chunks.
+    """
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in file.chunks(CHUNK_SIZE):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+class StagedFile(File):
+    """
+    A complete file already on local disk (e.g. an assembled chunked
+    upload). Like TemporaryUploadedFile it exposes ``temporary_file_path``,
+    so FileSystemStorage moves it into place instead of copying it.
+    """
+
+    def __init__(self, path, name):
+        super().__init__(open(path, "rb"), name=name)
+        self.path = path
+
+    def temporary_file_path(self):
+        return self.path
+
+
+def store_hashed(storage, prefix, file):
+    """
+    Save ``file`` as ``<prefix>/<sha256><ext>`` unless that name already
+    exists; returns the stored name and the sniffed content type. The
+    client's filename is ignored. FileSystemStorage moves a temporary upload
+    into place rather than copying it.
+    """
+    extension, content_type = sniff_type(file)
+    name = f"{prefix}/{file_digest(file)}{extension}"
+    if not storage.exists(name):
+        name = storage.save(name, file)
+    return name, content_type
+
+
+def render_renditions(source, sizes, formats, crop, quality):
+    """
+    Process-pool worker: returns ``{size: {format: bytes}}``.
+
+    ``source`` is a filesystem path or the image bytes. ``crop`` fills an
+    exact ``size`` x ``size`` square (avatars); otherwise the image is only
+    shrunk to fit inside it.
+    """
+    # Imported in the worker so the parent process does not pay for it
+    from PIL import Image, ImageOps
+
+    with Image.open(source if isinstance(source, str) else io.BytesIO(source)) as image:
+        image = ImageOps.exif_transpose(image)
+        rendered = {}
+        for size in sizes:
+            if crop:
+                resized = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+            else:
+                resized = image.copy()
+                resized.thumbnail((size, size), Image.Resampling.LANCZOS)
+
+            rendered[size] = {}
+            for fmt in formats:
+                pillow_format, _, options = FORMATS[fmt]
+                frame = resized
+                if pillow_format == "JPEG" and frame.mode != "RGB":
+                    frame = frame.convert("RGB")  # JPEG has no alpha channel
+                elif frame.mode not in ("RGB", "RGBA"):
+                    frame = frame.convert("RGBA")
+                buffer = io.BytesIO()
+                frame.save(buffer, pillow_format, quality=quality, **options)
+                rendered[size][fmt] = buffer.getvalue()
+    return rendered
+
+
+def rendition_name(prefix, name, size, fmt):
+    stem = os.path.splitext(os.path.basename(name))[0]
+    return f"{prefix}/{stem}_{size}.{FORMATS[fmt][1]}"
+
+
+def generate_renditions(storage, name, prefix, sizes, crop=False):
+    """
+    Render and store the renditions of the stored file ``name``; returns
+    ``{"<size>": {"<format>": stored_name}}``. Renditions already in storage
+    (the same content uploaded before) are reused without rendering.
+    """
+    formats = settings.MEDIA_RENDITION_FORMATS
+    names = {size: {fmt: rendition_name(prefix, name, size, fmt) for fmt in formats} for size in sizes}
+    missing = [size for size in sizes if not all(storage.exists(n) for n in names[size].values())]
+
+    if missing:
+        try:
+            source = storage.path(name)
+        except NotImplementedError:
+            # Remote storage: ship the bytes to the worker instead
+            with storage.open(name, "rb") as handle:
+                source = handle.read()
+        args = (source, missing, formats, crop, settings.MEDIA_RENDITION_QUALITY)
+        if settings.MEDIA_RENDITIONS_ASYNC:
+            rendered = get_render_pool().submit(render_renditions, *args).result()
+        else:
+            rendered = render_renditions(*args)
+
+        for size, by_format in rendered.items():
+            for fmt, data in by_format.items():
+                if not storage.exists(names[size][fmt]):
+                    storage.save(names[size][fmt], ContentFile(data))
+
+    return {str(size): by_format for size, by_format in names.items()}
+
+
+class RenditionURLsField(serializers.ReadOnlyField):
+    """
+    ``{"<size>": {"<format>": url}}`` for a JSONField of rendition names.
+    """
+
+    def to_representation(self, renditions):
+        request = self.context.get("request")
+
+        def url(name):
+            url = default_storage.url(name)
+            return request.build_absolute_uri(url) if request else url
+
+        return {size: {fmt: url(name) for fmt, name in by_format.items()} for size, by_format in renditions.items()}
+
+
+_render_pool = None
+_background_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_render_pool():
+    global _render_pool
+    if _render_pool is None:
+        with _pool_lock:
+            if _render_pool is None:
+                # spawn: forking a process that runs threads and DB connections is unsafe
+                _render_pool = ProcessPoolExecutor(
+                    max_workers=settings.MEDIA_RENDITION_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+    return _render_pool
+
+
+def _get_background_pool():
+    global _background_pool
+    if _background_pool is None:
+        with _pool_lock:
+            if _background_pool is None:
+                _background_pool = ThreadPoolExecutor(
+                    max_workers=settings.MEDIA_RENDITION_WORKERS, thread_name_prefix="media-renditions"
+                )
+    return _background_pool
+
+
+def _run(func, args):
+    try:
+        func(*args)
+    except Exception:
+        logger.exception("Background media job %s failed", func.__name__)
+    finally:
+        connection.close()
+
+
+def run_in_background(func, *args):
+    """
+    Run ``func(*args)`` off the request once the current transaction commits.
+    """
+    if not settings.MEDIA_RENDITIONS_ASYNC:
+        func(*args)
+        return
+    transaction.on_commit(lambda: _get_background_pool().submit(_run, func, args))
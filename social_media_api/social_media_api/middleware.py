@@ -0,0 +1,302 @@
+"""
+Per-request query instrumentation.
+
+``QueryInstrumentationMiddleware`` installs an ``execute_wrapper`` on every
+database connection that hands each query to the current request's
+``QueryRecorder`` (found through a context variable, so queries an async view
+runs through ``sync_to_async`` are attributed to the right request) and
+records the number of queries, the time spent in the database, repeated query templates
+(the signature of an N+1: the same SQL with different parameters), the
+time spent producing serializer ``.data`` inside the view and the time spent
+rendering the response afterwards. Staff users (or every client, with
+QUERY_METRICS_PUBLIC_SERVER_TIMING) get a ``Server-Timing`` header, and
+per-URL-name histograms are served in the Prometheus text format by
+``metrics_view`` to staff and to scrapers presenting QUERY_METRICS_TOKEN.
+
+The middleware is sync and async capable, so async views keep running on the
+event loop. Enabled with QUERY_METRICS_ENABLED; when off the middleware
+removes itself from the stack (MiddlewareNotUsed), so it costs nothing.
+"""
+
+import contextvars
+import functools
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import Http404, HttpResponse
+from django.utils.crypto import constant_time_compare
+from rest_framework import serializers
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class QueryRecorder:
+    """
+    ``execute_wrapper`` callable collecting query templates and timings.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.templates = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            # Parameters are still placeholders here, so repeats share a template
+            self.templates[sql] += 1
+
+    @property
+    def duplicates(self):
+        return sum(n - 1 for n in self.templates.values() if n > 1)
+
+    def repeated(self, threshold):
+        return [(sql, n) for sql, n in self.templates.most_common() if n >= threshold]
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+        self.total += 1
+        self.sum += value
+
+
+class MetricsRegistry:
+    """
+    Thread-safe per-endpoint histograms and counters.
+    """
+
+    HISTOGRAMS = {
+        "http_request_duration_seconds": DURATION_BUCKETS,
+        "db_query_duration_seconds": DURATION_BUCKETS,
+        "serialization_duration_seconds": DURATION_BUCKETS,
+        "render_duration_seconds": DURATION_BUCKETS,
+        "db_queries_per_request": QUERY_BUCKETS,
+    }
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self.histograms = {
+            name: defaultdict(lambda buckets=buckets: Histogram(buckets)) for name, buckets in self.HISTOGRAMS.items()
+        }
+        self.duplicates = Counter()
+
+    def record(self, endpoint, total, db_time, serialization_time, render_time, queries, duplicates):
+        with self.lock:
+            self.histograms["http_request_duration_seconds"][endpoint].observe(total)
+            self.histograms["db_query_duration_seconds"][endpoint].observe(db_time)
+            self.histograms["serialization_duration_seconds"][endpoint].observe(serialization_time)
+            self.histograms["render_duration_seconds"][endpoint].observe(render_time)
+            self.histograms["db_queries_per_request"][endpoint].observe(queries)
+            self.duplicates[endpoint] += duplicates
+
+    def render(self):
+        lines = []
+        with self.lock:
+            for name, series in self.histograms.items():
+                lines.append(f"# TYPE {name} histogram")
+                for endpoint, histogram in sorted(series.items()):
+                    label = f'endpoint="{endpoint}"'
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        lines.append(f'{name}_bucket{{{label},le="{bound}"}} {count}')
+                    lines.append(f'{name}_bucket{{{label},le="+Inf"}} {histogram.total}')
+                    lines.append(f"{name}_sum{{{label}}} {histogram.sum}")
+                    lines.append(f"{name}_count{{{label}}} {histogram.total}")
+            lines.append("# TYPE db_duplicate_queries_total counter")
+            for endpoint, count in sorted(self.duplicates.items()):
+                lines.append(f'db_duplicate_queries_total{{endpoint="{endpoint}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+# Per-request state; context variables, so the sync_to_async threads working
+# for an async view see the request that started them
+_recorder = contextvars.ContextVar("query_recorder", default=None)
+# [seconds spent, nesting depth]
+_serialization = contextvars.ContextVar("serialization_timing", default=None)
+
+
+def _record_query(execute, sql, params, many, context):
+    recorder = _recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+def _instrument_connections():
+    # Connections are thread-local: this must run on the thread that queries
+    for connection in connections.all():
+        if _record_query not in connection.execute_wrappers:
+            # Innermost-first position, so execute_wrapper() blocks opened
+            # later never pop it
+            connection.execute_wrappers.insert(0, _record_query)
+
+
+def _timed_data(fget):
+    @functools.wraps(fget)
+    def data(self):
+        timing = _serialization.get()
+        if timing is None:
+            return fget(self)
+        timing[1] += 1
+        start = time.perf_counter()
+        try:
+            return fget(self)
+        finally:
+            timing[1] -= 1
+            if not timing[1]:  # only the outermost serializer counts
+                timing[0] += time.perf_counter() - start
+
+    data.timed = True
+    return data
+
+
+def _install_serializer_timing():
+    for cls in (serializers.Serializer, serializers.ListSerializer):
+        if not getattr(cls.data.fget, "timed", False):
+            cls.data = property(_timed_data(cls.data.fget))
+
+
+def _is_staff(request):
+    user = getattr(request, "user", None)
+    return bool(user is not None and user.is_staff)
+
+
+def _endpoint(request):
+    match = getattr(request, "resolver_match", None)
+    return (match.view_name if match else None) or "unresolved"
+
+
+class QueryInstrumentationMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.QUERY_METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        _install_serializer_timing()
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        _instrument_connections()
+        recorder, tokens = self._start(request)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            self._stop(tokens)
+        total = time.perf_counter() - start
+        return self._finish(request, response, recorder, total, _is_staff(request))
+
+    async def __acall__(self, request):
+        # On the thread sync_to_async runs the view's ORM calls on
+        await sync_to_async(_instrument_connections)()
+        recorder, tokens = self._start(request)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            self._stop(tokens)
+        total = time.perf_counter() - start
+        # A session user is loaded lazily, which must not happen on the loop
+        staff = await sync_to_async(_is_staff)(request)
+        return self._finish(request, response, recorder, total, staff)
+
+    def _start(self, request):
+        recorder = QueryRecorder()
+        request._render_timing = [0.0, 0.0]
+        request._serialization_timing = [0.0, 0]
+        tokens = (_recorder.set(recorder), _serialization.set(request._serialization_timing))
+        return recorder, tokens
+
+    def _stop(self, tokens):
+        recorder_token, serialization_token = tokens
+        _recorder.reset(recorder_token)
+        _serialization.reset(serialization_token)
+
+    def _finish(self, request, response, recorder, total, staff):
+        render_start, render_end = request._render_timing
+        render_time = max(render_end - render_start, 0.0)
+        serialization_time = request._serialization_timing[0]
+        endpoint = _endpoint(request)
+
+        if staff or settings.QUERY_METRICS_PUBLIC_SERVER_TIMING:
+            response["Server-Timing"] = ", ".join(
+                [
+                    f'db;dur={recorder.duration * 1000:.2f};desc="{recorder.count} queries, {recorder.duplicates} duplicate"',
+                    f"serialize;dur={serialization_time * 1000:.2f}",
+                    f"render;dur={render_time * 1000:.2f}",
+                    f"total;dur={total * 1000:.2f}",
+                ]
+            )
+
+        for sql, n in recorder.repeated(settings.QUERY_METRICS_DUPLICATE_THRESHOLD):
+            logger.warning("Possible N+1 on %s: query ran %d times: %s", endpoint, n, sql)
+
+        if endpoint != "metrics":
+            REGISTRY.record(
+                endpoint,
+                total,
+                recorder.duration,
+                serialization_time,
+                render_time,
+                recorder.count,
+                recorder.duplicates,
+            )
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns; time that step
+        timing = request._render_timing
+        timing[0] = time.perf_counter()
+
+        def finished(rendered):
+            timing[1] = time.perf_counter()
+
+        response.add_post_render_callback(finished)
+        return response
+
+
+def _has_metrics_token(request):
+    token = settings.QUERY_METRICS_TOKEN
+    header = request.headers.get("Authorization", "")
+    return bool(token) and constant_time_compare(header, f"Bearer {token}")
+
+
+def metrics_view(request):
+    # Internal only: staff sessions or a scraper holding QUERY_METRICS_TOKEN.
+    # Anyone else gets the same 404 as when metrics are off.
+    if not settings.QUERY_METRICS_ENABLED or not (_has_metrics_token(request) or _is_staff(request)):
+        raise Http404
+    return HttpResponse(REGISTRY.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,45 @@
+"""
+Declarative queryset optimization for serializers.
+
+Serializers list the relations they read in their ``Meta``::
+
+    class Meta:
+        model = Post
+        select_related = ("author",)
+        prefetch_related = ()
+
+and may define ``get_annotations(cls, request)`` returning a dict of
+expressions. Views apply all of it with ``optimize_queryset`` (or the
+``OptimizedQuerySetMixin``) so a page is serialized with a fixed number of
+queries instead of one lazy load per row.
+"""
+
+
+def optimize_queryset(queryset, serializer_class, request=None):
+    meta = getattr(serializer_class, "Meta", None)
+
+    select_related = getattr(meta, "select_related", ())
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+
+    prefetch_related = getattr(meta, "prefetch_related", ())
+    if prefetch_related:
+        queryset = queryset.prefetch_related(*prefetch_related)
+
+    get_annotations = getattr(serializer_class, "get_annotations", None)
+    if get_annotations is not None:
+        annotations = get_annotations(request)
+        if annotations:
+            queryset = queryset.annotate(**annotations)
+
+    return queryset
+
+
+class OptimizedQuerySetMixin:
+    """
+    View mixin that runs ``get_queryset`` through ``optimize_queryset``.
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        return optimize_queryset(queryset, self.get_serializer_class(), self.request)
@@ -0,0 +1,192 @@
+"""
+Keyset (cursor) pagination shared by the list endpoints.
+
+Instead of ``OFFSET n`` plus a ``COUNT(*)`` the next page is selected with a
+``WHERE (created_at, id) < (last_created_at, last_id)`` style filter, so every
+page costs the same index range scan no matter how deep the client pages.
+The keyset is taken from the queryset's ordering (which the OrderingFilter may
+have changed) and always ends with a unique tiebreaker, the primary key
+unless the paginator names another one.
+"""
+
+import base64
+import datetime
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+DEFAULT_ORDERING = ("-created_at", "-id")
+
+
+def get_keyset_ordering(queryset, default=DEFAULT_ORDERING, tiebreaker="id"):
+    ordering = list(queryset.query.order_by or queryset.model._meta.ordering or default)
+    if not all(isinstance(field, str) and field.lstrip("-") for field in ordering):
+        ordering = list(default)
+
+    ordering = [{"pk": "id", "-pk": "-id"}.get(field, field) for field in ordering]
+    if ordering[-1].lstrip("-") != tiebreaker:
+        # Break ties on a unique key, in the same direction as the last key
+        ordering.append(f"-{tiebreaker}" if ordering[-1].startswith("-") else tiebreaker)
+    return tuple(ordering)
+
+
+def get_keyset_values(obj, ordering):
+    values = []
+    for field in ordering:
+        name = field.lstrip("-")
+        try:
+            attname = obj._meta.get_field(name).attname
+        except FieldDoesNotExist:
+            attname = name  # annotation
+        values.append(getattr(obj, attname))
+    return values
+
+
+def encode_cursor(values):
+    payload = [
+        value.isoformat() if isinstance(value, (datetime.date, datetime.datetime)) else value
+        for value in values
+    ]
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(encoded, model, ordering):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+    except ValueError:
+        return None
+    if not isinstance(values, list) or len(values) != len(ordering):
+        return None
+
+    decoded = []
+    for field, value in zip(ordering, values):
+        if not isinstance(value, (str, int, float)):
+            return None  # null, list or object: never written by encode_cursor
+        try:
+            value = model._meta.get_field(field.lstrip("-")).to_python(value)
+        except FieldDoesNotExist:
+            pass  # annotation values are stored as plain JSON
+        except (TypeError, ValidationError):
+            return None
+        decoded.append(value)
+    return decoded
+
+
+def keyset_filter(ordering, values):
+    """
+    Build ``(a, b, c) > (x, y, z)`` in lexicographic form, honouring the
+    direction of each ordering field.
+    """
+    condition = Q()
+    equal_prefix = Q()
+    for field, value in zip(ordering, values):
+        name = field.lstrip("-")
+        lookup = "lt" if field.startswith("-") else "gt"
+        condition |= equal_prefix & Q(**{f"{name}__{lookup}": value})
+        equal_prefix &= Q(**{name: value})
+    return condition
+
+
+def _keyset_slice(queryset, cursor, page_size, default, tiebreaker):
+    ordering = get_keyset_ordering(queryset, default, tiebreaker)
+    queryset = queryset.order_by(*ordering)
+    if cursor is not None:
+        values = decode_cursor(cursor, queryset.model, ordering)
+        if values is None:
+            raise NotFound("Invalid cursor.")
+        try:
+            # Annotation values are only converted (and rejected) here
+            queryset = queryset.filter(keyset_filter(ordering, values))
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound("Invalid cursor.")
+
+    # Fetch one extra row to learn whether there is a next page without a COUNT
+    return queryset[: page_size + 1], ordering
+
+
+def _keyset_page(results, page_size, ordering):
+    page = results[:page_size]
+    next_cursor = None
+    if len(results) > page_size:
+        next_cursor = encode_cursor(get_keyset_values(page[-1], ordering))
+    return page, next_cursor
+
+
+def paginate_keyset(queryset, cursor, page_size, default=DEFAULT_ORDERING, tiebreaker="id"):
+    """
+    Return ``(page, next_cursor)`` for ``queryset`` starting after ``cursor``.
+    """
+    rows, ordering = _keyset_slice(queryset, cursor, page_size, default, tiebreaker)
+    return _keyset_page(list(rows), page_size, ordering)
+
+
+async def apaginate_keyset(queryset, cursor, page_size, default=DEFAULT_ORDERING, tiebreaker="id"):
+    """
+    Async ``paginate_keyset`` for views on the async ORM.
+    """
+    rows, ordering = _keyset_slice(queryset, cursor, page_size, default, tiebreaker)
+    # chunk_size lets aiterator() honour prefetch_related()
+    results = [row async for row in rows.aiterator(chunk_size=page_size + 1)]
+    return _keyset_page(results, page_size, ordering)
+
+
+class KeysetPagination(BasePagination):
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    cursor_query_param = "cursor"
+    default_ordering = DEFAULT_ORDERING
+    # Unique field (or annotation) ending every keyset
+    tiebreaker = "id"
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        cursor = request.query_params.get(self.cursor_query_param)
+        page, self.next_cursor = paginate_keyset(
+            queryset, cursor, self.get_page_size(request), self.default_ordering, self.tiebreaker
+        )
+        return page
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        cursor = request.query_params.get(self.cursor_query_param)
+        page, self.next_cursor = await apaginate_keyset(
+            queryset, cursor, self.get_page_size(request), self.default_ordering, self.tiebreaker
+        )
+        return page
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_data(self, data):
+        return {"next": self.get_next_link(), "results": data}
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
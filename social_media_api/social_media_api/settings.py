@@ -50,6 +50,8 @@ AUTH_USER_MODEL = "accounts.User"
 # Media (uploads)
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
+# Stream every upload to a temporary file instead of buffering small ones in memory
+FILE_UPLOAD_HANDLERS = ["django.core.files.uploadhandler.TemporaryFileUploadHandler"]
 
 # Static files
 STATIC_URL = "/static/"
@@ -58,6 +60,9 @@ STATIC_ROOT = BASE_DIR / "staticfiles"
 # Whitenoise (serves static files in production without needing nginx for static)
 # pip install whitenoise
 STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage"
+    },
     "staticfiles": {
         "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage"
     }
@@ -84,6 +89,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Outermost so its timings cover the whole stack; inert unless QUERY_METRICS_ENABLED
+    "social_media_api.middleware.QueryInstrumentationMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
 
@@ -125,6 +132,36 @@ DATABASES = {
     )
 }
 
+# Cache shared by every process: the token cache, unread counters, response
+# cache stamps, locks and rate limits all rely on it. Production should set
+# CACHE_URL to Redis (the redis package is in requirements.txt; its incr/decr
+# are atomic and reads never touch the database). Without it the database
+# is used (run `python manage.py createcachetable`), which suits development
+# and single-host deployments.
+CACHE_URL = os.getenv("CACHE_URL", "")
+# Entries the database cache keeps before culling. Django's default of 300
+# would have tokens, stamps, counters and throttle keys evict each other
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "100000"))
+if CACHE_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": CACHE_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+            "LOCATION": "django_cache",
+            # Cull a tenth, not a third, of the table once it is full
+            "OPTIONS": {"MAX_ENTRIES": CACHE_MAX_ENTRIES, "CULL_FREQUENCY": 10},
+        }
+    }
+
+# Test and benchmark databases are tuned by social_media_api.testing
+TEST_RUNNER = "social_media_api.testing.TestRunner"
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator"},
@@ -142,13 +179,18 @@ USE_TZ = True
 # DRF config (pagination + search/filter)
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework.authentication.TokenAuthentication",
+        "accounts.authentication.HashedTokenAuthentication",
+        "accounts.authentication.CachedTokenAuthentication",
     ],
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticatedOrReadOnly",
     ],
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 10,
+    "DEFAULT_THROTTLE_RATES": {
+        # Login attempts per client address and username
+        "login": os.getenv("LOGIN_RATE", "10/min"),
+    },
     "DEFAULT_FILTER_BACKENDS": [
         "django_filters.rest_framework.DjangoFilterBackend",
         "rest_framework.filters.SearchFilter",
@@ -174,3 +216,147 @@ CSRF_TRUSTED_ORIGINS = [
 ]
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+# -------------------------
+# Feed (materialized home timelines)
+# -------------------------
+# Authors with more followers than this are merged into feeds at read time
+# instead of being fanned out to every follower when they post.
+FEED_FANOUT_MAX_FOLLOWERS = int(os.getenv("FEED_FANOUT_MAX_FOLLOWERS", "1000"))
+# How many recent posts of a newly followed author are copied into the timeline
+FEED_BACKFILL_POSTS = int(os.getenv("FEED_BACKFILL_POSTS", "50"))
+
+# Seconds anonymous GET /api/posts/ responses stay cached (entries are also
+# invalidated by version stamps whenever a post, like or comment changes)
+POSTS_RESPONSE_CACHE_TTL = int(os.getenv("POSTS_RESPONSE_CACHE_TTL", "300"))
+
+# Full-text search backend for ?search= on /api/posts/:
+# "auto" (by database vendor), "postgres", "sqlite" (FTS5) or "python"
+POSTS_SEARCH_BACKEND = os.getenv("POSTS_SEARCH_BACKEND", "auto")
+POSTS_SEARCH_MAX_RESULTS = 1000
+
+# Trending posts (posts.trending): likes and comments in per-minute buckets,
+# folded into hourly buckets by `rollup_post_activity` after
+# TRENDING_MINUTE_RETENTION minutes and dropped after TRENDING_WINDOW_HOURS.
+# Scores halve every TRENDING_HALF_LIFE seconds and are advanced in the
+# background at most every TRENDING_REFRESH_INTERVAL seconds.
+TRENDING_WINDOW_HOURS = int(os.getenv("TRENDING_WINDOW_HOURS", "48"))
+TRENDING_MINUTE_RETENTION = int(os.getenv("TRENDING_MINUTE_RETENTION", "120"))
+TRENDING_HALF_LIFE = float(os.getenv("TRENDING_HALF_LIFE", str(6 * 60 * 60)))
+TRENDING_REFRESH_INTERVAL = int(os.getenv("TRENDING_REFRESH_INTERVAL", "60"))
+TRENDING_LIKE_WEIGHT = float(os.getenv("TRENDING_LIKE_WEIGHT", "1"))
+TRENDING_COMMENT_WEIGHT = float(os.getenv("TRENDING_COMMENT_WEIGHT", "2"))
+# Posts whose decayed score falls below this are forgotten
+TRENDING_MIN_SCORE = float(os.getenv("TRENDING_MIN_SCORE", "0.01"))
+TRENDING_SIZE = int(os.getenv("TRENDING_SIZE", "100"))
+TRENDING_PAGE_SIZE = int(os.getenv("TRENDING_PAGE_SIZE", "20"))
+
+# Maximum number of user ids accepted by the bulk follow/unfollow endpoints
+BULK_FOLLOW_MAX_USERS = int(os.getenv("BULK_FOLLOW_MAX_USERS", "200"))
+
+# Who-to-follow lists, precomputed into a table by `precompute_follow_suggestions`
+# (run it more often than SUGGESTIONS_MAX_AGE seconds; older lists are ignored).
+# Each user keeps SUGGESTIONS_STORED ranked candidates; GET
+# /api/accounts/suggestions/ returns up to SUGGESTIONS_PAGE_SIZE.
+SUGGESTIONS_STORED = int(os.getenv("SUGGESTIONS_STORED", "50"))
+SUGGESTIONS_PAGE_SIZE = int(os.getenv("SUGGESTIONS_PAGE_SIZE", "10"))
+SUGGESTIONS_MAX_AGE = int(os.getenv("SUGGESTIONS_MAX_AGE", str(24 * 60 * 60)))
+# Followees looked at per hop, bounding the work for users who follow thousands
+SUGGESTIONS_HOP_LIMIT = int(os.getenv("SUGGESTIONS_HOP_LIMIT", "500"))
+
+# -------------------------
+# Token authentication
+# -------------------------
+# token -> user is cached in the shared cache and in a small per-process LRU.
+# The local copy cannot be invalidated from other processes, so keep its TTL short.
+AUTH_TOKEN_CACHE_TTL = int(os.getenv("AUTH_TOKEN_CACHE_TTL", "300"))
+AUTH_TOKEN_LOCAL_CACHE_TTL = int(os.getenv("AUTH_TOKEN_LOCAL_CACHE_TTL", "5"))
+AUTH_TOKEN_LOCAL_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_LOCAL_CACHE_SIZE", "1024"))
+
+# Lifetime of the hashed tokens issued by login
+AUTH_TOKEN_TTL = int(os.getenv("AUTH_TOKEN_TTL", str(30 * 24 * 60 * 60)))
+# Expired tokens are deleted in the background at most this often (0 disables)
+AUTH_TOKEN_PRUNE_INTERVAL = int(os.getenv("AUTH_TOKEN_PRUNE_INTERVAL", "3600"))
+AUTH_TOKEN_PRUNE_BATCH_SIZE = int(os.getenv("AUTH_TOKEN_PRUNE_BATCH_SIZE", "1000"))
+# Plaintext, never-expiring DRF tokens handed out before register issued hashed
+# ones; turn off once clients have logged in again, then `delete_legacy_tokens`
+AUTH_LEGACY_TOKENS = os.getenv("AUTH_LEGACY_TOKENS", "True") == "True"
+
+# Password hashing pool for the async register/login views; requests beyond
+# AUTH_HASHING_MAX_PENDING queued hashes get 503 instead of waiting
+AUTH_HASHING_WORKERS = int(os.getenv("AUTH_HASHING_WORKERS", str(os.cpu_count() or 2)))
+AUTH_HASHING_MAX_PENDING = int(os.getenv("AUTH_HASHING_MAX_PENDING", "64"))
+
+# -------------------------
+# ASGI
+# -------------------------
+# Route feed, notifications and post detail reads to their async views. Turn
+# on when serving with an ASGI server (social_media_api.asgi); under WSGI each
+# async request pays for its own event loop.
+ASYNC_API_VIEWS = os.getenv("ASYNC_API_VIEWS", "False") == "True"
+
+# -------------------------
+# Query instrumentation
+# -------------------------
+# Per-request query counts, DB/render time and a Server-Timing header, with
+# Prometheus histograms at /metrics. Off by default.
+QUERY_METRICS_ENABLED = os.getenv("QUERY_METRICS_ENABLED", "False") == "True"
+# Log a possible N+1 when one query template runs this many times in a request
+QUERY_METRICS_DUPLICATE_THRESHOLD = int(os.getenv("QUERY_METRICS_DUPLICATE_THRESHOLD", "5"))
+# Server-Timing goes to staff only unless this is set (internal deployments)
+QUERY_METRICS_PUBLIC_SERVER_TIMING = os.getenv("QUERY_METRICS_PUBLIC_SERVER_TIMING", "False") == "True"
+# Bearer token a Prometheus scraper presents to GET /metrics; staff can always read it
+QUERY_METRICS_TOKEN = os.getenv("QUERY_METRICS_TOKEN", "")
+
+# -------------------------
+# Notifications
+# -------------------------
+# Write notifications from background worker threads instead of the request.
+# Events are queued in the NotificationOutbox table with the request's writes.
+NOTIFICATIONS_ASYNC = os.getenv("NOTIFICATIONS_ASYNC", "True") == "True"
+NOTIFICATIONS_WORKERS = int(os.getenv("NOTIFICATIONS_WORKERS", "2"))
+NOTIFICATIONS_BATCH_SIZE = int(os.getenv("NOTIFICATIONS_BATCH_SIZE", "200"))
+# Workers are woken by local commits; this poll picks up rows other
+# processes left behind (e.g. after a crash)
+NOTIFICATIONS_OUTBOX_POLL_INTERVAL = float(os.getenv("NOTIFICATIONS_OUTBOX_POLL_INTERVAL", "5"))
+# Verbs whose notifications are merged per (recipient, verb, target) while
+# unread and younger than the window, e.g. "alice and 41 others liked your post"
+NOTIFICATIONS_COALESCE_VERBS = ["liked your post", "commented on your post"]
+NOTIFICATIONS_COALESCE_WINDOW = int(os.getenv("NOTIFICATIONS_COALESCE_WINDOW", str(6 * 60 * 60)))
+NOTIFICATIONS_ACTOR_SAMPLE_SIZE = 5
+NOTIFICATIONS_UNREAD_CACHE_TTL = int(os.getenv("NOTIFICATIONS_UNREAD_CACHE_TTL", str(24 * 60 * 60)))
+# Live delivery to /notifications/stream/ (SSE) and /notifications/poll/.
+# The default broker only reaches clients connected to the writing process.
+NOTIFICATIONS_BROKER = os.getenv("NOTIFICATIONS_BROKER", "notifications.broker.InProcessBroker")
+# Per-connection buffer; a slow client drops its oldest pending messages
+NOTIFICATIONS_STREAM_QUEUE_SIZE = int(os.getenv("NOTIFICATIONS_STREAM_QUEUE_SIZE", "100"))
+NOTIFICATIONS_STREAM_KEEPALIVE = float(os.getenv("NOTIFICATIONS_STREAM_KEEPALIVE", "15"))
+# Streams are closed after this long; EventSource reconnects with Last-Event-ID
+NOTIFICATIONS_STREAM_MAX_SECONDS = float(os.getenv("NOTIFICATIONS_STREAM_MAX_SECONDS", "300"))
+# Unread rows replayed on (re)connect
+NOTIFICATIONS_STREAM_BACKLOG = int(os.getenv("NOTIFICATIONS_STREAM_BACKLOG", "50"))
+NOTIFICATIONS_POLL_TIMEOUT = float(os.getenv("NOTIFICATIONS_POLL_TIMEOUT", "25"))
+
+# -------------------------
+# Media uploads
+# -------------------------
+# Image renditions (social_media_api.media): rendered in a process pool of
+# MEDIA_RENDITION_WORKERS processes, off the request when MEDIA_RENDITIONS_ASYNC.
+# Set it to False for scripts that store uploads, which would otherwise exit
+# before the background renditions finish.
+MEDIA_RENDITIONS_ASYNC = os.getenv("MEDIA_RENDITIONS_ASYNC", "True") == "True"
+MEDIA_RENDITION_WORKERS = int(os.getenv("MEDIA_RENDITION_WORKERS", "2"))
+MEDIA_RENDITION_FORMATS = ["webp", "jpeg"]
+MEDIA_RENDITION_QUALITY = int(os.getenv("MEDIA_RENDITION_QUALITY", "80"))
+# Square avatar sizes in pixels
+PROFILE_PICTURE_SIZES = [64, 256]
+
+# Post attachments (posts.uploads): resumable uploads are assembled in
+# ATTACHMENT_UPLOAD_DIR (keep it on the same filesystem as MEDIA_ROOT so
+# finalizing is a rename) and expire after ATTACHMENT_SESSION_TTL seconds.
+ATTACHMENT_UPLOAD_DIR = os.getenv("ATTACHMENT_UPLOAD_DIR", str(BASE_DIR / "upload_sessions"))
+ATTACHMENT_SESSION_TTL = int(os.getenv("ATTACHMENT_SESSION_TTL", str(24 * 60 * 60)))
+ATTACHMENT_MAX_SIZE = int(os.getenv("ATTACHMENT_MAX_SIZE", str(100 * 1024 * 1024)))
+ATTACHMENT_MAX_PER_POST = int(os.getenv("ATTACHMENT_MAX_PER_POST", "10"))
+# Image thumbnails, fitted inside these bounds
+ATTACHMENT_THUMBNAIL_SIZES = [320, 960]
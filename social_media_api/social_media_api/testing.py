@@ -0,0 +1,93 @@
+import copy
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test.runner import DiscoverRunner
+from django.test.utils import CaptureQueriesContext, override_settings
+
+
+def configure_test_database(alias="default"):
+    """
+    Tune a SQLite database for the concurrent writers of the test suite and
+    the benchmark; must run before the test database is created. Other
+    databases, and SQLite outside tests, are left alone.
+    """
+    settings_dict = settings.DATABASES[alias]
+    if settings_dict["ENGINE"] != "django.db.backends.sqlite3":
+        return
+    # File-backed: the default shared-cache in-memory test database fails
+    # concurrent writers instead of waiting
+    test_settings = settings_dict.setdefault("TEST", {})
+    test_settings["NAME"] = test_settings.get("NAME") or str(settings.BASE_DIR / "test_db.sqlite3")
+    # Take the write lock at BEGIN so a read-then-write transaction waits for
+    # other writers instead of failing with "database is locked"
+    settings_dict.setdefault("OPTIONS", {})["transaction_mode"] = "IMMEDIATE"
+    connections[alias].close()  # reconnect with the new options
+
+
+# The caches the settings configure, recorded before the runner swaps in its
+# own; see use_configured_cache
+CONFIGURED_CACHES = {}
+
+
+def use_configured_cache(test):
+    """
+    Run ``test`` (a TestCase) against the cache backend the settings
+    configure, the database table or Redis, instead of the test runner's.
+    """
+    test_cache = override_settings(CACHES=CONFIGURED_CACHES)
+    test_cache.enable()
+    test.addCleanup(test_cache.disable)
+    if CONFIGURED_CACHES["default"]["BACKEND"].endswith("DatabaseCache"):
+        # Rolled back with the test's transaction
+        call_command("createcachetable", verbosity=0)
+    cache.clear()
+
+
+class TestRunner(DiscoverRunner):
+    # A per-process cache, so query-count assertions only see ORM queries
+    # (the database cache's SELECTs are Redis round trips in production)
+    test_cache = override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    )
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        CONFIGURED_CACHES.update(copy.deepcopy(settings.CACHES))
+        self.test_cache.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.test_cache.disable()
+        super().teardown_test_environment(**kwargs)
+
+    def setup_databases(self, **kwargs):
+        configure_test_database()
+        return super().setup_databases(**kwargs)
+
+
+class QueryCountAssertionsMixin:
+    """
+    TestCase mixin for catching N+1 regressions on list endpoints.
+    """
+
+    def assertConstantQueries(self, url, page_sizes=(1, 5, 20), expected=None, **extra):
+        # Warm per-process caches (token authentication) so every measured
+        # request starts from the same state
+        self.client.get(url, **extra)
+        counts = {}
+        for page_size in page_sizes:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, {"page_size": page_size}, **extra)
+            self.assertEqual(response.status_code, 200, response.content)
+            counts[page_size] = len(queries)
+
+        self.assertEqual(
+            len(set(counts.values())),
+            1,
+            f"Query count depends on page size: {counts}",
+        )
+        if expected is not None:
+            self.assertEqual(counts[page_sizes[0]], expected, f"Queries per page: {counts}")
+        return counts[page_sizes[0]]
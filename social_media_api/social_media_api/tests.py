@@ -0,0 +1,95 @@
+from asgiref.sync import iscoroutinefunction
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.http import HttpRequest, HttpResponse
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from posts.models import Post
+
+from .middleware import REGISTRY, QueryInstrumentationMiddleware, QueryRecorder
+
+User = get_user_model()
+
+
+@override_settings(QUERY_METRICS_ENABLED=True)
+class QueryInstrumentationTestCase(APITestCase):
+    """
+    Tests for the query instrumentation middleware and /metrics.
+    """
+
+    def setUp(self):
+        REGISTRY.clear()
+        author = User.objects.create(username="author")
+        self.staff = User.objects.create(username="staff", is_staff=True)
+        for i in range(3):
+            Post.objects.create(author=author, title=f"Post {i}", content="Body")
+
+    def test_server_timing_header(self):
+        self.client.force_authenticate(self.staff)
+        response = self.client.get(reverse("posts-list"))
+        timing = response["Server-Timing"]
+        self.assertIn("db;dur=", timing)
+        self.assertIn('desc="2 queries, 0 duplicate"', timing)  # page + attachments
+        self.assertIn("serialize;dur=", timing)
+        self.assertIn("render;dur=", timing)
+        self.assertIn("total;dur=", timing)
+
+    def test_server_timing_is_staff_only_by_default(self):
+        self.assertNotIn("Server-Timing", self.client.get(reverse("posts-list")))
+        with self.settings(QUERY_METRICS_PUBLIC_SERVER_TIMING=True):
+            self.assertIn("Server-Timing", self.client.get(reverse("posts-list")))
+
+    def test_serialization_time_is_recorded(self):
+        self.client.get(reverse("posts-list"))
+        series = REGISTRY.histograms["serialization_duration_seconds"]["posts-list"]
+        self.assertEqual(series.total, 1)
+        self.assertGreater(series.sum, 0)
+
+    def test_metrics_endpoint_aggregates_per_url_name(self):
+        self.client.get(reverse("posts-list"))
+        self.client.get(reverse("posts-list"))
+
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        body = response.content.decode()
+        self.assertIn('http_request_duration_seconds_count{endpoint="posts-list"} 2', body)
+        self.assertIn('db_queries_per_request_bucket{endpoint="posts-list",le="2"} 2', body)
+        self.assertNotIn('endpoint="metrics"', body)
+
+    def test_metrics_endpoint_is_internal(self):
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, status.HTTP_404_NOT_FOUND)
+        with self.settings(QUERY_METRICS_TOKEN="scrape-secret"):
+            response = self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer wrong")
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+            response = self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer scrape-secret")
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    async def test_async_views_stay_async(self):
+        async def view(request):
+            await User.objects.acount()
+            return HttpResponse()
+
+        middleware = QueryInstrumentationMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        request = HttpRequest()
+        request.user = self.staff
+        response = await middleware(request)
+        self.assertIn('desc="1 queries, 0 duplicate"', response["Server-Timing"])
+
+    def test_recorder_counts_repeated_templates(self):
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            for pk in range(3):
+                User.objects.filter(pk=pk).exists()
+        self.assertEqual((recorder.count, recorder.duplicates), (3, 2))
+        self.assertEqual(len(recorder.repeated(3)), 1)
+
+    @override_settings(QUERY_METRICS_ENABLED=False)
+    def test_disabled(self):
+        response = self.client.get(reverse("posts-list"))
+        self.assertNotIn("Server-Timing", response)
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, status.HTTP_404_NOT_FOUND)